@@ -0,0 +1,15 @@
+__version__ = "1.0.0"
+__author__ = "bartcctv"
+__license__ = "MIT"
+
+from importlib import import_module
+
+# Resolved on first access so `import ethical_scraper` doesn't load the crawl stack
+_EXPORTS = ('RequestManager', 'ContentExtractor', 'RobotsHandler', 'SecureAuthHandler')
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module('.core', __name__), name)
+
+__all__ = list(_EXPORTS)
@@ -0,0 +1,5 @@
+from .site_generator import SyntheticSite
+
+__all__ = [
+    'SyntheticSite'
+]
@@ -0,0 +1,174 @@
+"""
+End-to-end crawl benchmark against a synthetic local site
+
+Runs EthicalScraper.run() (discovery, API discovery, extraction, media
+downloads and export) and reports throughput, request latency and peak memory
+as JSON. Pass --baseline with an earlier result file to see the change per
+metric; the exit status is 1 when a metric regressed beyond --tolerance.
+
+    python -m ethical_scraper.benchmarks.crawl_benchmark --pages 500 --output crawl.json
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from ..config import settings
+from ..core.request_manager import RequestManager
+from ..main import EthicalScraper
+from ..storage.sharded import create_storage
+from .reporting import (build_report, compare, load_report, peak_rss_mb, percentile,
+                        print_comparison, save_report)
+from .site_generator import SyntheticSite
+
+PHASES = ('discover_urls', 'discover_api_endpoints', 'extract_content', 'export_data')
+
+# Metric name -> whether higher is better
+COMPARED_METRICS = {
+    'pages_per_second': True,
+    'bytes_per_second': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+def _time_phases(scraper, phase_seconds):
+    """Wrap the scraper's pipeline steps so each one's duration is recorded"""
+    for name in PHASES:
+        method = getattr(scraper, name)
+
+        def timed(*args, _method=method, _name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                phase_seconds[_name] = round(time.perf_counter() - started, 3)
+        setattr(scraper, name, timed)
+
+def run_crawl(site_options, export_formats, workdir):
+    """Crawl one freshly generated site with all storage under workdir"""
+    settings.DATA_STORAGE = f'{workdir}/data'
+    settings.MEDIA_STORAGE = f'{workdir}/media'
+    settings.WARC_STORAGE = f'{workdir}/warc'
+    settings.DELAY_BETWEEN_REQUESTS = 0
+    settings.MAX_DEPTH = site_options['depth'] + 1  # media links sit one level below their page
+
+    site = SyntheticSite(**site_options)
+    base_url = site.start()
+    latencies = []
+
+    def record_latency(url, response, seconds):
+        latencies.append(seconds)
+
+    RequestManager.response_hooks.append(record_latency)
+    phase_seconds = {}
+    try:
+        started = time.perf_counter()
+        scraper = EthicalScraper(base_url, export_formats=export_formats)
+        _time_phases(scraper, phase_seconds)
+        success = scraper.run()
+        seconds = time.perf_counter() - started
+    finally:
+        RequestManager.response_hooks.remove(record_latency)
+        site.stop()
+
+    db = create_storage()
+    try:
+        pages = sum(1 for _ in db.iter_content())
+    finally:
+        db.close()
+
+    return {
+        'success': success,
+        'site_pages': site.page_count,
+        'pages': pages,
+        'requests': site.stats['requests'],
+        'bytes': site.stats['bytes_sent'],
+        'server_errors': site.stats['errors'],
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(pages / seconds, 2),
+        'bytes_per_second': round(site.stats['bytes_sent'] / seconds, 1),
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'phase_seconds': phase_seconds
+    }
+
+def summarize(runs):
+    """Median of each numeric metric over the repetitions"""
+    summary = {}
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [run[key] for run in runs if run[key] is not None]
+            summary[key] = statistics.median(values) if values else None
+    summary['success'] = all(run['success'] for run in runs)
+    summary['peak_rss_mb'] = peak_rss_mb()
+    return summary
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='End-to-end crawl benchmark against a synthetic local site',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--pages', type=int, default=200, help='Maximum pages in the site')
+    parser.add_argument('--fanout', type=int, default=5, help='Child links per page')
+    parser.add_argument('--depth', type=int, default=3, help='Depth of the page tree')
+    parser.add_argument('--page-size', type=int, default=4096, help='Approximate text bytes per page')
+    parser.add_argument('--media', type=int, default=2, help='Images per page')
+    parser.add_argument('--media-size', type=int, default=2048, help='Bytes per image')
+    parser.add_argument('--latency', type=float, default=0.0, help='Server delay per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of paths answered with 500')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated site')
+    parser.add_argument('--export', nargs='+', choices=['csv', 'json', 'sql'], default=['json'],
+                        help='Export formats to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Crawls to run; medians are reported')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Relative change counted as a regression')
+    parser.add_argument('--keep', action='store_true', help='Keep the crawl output directories')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    site_options = {
+        'pages': args.pages,
+        'fanout': args.fanout,
+        'depth': args.depth,
+        'page_size': args.page_size,
+        'media_per_page': args.media,
+        'media_size': args.media_size,
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+    }
+
+    runs = []
+    for _ in range(args.repeat):
+        workdir = tempfile.mkdtemp(prefix='crawl-benchmark-')
+        try:
+            runs.append(run_crawl(site_options, args.export, workdir))
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    params = dict(site_options, export=args.export, repeat=args.repeat)
+    report = build_report('crawl', params, summarize(runs))
+    report['runs'] = runs
+    if args.output:
+        save_report(report, args.output)
+    print(f"{report['results']['pages']} pages in {report['results']['seconds']}s: "
+          f"{report['results']['pages_per_second']} pages/s, "
+          f"p50 {report['results']['latency_p50_ms']} ms, p99 {report['results']['latency_p99_ms']} ms, "
+          f"peak RSS {report['results']['peak_rss_mb']} MB")
+
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        rows = compare(report['results'], baseline['results'], COMPARED_METRICS, args.tolerance)
+        print_comparison(rows, baseline.get('commit'))
+        if any(row['regressed'] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Micro-benchmarks for the per-page hot paths
+
+Each benchmark times one call on items of a fixed corpus (pages generated by
+SyntheticSite with a fixed seed, plus a fixed URL list), repeated --repeat
+times; the median per-call time is what gets compared. Save a baseline with
+--save-baseline and pass it back with --baseline to get a per-function delta.
+
+    python -m ethical_scraper.benchmarks.micro --save-baseline micro-baseline.json
+    python -m ethical_scraper.benchmarks.micro --baseline micro-baseline.json
+"""
+import argparse
+import itertools
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+from ..config import settings
+from ..core.content_extractor import ContentExtractor
+from ..core.robots_handler import RobotsHandler
+from ..core.url_discovery import URLDiscoverer
+from ..storage.database import DatabaseManager
+from ..utilities.simhash import simhash
+from ..utilities.validator import is_media_url, is_valid_url
+from .reporting import build_report, compare, load_report, print_comparison, save_report
+from .site_generator import SyntheticSite
+
+CORPUS_SEED = 1234
+CORPUS_PAGES = 50
+CORPUS_ROBOTS = '\n'.join([
+    'User-agent: *',
+    'Disallow: /admin/',
+    'Disallow: /cart',
+    'Disallow: /*?session=',
+    'Allow: /admin/public/',
+    'User-agent: BadBot',
+    'Disallow: /',
+]) + '\n'
+BASE_URL = 'https://example.com'
+CORPUS_URLS = [
+    f'{BASE_URL}/',
+    f'{BASE_URL}/page/17.html',
+    f'{BASE_URL}/blog/2024/05/a-long-article-title-with-many-words?utm_source=feed&ref=home',
+    f'{BASE_URL}/admin/settings',
+    f'{BASE_URL}/admin/public/help',
+    f'{BASE_URL}/media/hero-image.JPG',
+    f'{BASE_URL}/assets/video/intro.mp4',
+    f'{BASE_URL}/cart?item=42',
+    'http://sub.example.com/path/to/resource.json',
+    '/relative/path',
+    'mailto:team@example.com',
+    'not a url',
+]
+
+def build_corpus():
+    """Fixed HTML pages: same seed, same bytes on every run and every commit"""
+    site = SyntheticSite(pages=CORPUS_PAGES, fanout=8, depth=3, page_size=8192,
+                         media_per_page=6, seed=CORPUS_SEED, robots_txt=CORPUS_ROBOTS)
+    return site, [site.render_page(page).decode('utf-8') for page in sorted(site.levels)]
+
+def define_benchmarks(pages, robots, db):
+    """Return {name: zero-argument callable doing one unit of work}"""
+    extractor = ContentExtractor(BASE_URL)
+    discoverer = URLDiscoverer(BASE_URL)
+    page_cycle = itertools.cycle(pages)
+    url_cycle = itertools.cycle(CORPUS_URLS)
+    texts = [extractor.extract_text_content(page) for page in pages]
+    text_cycle = itertools.cycle(texts)
+    fingerprint_cycle = itertools.cycle([simhash(text) for text in texts])
+    counter = itertools.count()
+
+    def save_url():
+        index = next(counter)
+        db.save_url(f'{BASE_URL}/saved/{index}', BASE_URL)
+
+    url_id = db.save_url(f'{BASE_URL}/content-target', BASE_URL)
+
+    def save_content():
+        db.save_content_if_changed(url_id, 'html', next(text_cycle))
+
+    def save_media():
+        index = next(counter)
+        db.save_media(url_id, f'{BASE_URL}/media/{index}.png', 'image', None, 2048)
+
+    def save_fingerprint():
+        db.save_fingerprint(url_id, next(fingerprint_cycle))
+
+    return {
+        'ContentExtractor.extract_text_content': lambda: extractor.extract_text_content(next(page_cycle)),
+        'ContentExtractor.extract_media_links': lambda: extractor.extract_media_links(next(page_cycle)),
+        'URLDiscoverer.extract_links': lambda: discoverer.extract_links(next(page_cycle)),
+        'validator.is_valid_url': lambda: is_valid_url(next(url_cycle)),
+        'validator.is_media_url': lambda: is_media_url(next(url_cycle)),
+        'RobotsHandler.is_allowed': lambda: robots.is_allowed(next(url_cycle)),
+        'DatabaseManager.save_url': save_url,
+        'DatabaseManager.save_content_if_changed': save_content,
+        'DatabaseManager.save_media': save_media,
+        'DatabaseManager.save_fingerprint': save_fingerprint,
+    }
+
+def time_function(function, repeat, min_time):
+    """
+    Time a callable: calibrate calls per sample to last about min_time, then
+    take repeat samples
+
+    Returns:
+        Dict of per-call statistics in microseconds
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    samples = [seconds / number * 1e6 for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'calls_per_sample': number,
+        'samples': repeat
+    }
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmarks for extraction, URL handling and storage hot paths',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--repeat', type=int, default=7, help='Timing samples per function')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per sample')
+    parser.add_argument('--filter', help='Only run benchmarks whose name contains this text')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--save-baseline', help='Write the JSON report here as the new baseline')
+    parser.add_argument('--baseline', help='Baseline report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Relative slowdown counted as a regression')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings.DELAY_BETWEEN_REQUESTS = 0
+    workdir = tempfile.mkdtemp(prefix='micro-benchmark-')
+    site, pages = build_corpus()
+    base_url = site.start()
+    db = DatabaseManager(f'{workdir}/micro.db')
+    try:
+        robots = RobotsHandler(base_url)
+        robots.base_url = BASE_URL
+        benchmarks = define_benchmarks(pages, robots, db)
+        results = {}
+        for name, function in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = time_function(function, args.repeat, args.min_time)
+            print(f"{name:<44} {results[name]['median_us']:>12.2f} us/call "
+                  f"(min {results[name]['min_us']:.2f}, stdev {results[name]['stdev_us']:.2f})")
+    finally:
+        site.stop()
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    params = {'corpus_seed': CORPUS_SEED, 'corpus_pages': len(pages),
+              'repeat': args.repeat, 'min_time': args.min_time}
+    report = build_report('micro', params, results)
+    for path in (args.output, args.save_baseline):
+        if path:
+            save_report(report, path)
+
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        if baseline['params'].get('corpus_seed') != CORPUS_SEED:
+            print("Baseline was taken on a different corpus; timings are not comparable")
+            return 1
+        current = {name: result['median_us'] for name, result in results.items()}
+        previous = {name: result['median_us'] for name, result in baseline['results'].items()}
+        rows = compare(current, previous, {name: False for name in current}, args.tolerance)
+        print_comparison(rows, baseline.get('commit'))
+        if any(row['regressed'] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
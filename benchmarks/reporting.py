@@ -0,0 +1,97 @@
+"""Machine-readable benchmark results and comparison against a saved baseline"""
+import json
+import math
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+def git_commit():
+    """Return the commit the benchmark ran on, marked -dirty with local changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def build_report(benchmark, params, results):
+    return {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results
+    }
+
+def save_report(report, path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(current, baseline, metrics, tolerance=0.1):
+    """
+    Compare two flat result dicts
+
+    Args:
+        current, baseline: Metric name -> value
+        metrics: Metric name -> True if higher is better, False if lower is better
+        tolerance: Relative change in the bad direction that counts as a regression
+
+    Returns:
+        List of dicts with metric, baseline, current, change (relative) and regressed
+    """
+    rows = []
+    for metric, higher_is_better in metrics.items():
+        old, new = baseline.get(metric), current.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        rows.append({
+            'metric': metric,
+            'baseline': old,
+            'current': new,
+            'change': round(change, 4),
+            'regressed': worse > tolerance
+        })
+    return rows
+
+def print_comparison(rows, baseline_commit=None):
+    print(f"Compared with baseline {baseline_commit or '(unknown commit)'}:")
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        print(f"  {row['metric']:<32} {row['baseline']:>12.4g} -> {row['current']:>12.4g}"
+              f"  ({row['change']:+.1%}){flag}")
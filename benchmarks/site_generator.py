@@ -0,0 +1,149 @@
+"""
+Deterministic synthetic websites served from a local HTTP server
+
+Pages form a tree: page i links to its fanout children (numbered breadth-first),
+back to its parent and to its media files. The same options always produce
+byte-identical sites, so results from different commits are comparable.
+"""
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('crawler extraction archive latency request response content media '
+         'storage index search domain robots sitemap page link template text '
+         'benchmark throughput parser encoding header policy cache').split()
+
+class SyntheticSite:
+    def __init__(self, pages=200, fanout=5, depth=3, page_size=4096, media_per_page=2,
+                 media_size=2048, latency=0.0, error_rate=0.0, seed=0, robots_txt=None):
+        """
+        Args:
+            pages: Maximum number of HTML pages
+            fanout: Links from each page to child pages
+            depth: Deepest level of the page tree (the root is level 0)
+            page_size: Approximate bytes of body text per page
+            media_per_page: Images referenced by each page
+            media_size: Bytes per image
+            latency: Seconds the server waits before answering each request
+            error_rate: Share of pages and media (0-1) answered with a 500
+            seed: Seed for the generated text and for which paths fail
+            robots_txt: robots.txt body to serve (default: allow everything)
+        """
+        self.fanout = fanout
+        self.depth = depth
+        self.page_size = page_size
+        self.media_per_page = media_per_page
+        self.media_size = media_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.robots_txt = robots_txt or 'User-agent: *\nAllow: /\n'
+        self.levels = self._build_tree(pages)
+        self.server = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'errors': 0}
+
+    def _build_tree(self, pages):
+        """Map page number to its level, stopping at the page or depth limit"""
+        levels = {0: 0}
+        for page in range(1, pages):
+            parent = (page - 1) // self.fanout
+            if parent not in levels or levels[parent] >= self.depth:
+                break
+            levels[page] = levels[parent] + 1
+        return levels
+
+    @property
+    def page_count(self):
+        return len(self.levels)
+
+    def page_path(self, page):
+        return '/' if page == 0 else f'/page/{page}.html'
+
+    def _fails(self, path):
+        if not self.error_rate or path in ('/', '/robots.txt'):
+            return False
+        digest = hashlib.blake2b(f'{self.seed}:{path}'.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64 < self.error_rate
+
+    def render_page(self, page):
+        rng = random.Random(f'{self.seed}:{page}')
+        paragraphs, size = [], 0
+        while size < self.page_size:
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            paragraphs.append(f'<p>{sentence.capitalize()}.</p>')
+            size += len(sentence) + 8
+        links = [self.page_path(child)
+                 for child in range(page * self.fanout + 1, page * self.fanout + self.fanout + 1)
+                 if child in self.levels]
+        if page:
+            links.append(self.page_path((page - 1) // self.fanout))
+        nav = ''.join(f'<li><a href="{link}">{link}</a></li>' for link in links)
+        images = ''.join(f'<img src="/media/{page}-{index}.png" alt="figure {index}">'
+                         for index in range(self.media_per_page))
+        return (f'<!DOCTYPE html><html><head><title>Page {page}</title></head><body>'
+                f'<h1>Page {page}</h1><ul>{nav}</ul><main>{"".join(paragraphs)}{images}</main>'
+                f'</body></html>').encode('utf-8')
+
+    def render_media(self, name):
+        block = hashlib.blake2b(f'{self.seed}:{name}'.encode('utf-8')).digest()
+        return b'\x89PNG\r\n\x1a\n' + (block * (self.media_size // len(block) + 1))[:self.media_size]
+
+    def resolve(self, path):
+        """Return (status, content_type, body) for a request path"""
+        if path == '/robots.txt':
+            return 200, 'text/plain', self.robots_txt.encode('utf-8')
+        if self._fails(path):
+            return 500, 'text/plain', b'synthetic failure'
+        if path == '/':
+            return 200, 'text/html; charset=utf-8', self.render_page(0)
+        if path.startswith('/page/') and path.endswith('.html'):
+            number = path[len('/page/'):-len('.html')]
+            if number.isdigit() and int(number) in self.levels:
+                return 200, 'text/html; charset=utf-8', self.render_page(int(number))
+        if path.startswith('/media/') and path.endswith('.png'):
+            return 200, 'image/png', self.render_media(path)
+        return 404, 'text/plain', b'not found'
+
+    def start(self):
+        """Serve the site on a free local port; returns its base URL"""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, every
+            # reused keep-alive connection stalls on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if site.latency:
+                    time.sleep(site.latency)
+                status, content_type, body = site.resolve(self.path.split('?')[0])
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site.lock:
+                    site.stats['requests'] += 1
+                    site.stats['bytes_sent'] += len(body)
+                    site.stats['errors'] += status >= 500
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='synthetic-site',
+                                       daemon=True)
+        self.thread.start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
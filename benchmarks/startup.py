@@ -0,0 +1,142 @@
+"""
+Startup-time budget for short CLI invocations
+
+Each scenario runs in a fresh interpreter, --repeat times, and the median wall
+time is checked against its budget:
+
+    import     import main.py without running anything
+    help       main.py --help
+    small_run  a complete crawl of a 5-page synthetic site
+
+The report also lists the slowest imports behind `import main` (from
+python -X importtime) and which heavy optional modules it loaded, which
+should be none. Exit status is 1 when a budget is exceeded or, with
+--baseline, when a scenario regressed beyond --tolerance.
+
+    python -m ethical_scraper.benchmarks.startup --output startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from .reporting import REPO_DIR, build_report, compare, load_report, print_comparison, save_report
+from .site_generator import SyntheticSite
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+
+# Scenario -> median milliseconds allowed
+BUDGETS_MS = {
+    'import': 150,
+    'help': 200,
+    'small_run': 2000,
+}
+
+# Modules only some runs need; importing main.py must not load them
+HEAVY_MODULES = ('bs4', 'requests', 'selenium', 'sqlite3', 'http.server', 'cProfile', 'tracemalloc')
+
+SMALL_RUN_SCRIPT = '''
+import sys
+from {package}.config import settings
+settings.DATA_STORAGE = {workdir!r} + '/data'
+settings.MEDIA_STORAGE = {workdir!r} + '/media'
+settings.LOG_STORAGE = {workdir!r} + '/logs'
+settings.DELAY_BETWEEN_REQUESTS = 0
+sys.argv = ['main.py', {url!r}, '--log-level', 'WARNING']
+from {package}.main import main
+main()
+'''
+
+def _run(arguments):
+    """Run a fresh interpreter from the repository's parent; returns milliseconds"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + arguments, cwd=REPO_DIR.parent, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+def scenario_commands(site_url, workdir):
+    return {
+        'import': ['-c', f'import {PACKAGE}.main'],
+        'help': ['-m', f'{PACKAGE}.main', '--help'],
+        'small_run': ['-c', SMALL_RUN_SCRIPT.format(package=PACKAGE, workdir=workdir, url=site_url)],
+    }
+
+def slowest_imports(count):
+    """Top imports behind `import main` by cumulative microseconds"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {PACKAGE}.main'],
+                            cwd=REPO_DIR.parent, capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        timings.append({'module': name, 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return sorted(timings, key=lambda item: item['cumulative_us'], reverse=True)[:count]
+
+def heavy_modules_loaded():
+    script = (f'import sys, json, {PACKAGE}.main; '
+              f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))')
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR.parent,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Startup-time budget for main.py --help and small runs',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario; medians are reported')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative slowdown counted as a regression')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    site = SyntheticSite(pages=5, fanout=4, depth=1, media_per_page=1)
+    site_url = site.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='startup-benchmark-') as workdir:
+            for name, command in scenario_commands(site_url, workdir).items():
+                samples = [_run(command) for _ in range(args.repeat)]
+                results[f'{name}_ms'] = round(statistics.median(samples), 1)
+                results[f'{name}_min_ms'] = round(min(samples), 1)
+    finally:
+        site.stop()
+
+    heavy = heavy_modules_loaded()
+    report = build_report('startup', {'repeat': args.repeat, 'budgets_ms': BUDGETS_MS}, results)
+    report['slowest_imports'] = slowest_imports(args.top)
+    report['heavy_modules_loaded'] = heavy
+    if args.output:
+        save_report(report, args.output)
+
+    failed = False
+    for name, budget in BUDGETS_MS.items():
+        median = results[f'{name}_ms']
+        over = median > budget
+        failed |= over
+        print(f"{name:<10} {median:>8.1f} ms (min {results[f'{name}_min_ms']:.1f}, "
+              f"budget {budget} ms){'  OVER BUDGET' if over else ''}")
+    print("Slowest imports behind main.py:")
+    for item in report['slowest_imports']:
+        print(f"  {item['cumulative_us'] / 1000:>8.1f} ms  {item['module']}")
+    if heavy:
+        print(f"Importing main.py loaded optional modules: {', '.join(heavy)}")
+        failed = True
+
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        rows = compare(results, baseline['results'], {f'{name}_ms': False for name in BUDGETS_MS},
+                       args.tolerance)
+        print_comparison(rows, baseline.get('commit'))
+        failed |= any(row['regressed'] for row in rows)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,15 +5,127 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Scraper settings
 MAX_DEPTH = 3
-MAX_RETRIES = 3
+MAX_RETRIES = 3  # Deferred retries per URL before it is given up on
+RETRY_STATUS_CODES = [408, 429, 500, 502, 503, 504]
+RETRY_BACKOFF_BASE = 2  # Seconds before the first retry; doubles with every retry
+RETRY_BACKOFF_MAX = 300  # Longest backoff between retries
+RETRY_AFTER_MAX = 3600  # Cap on waits asked for by a Retry-After header
+
+# Per-host circuit breaker: stop requesting from a host that keeps failing
+CIRCUIT_BREAKER = True
+CIRCUIT_WINDOW = 20  # Recent distinct URLs per host the failure ratio is taken over (retries don't count)
+CIRCUIT_MIN_REQUESTS = 5  # URLs in the window before the ratio can open the circuit
+CIRCUIT_FAILURE_RATIO = 0.5  # Share of failed URLs that opens the circuit
+CIRCUIT_MAX_TIMEOUTS = 3  # Timeouts in a row that open the circuit
+CIRCUIT_OPEN_SECONDS = 30  # Wait before the first probe; doubles after each failed probe
+CIRCUIT_MAX_OPEN_SECONDS = 600
+CIRCUIT_MAX_PROBES = 5  # Failed probes in a row before the host is given up on for the run
 REQUEST_TIMEOUT = 30
 DELAY_BETWEEN_REQUESTS = 2  # seconds
-CONCURRENT_REQUESTS = 5
+CONCURRENT_REQUESTS = 5  # Threads for API endpoint discovery
+
+# Per-host concurrency, adjusted from response latency and server pushback.
+# Request starts to a host stay DELAY_BETWEEN_REQUESTS (or the robots.txt
+# crawl-delay) apart, so more than one request is only in flight when responses
+# take longer than that: the adaptive limit matters when the delay is 0 or small.
+ADAPTIVE_CONCURRENCY = True  # False keeps every host at HOST_CONCURRENCY_MAX
+HOST_CONCURRENCY_INITIAL = 2
+HOST_CONCURRENCY_MAX = 8  # Ceiling per host; also the number of fetch threads (1 with JavaScript rendering)
+HOST_LATENCY_TOLERANCE = 2.0  # Latency above this multiple of the host's baseline backs off
+HOST_CONCURRENCY_DECREASE = 0.5  # Factor applied to the limit when backing off
+HTTP_POOL_HOSTS = 100  # Hosts whose keep-alive connections the shared connection pool holds
+DNS_CACHE_TTL = 300  # Seconds host name lookups are cached in batch runs (0 disables)
+
+# JavaScript rendering settings
+JS_RENDER_MODE = 'hybrid'  # 'always' renders every page, 'hybrid' only pages that need it
+JS_MIN_TEXT_LENGTH = 200  # Pages with less visible text are assumed to be client-rendered
+JS_MIN_TEXT_RATIO = 0.1  # Minimum share of visible text vs inline script bytes
+JS_DECISION_SAMPLES = 3  # Agreeing pages needed before a URL pattern's decision is reused
+SCROLL_TO_BOTTOM = False  # Scroll rendered pages to trigger lazy-loaded content
+CAPTURE_NETWORK_REQUESTS = True  # Record XHR/fetch calls made by rendered pages
+
+# Content storage settings
+STORAGE_SHARDS = 1  # >1 splits data by host hash over that many SQLite files (max 10)
+DB_BUSY_TIMEOUT = 30  # Seconds to wait for another process's write lock
+CONTENT_COMPRESSION = 'zlib'  # None, 'zlib' or 'zstd' (needs the zstandard package)
+COMPRESSION_LEVEL = 6
+COMPRESSION_DICTIONARY = True  # Train a per-domain dictionary from the site's shared boilerplate
+COMPRESSION_DICT_SAMPLES = 20  # Pages of a domain to collect before training its dictionary
+COMPRESSION_DICT_SIZE = 32768  # Bytes; zlib can't use more than 32 KB
+
+FULL_TEXT_SEARCH = True  # Keep an SQLite FTS5 index of the latest text of each page
+
+# Near-duplicate detection settings
+NEAR_DUPLICATE_DETECTION = True  # Fingerprint extracted text and mark near-duplicate pages
+NEAR_DUPLICATE_DISTANCE = 3  # Max differing SimHash bits (of 64); the 4-band index finds up to 3
+SKIP_DUPLICATE_MEDIA = True  # Don't download media found on near-duplicate pages
+SKIP_DUPLICATE_LINKS = False  # Don't follow links found on near-duplicate pages during discovery
+
+# Crawler trap detection during discovery (calendars, faceted search, session IDs)
+TRAP_DETECTION = True
+TRAP_MAX_PATH_DEPTH = 12  # Path segments before a URL is dropped
+TRAP_MAX_SEGMENT_REPEATS = 2  # Times one segment may appear in a path (/a/b/a/b/a is a loop)
+TRAP_MAX_QUERY_PARAMS = 6  # Query parameters before a URL is dropped
+TRAP_MAX_QUERY_VARIANTS = 20  # Parameter-name combinations per path before its query URLs are dropped
+TRAP_MAX_PATTERN_URLS = 500  # URLs followed per URL pattern until its fetched pages prove distinct
+TRAP_SAMPLE_PAGES = 5  # Pages of a pattern fetched before it can be judged near-identical
+TRAP_DUPLICATE_RATIO = 0.8  # Share of a pattern's pages that are near-duplicates to flag it
+
+# API discovery settings
+PROBE_COMMON_API_PATHS = False  # Request guessed paths like /api, /graphql, /v1
 
 # Storage settings
 MEDIA_STORAGE = os.path.join(BASE_DIR, 'storage/media')
 DATA_STORAGE = os.path.join(BASE_DIR, 'storage/data')
 LOG_STORAGE = os.path.join(BASE_DIR, 'storage/logs')
+WARC_STORAGE = os.path.join(BASE_DIR, 'storage/warc')
+
+# Logging settings
+LOG_FILE = 'scraper.log'
+LOG_LEVEL = 'INFO'  # Level written to the log file
+LOG_CONSOLE_LEVEL = 'INFO'  # Level printed to the console
+LOG_FORMAT = 'text'  # 'text' or 'json' (one object per line) for the log file
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer thread before new INFO/DEBUG ones are dropped
+LOG_QUEUE_BLOCK_SECONDS = 0.1  # How long a WARNING or worse waits for room before being written directly
+LOG_RATE_LIMIT = 20  # Warnings/errors per call site per window (0 = unlimited)
+LOG_RATE_LIMIT_WINDOW = 60  # Seconds
+
+# Raw response archiving
+WARC_ARCHIVE = False  # Keep every fetched response in WARC files for offline re-extraction
+WARC_MAX_SIZE = 1024 ** 3  # Bytes per WARC file before rotating to a new one
+WARC_QUEUE_SIZE = 1000  # Responses buffered for the writer thread before fetches wait
+WARC_COMPRESSION_LEVEL = 6
+REEXTRACT_WORKERS = None  # Extraction processes for `main.py reextract` (None: one per CPU)
+REEXTRACT_BATCH_SIZE = 500  # Pages written per transaction when re-extracting
+
+# Batch settings (`main.py batch SEEDFILE`)
+BATCH_OUTPUT_DIR = os.path.join(BASE_DIR, 'storage/batch')  # One subdirectory per site
+BATCH_SITES = 8  # Sites crawled at the same time
+BATCH_GLOBAL_CONCURRENCY = 32  # Requests in flight across all sites
+
+# Metrics settings
+METRICS_PORT = None  # Serve Prometheus-style text on 127.0.0.1:<port>/metrics
+METRICS_SNAPSHOT_FILE = None  # Path of a JSON snapshot rewritten every interval
+METRICS_SNAPSHOT_INTERVAL = 15  # seconds
+
+# Profiling settings
+PROFILE_MODE = None  # 'cpu', 'mem' or 'both' to profile each phase of a run
+PROFILE_DIR = os.path.join(BASE_DIR, 'storage/profiles')
+PROFILE_TOP = 30  # Functions / allocation sites listed per report
+
+# Tracing settings
+TRACE_FILE = None  # JSONL file for per-URL spans; None disables tracing
+TRACE_SAMPLE_RATE = 1.0  # Share of URLs (0-1) whose spans are recorded
+
+# Transport settings: 'live' uses the network, 'record' also saves every response
+# to TRANSPORT_ARCHIVE_DIR, 'replay' answers only from that archive
+TRANSPORT_MODE = 'live'
+TRANSPORT_ARCHIVE_DIR = os.path.join(BASE_DIR, 'storage/transport')
+REPLAY_LATENCY = 0.0  # Seconds added to every replayed response
+REPLAY_JITTER = 0.0  # Up to this many extra random seconds per response
+REPLAY_ERROR_RATE = 0.0  # Share of replayed requests that fail (0-1)
+REPLAY_ERROR_STATUS = None  # Status of injected failures; None raises a connection error
+REPLAY_SEED = None  # Fix the latency/error draws per URL and attempt, for repeatable runs
 
 # Authentication settings (for authorized scraping only)
 AUTH_CREDENTIALS = {
@@ -0,0 +1,32 @@
+"""
+Crawl components, imported on first use
+
+Most of these pull in requests or BeautifulSoup, and JSRenderer needs Selenium,
+which is optional; importing the package itself stays cheap and works without
+Selenium installed.
+"""
+from importlib import import_module
+
+_COMPONENTS = {
+    'RequestManager': '.request_manager',
+    'ContentExtractor': '.content_extractor',
+    'SecureAuthHandler': '.auth_handler',
+    'RobotsHandler': '.robots_handler',
+    'JSRenderer': '.js_renderer',
+    'URLDiscoverer': '.url_discovery',
+    'APIDiscoverer': '.api_discovery',
+    'DownloadManager': '.download_manager'
+}
+
+def __getattr__(name):
+    module = _COMPONENTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_COMPONENTS))
+
+__all__ = list(_COMPONENTS)
@@ -1,17 +0,0 @@
-from .request_manager import RequestManager
-from .content_extractor import ContentExtractor
-from .auth_handler import AuthHandler
-from .robots_handler import RobotsHandler
-from .js_renderer import JSRenderer
-from .url_discovery import URLDiscoverer
-from .download_manager import DownloadManager
-
-__all__ = [
-    'RequestManager',
-    'ContentExtractor',
-    'AuthHandler',
-    'RobotsHandler',
-    'JSRenderer',
-    'URLDiscoverer',
-    'DownloadManager'
-]
\ No newline at end of file
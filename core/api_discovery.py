@@ -1,17 +1,63 @@
 import re
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from ..config import settings
+from ..utilities.encoding import response_text
 from ..utilities.logger import setup_logger
 from .request_manager import RequestManager
 
 logger = setup_logger(__name__)
 
+def compile_scanner(patterns):
+    """
+    Combine patterns into one precompiled alternation
+
+    Each pattern captures its endpoint in a named group, or is the endpoint as a
+    whole. Every alternative starts with a literal character, so the regex engine
+    skips ahead to candidate positions instead of trying each one.
+    """
+    return re.compile('|'.join(patterns))
+
+SCRIPT_ENDPOINT_SCANNER = compile_scanner([
+    r'fetch\(["\'](?P<fetch>.*?)["\']\)',
+    r'axios\.get\(["\'](?P<axios>.*?)["\']\)',
+    r'\.get\(["\'](?P<get>.*?)["\']\)',
+    r'\.post\(["\'](?P<post>.*?)["\']\)',
+    r'ajax\(.*?url: ["\'](?P<ajax>.*?)["\']'
+])
+
+BUNDLE_ENDPOINT_SCANNER = compile_scanner([
+    r'https?://[^"\'\s]+/(?:api|v\d)/[^"\'\s]+',
+    r'baseURL:\s*["\'](?P<base_url>.*?)["\']',
+    r'apiEndpoint:\s*["\'](?P<api_endpoint>.*?)["\']'
+])
+
+def scan_endpoints(scanner, source):
+    """
+    Return the raw endpoint strings found by one left-to-right pass of a scanner
+
+    Each search resumes just after the start of the previous match rather than
+    after its end, so calls nested inside other calls (an ajax({... url: ...})
+    containing a .get("...")) are found as well.
+    """
+    endpoints = set()
+    match = scanner.search(source)
+    while match:
+        endpoints.add(match.group(match.lastgroup or 0))
+        match = scanner.search(source, match.start() + 1)
+    return endpoints
+
 class APIDiscoverer:
-    def __init__(self, base_url):
+    def __init__(self, base_url, js_renderer=None, db=None):
         self.base_url = base_url
+        self.js_renderer = js_renderer
+        self.db = db
         self.request_manager = RequestManager()
+        self._thread_local = threading.local()
         self.common_api_paths = [
             'api', 'graphql', 'rest', 'v1', 'v2',
             'endpoint', 'service', 'data', 'ajax'
@@ -22,23 +68,13 @@ class APIDiscoverer:
         soup = BeautifulSoup(html_content, 'html.parser')
         endpoints = set()
         
-        # Check for common JavaScript patterns
+        # Find fetch/AJAX calls in inline scripts
         scripts = soup.find_all('script')
         for script in scripts:
             if script.string:
-                # Find fetch/AJAX calls
-                patterns = [
-                    r'fetch\(["\'](.*?)["\']\)',
-                    r'\.get\(["\'](.*?)["\']\)',
-                    r'\.post\(["\'](.*?)["\']\)',
-                    r'ajax\(.*?url: ["\'](.*?)["\']',
-                    r'axios\.get\(["\'](.*?)["\']\)'
-                ]
-                for pattern in patterns:
-                    matches = re.findall(pattern, script.string)
-                    for match in matches:
-                        absolute_url = urljoin(self.base_url, match)
-                        endpoints.add(absolute_url)
+                for match in scan_endpoints(SCRIPT_ENDPOINT_SCANNER, script.string):
+                    absolute_url = urljoin(self.base_url, match)
+                    endpoints.add(absolute_url)
                         
         # Check for links that might be API endpoints
         for a in soup.find_all('a', href=True):
@@ -51,61 +87,117 @@ class APIDiscoverer:
         
     def discover_from_js(self, js_content):
         """Find API endpoints in JavaScript files"""
-        endpoints = set()
-        
-        # Look for common API URL patterns
-        patterns = [
-            r'https?://[^"\'\s]+/api/[^"\'\s]+',
-            r'https?://[^"\'\s]+/v\d/[^"\'\s]+',
-            r'baseURL:\s*["\'](.*?)["\']',
-            r'apiEndpoint:\s*["\'](.*?)["\']'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, js_content)
-            for match in matches:
-                absolute_url = urljoin(self.base_url, match)
-                endpoints.add(absolute_url)
-                
-        return endpoints
+        return {urljoin(self.base_url, match)
+                for match in scan_endpoints(BUNDLE_ENDPOINT_SCANNER, js_content)}
+
+    def discover_from_bundle(self, js_url):
+        """
+        Find API endpoints in a JavaScript file, reusing earlier scans
+
+        Bundles are cached by URL and content hash. A cached bundle is revalidated
+        with a conditional request, and its endpoints are reused without rescanning
+        when the server answers 304 or the body hashes the same as last time.
+        """
+        cached = self.db.get_bundle_scan(js_url) if self.db else None
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        js_response = self.request_manager.make_request(
+            js_url, headers=headers, accept_status=(200, 304))
+        if not js_response:
+            return set()
+
+        if js_response.status_code == 304 and cached:
+            matches = cached['endpoints']
+        elif 'javascript' not in js_response.headers.get('content-type', ''):
+            return set()
+        else:
+            content_hash = hashlib.sha256(js_response.content).hexdigest()
+            if cached and cached['content_hash'] == content_hash:
+                matches = cached['endpoints']
+            else:
+                matches = sorted(scan_endpoints(BUNDLE_ENDPOINT_SCANNER, response_text(js_response)))
+            if self.db:
+                self.db.save_bundle_scan(
+                    js_url,
+                    content_hash,
+                    js_response.headers.get('etag'),
+                    js_response.headers.get('last-modified'),
+                    matches)
+
+        return {urljoin(self.base_url, match) for match in matches}
         
+    def get_domain(self, url):
+        """Extract domain from URL"""
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def is_related_host(self, url):
+        """Check if URL is served by the site or one of its subdomains"""
+        site = urlparse(self.base_url).netloc.lower()
+        if site.startswith('www.'):
+            site = site[4:]
+        host = urlparse(url).netloc.lower()
+        return host == site or host.endswith('.' + site)
+
+    def endpoints_from_requests(self, network_requests):
+        """Keep the XHR/fetch requests a rendered page made to the site itself"""
+        return {request['url'] for request in network_requests
+                if self.is_related_host(request['url'])}
+
     def discover_from_network(self, url):
-        """Analyze network traffic (requires Selenium or browser dev tools)"""
-        # This would require integration with Selenium or a proxy
-        # For now, we'll just return an empty set
-        return set()
+        """Render the page and return the XHR/fetch endpoints it called"""
+        if not self.js_renderer:
+            return set()
+        if not self.js_renderer.render_page(url):
+            return set()
+        return self.endpoints_from_requests(self.js_renderer.network_requests)
+
+    def _probe(self, test_url):
+        """Request a guessed API path, one session per worker thread"""
+        if not hasattr(self._thread_local, 'request_manager'):
+            self._thread_local.request_manager = RequestManager()
+        response = self._thread_local.request_manager.make_request(test_url)
+        return test_url if response and response.status_code == 200 else None
+
+    def probe_common_paths(self):
+        """Check common API paths directly, several at a time"""
+        test_urls = [urljoin(self.base_url, api_path) for api_path in self.common_api_paths]
+        with ThreadPoolExecutor(max_workers=settings.CONCURRENT_REQUESTS) as executor:
+            return {url for url in executor.map(self._probe, test_urls) if url}
         
     def discover_api_endpoints(self):
         """Main method to discover all API endpoints"""
         logger.info(f"Starting API endpoint discovery for {self.base_url}")
         
+        # Endpoints the page actually called are kept without further filtering
+        observed_endpoints = self.discover_from_network(self.base_url)
+
         # First get the main page
         response = self.request_manager.make_request(self.base_url)
         if not response:
-            return set()
+            return observed_endpoints
             
         endpoints = set()
         
         # Discover from HTML
         if 'text/html' in response.headers.get('content-type', ''):
-            html_endpoints = self.discover_from_html(response.text)
+            html_endpoints = self.discover_from_html(response_text(response))
             endpoints.update(html_endpoints)
             
             # Find JavaScript files
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(response_text(response), 'html.parser')
             for script in soup.find_all('script', src=True):
                 js_url = urljoin(self.base_url, script['src'])
-                js_response = self.request_manager.make_request(js_url)
-                if js_response and 'javascript' in js_response.headers.get('content-type', ''):
-                    js_endpoints = self.discover_from_js(js_response.text)
-                    endpoints.update(js_endpoints)
+                endpoints.update(self.discover_from_bundle(js_url))
                     
-        # Check common API paths directly
-        for api_path in self.common_api_paths:
-            test_url = urljoin(self.base_url, api_path)
-            test_response = self.request_manager.make_request(test_url)
-            if test_response and test_response.status_code == 200:
-                endpoints.add(test_url)
+        # Guessing paths costs a request each, so it is opt-in
+        if settings.PROBE_COMMON_API_PATHS:
+            endpoints.update(self.probe_common_paths())
                 
         # Filter out non-API-looking endpoints
         filtered_endpoints = set()
@@ -119,6 +211,8 @@ class APIDiscoverer:
             # Or if response looks like JSON
             elif endpoint.endswith(('.json', '.xml')):
                 filtered_endpoints.add(endpoint)
+
+        filtered_endpoints.update(observed_endpoints)
                 
         logger.info(f"Discovered {len(filtered_endpoints)} API endpoints")
         return filtered_endpoints
\ No newline at end of file
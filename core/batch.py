@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
+from ..config import settings
+from ..utilities import metrics
+from ..utilities.logger import setup_logger
+from ..utilities.validator import is_valid_url
+from . import dns_cache
+from .concurrency import HOST_LIMITS
+from .transport import close_transport
+
+logger = setup_logger(__name__)
+
+SITES = metrics.counter('scraper_batch_sites_total', 'Sites finished in batch runs by result', ['result'])
+
+SUMMARY_FILE = 'batch_summary.json'
+
+def read_seed_file(path):
+    """
+    Read base URLs from a seed file: one per line, blank lines and # comments ignored
+
+    Returns:
+        List of unique valid URLs in file order
+    """
+    seeds = []
+    seen = set()
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            url = line.split('#', 1)[0].strip().rstrip('/')
+            if not url:
+                continue
+            if not is_valid_url(url):
+                logger.warning(f"Skipping invalid seed on line {number}: {url}")
+                continue
+            if url not in seen:
+                seen.add(url)
+                seeds.append(url)
+    return seeds
+
+def site_directory_name(url):
+    """Filesystem-safe directory name for a site, e.g. example.com_blog"""
+    parsed = urlparse(url)
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', f'{parsed.netloc}{parsed.path}').strip('_.')
+    return name or 'site'
+
+class BatchRunner:
+    def __init__(self, seeds, scraper_class, output_dir=None, sites=None, global_concurrency=None,
+                 export_formats=None):
+        """
+        Crawl many sites concurrently in one process
+
+        Sites share the process's connection pool, robots.txt handlers, DNS
+        cache, circuit breakers and per-host limiters; a global budget caps the
+        requests in flight across all of them. Each site keeps its own
+        database, media and exports in a subdirectory of output_dir.
+
+        Args:
+            seeds: Base URLs to crawl
+            scraper_class: Crawls one site; called as scraper_class(url, export_formats=...,
+                data_dir=..., standalone=False) and must provide run() -> bool
+            output_dir: Directory for the per-site subdirectories (default: settings.BATCH_OUTPUT_DIR)
+            sites: Sites crawled at the same time (default: settings.BATCH_SITES)
+            global_concurrency: Requests in flight across all sites (default: settings.BATCH_GLOBAL_CONCURRENCY)
+            export_formats: Export formats written for every site
+        """
+        self.seeds = list(seeds)
+        self.scraper_class = scraper_class
+        self.output_dir = output_dir or settings.BATCH_OUTPUT_DIR
+        self.sites = sites or settings.BATCH_SITES
+        self.global_concurrency = global_concurrency or settings.BATCH_GLOBAL_CONCURRENCY
+        self.export_formats = export_formats or ['json']
+
+    def _site_directories(self):
+        """Directory per seed; seeds that map to the same name get numbered ones"""
+        directories = {}
+        used = set()
+        for url in self.seeds:
+            name = base = site_directory_name(url)
+            counter = 1
+            while name in used:
+                name = f'{base}_{counter}'
+                counter += 1
+            used.add(name)
+            directories[url] = os.path.join(self.output_dir, name)
+        return directories
+
+    def _run_site(self, url, data_dir):
+        """Crawl one site into its own directory; never raises"""
+        started = time.perf_counter()
+        success = False
+        try:
+            scraper = self.scraper_class(url, export_formats=self.export_formats,
+                                         data_dir=data_dir, standalone=False)
+            success = scraper.run()
+        except Exception as e:
+            logger.error(f"Batch site {url} failed: {str(e)}")
+        SITES.inc(result='ok' if success else 'failed')
+        return {'url': url, 'success': success, 'data_dir': data_dir,
+                'seconds': round(time.perf_counter() - started, 2)}
+
+    def run(self):
+        """
+        Crawl every seed and write a summary to output_dir
+
+        Returns:
+            Dict with sites, succeeded, failed, seconds and sites_per_minute
+        """
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        HOST_LIMITS.set_global_limit(self.global_concurrency)
+        if settings.DNS_CACHE_TTL:
+            dns_cache.install(settings.DNS_CACHE_TTL)
+        metrics_server = metrics_writer = None
+        if settings.METRICS_PORT:
+            metrics_server = metrics.start_http_server(settings.METRICS_PORT)
+        if settings.METRICS_SNAPSHOT_FILE:
+            metrics_writer = metrics.SnapshotWriter(settings.METRICS_SNAPSHOT_FILE,
+                                                    settings.METRICS_SNAPSHOT_INTERVAL)
+
+        logger.info(f"Batch of {len(self.seeds)} sites, {self.sites} at a time, "
+                    f"{self.global_concurrency} requests in flight at most")
+        results = []
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.sites, thread_name_prefix='site') as executor:
+                futures = [executor.submit(self._run_site, url, data_dir)
+                           for url, data_dir in self._site_directories().items()]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    logger.info(f"[{len(results)}/{len(self.seeds)}] {result['url']}: "
+                                f"{'ok' if result['success'] else 'failed'} in {result['seconds']}s")
+        finally:
+            HOST_LIMITS.set_global_limit(None)
+            dns_cache.uninstall()
+            close_transport()
+            if metrics_writer:
+                metrics_writer.stop()
+            if metrics_server:
+                metrics_server.shutdown()
+
+        seconds = time.perf_counter() - started
+        succeeded = sum(1 for result in results if result['success'])
+        stats = {
+            'sites': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'seconds': round(seconds, 2),
+            'sites_per_minute': round(len(results) / seconds * 60, 1) if seconds else 0.0
+        }
+        summary_path = os.path.join(self.output_dir, SUMMARY_FILE)
+        try:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                json.dump({'stats': stats, 'sites': sorted(results, key=lambda item: item['url'])}, f, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to write batch summary {summary_path}: {str(e)}")
+        return stats
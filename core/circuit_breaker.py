@@ -0,0 +1,233 @@
+"""
+Per-host circuit breakers
+
+A host's breaker is closed while requests mostly succeed. Once enough of its
+recent requests failed (error ratio over a sliding window, or a run of
+timeouts), it opens: requests to the host are refused without touching the
+network until the cool-down passes. Then it is half-open and lets a single
+probe through; success closes it again, failure re-opens it with a doubled
+cool-down. A host whose probes keep failing is given up on for the run.
+
+Host health is judged across distinct URLs. A URL that already failed is
+remembered: its retries stay out of the window, since a page that always
+returns 500 says nothing new about the rest of the site, and the half-open
+probe goes to a URL that hasn't failed yet. Every admission carries the
+breaker's generation, which changes whenever the breaker opens, so the
+result of a request admitted before that is ignored.
+"""
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from ..config import settings
+from ..utilities import metrics
+from ..utilities.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+DEAD = 'dead'
+
+# Request outcomes fed to record()
+SUCCESS = 'success'
+FAILURE = 'failure'
+TIMEOUT = 'timeout'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2, DEAD: 3}
+CIRCUIT_STATE = metrics.gauge('scraper_circuit_state',
+                              'Breaker state per host (0 closed, 1 half-open, 2 open, 3 given up)', ['host'])
+CIRCUIT_REJECTED = metrics.counter('scraper_circuit_rejected_total',
+                                   'Requests refused because the host breaker was open', ['host'])
+
+# Failed URLs remembered per host, oldest forgotten first
+MAX_FAILED_URLS = 10000
+
+# Handed out by allow() and passed back to record()
+Admission = namedtuple('Admission', ['generation', 'url', 'probe'])
+
+class CircuitBreaker:
+    def __init__(self, host, window=20, min_requests=5, failure_ratio=0.5, max_timeouts=3,
+                 open_seconds=30, max_open_seconds=600, max_probes=5, clock=time.monotonic):
+        """
+        Args:
+            host: Host this breaker guards (for logs and metrics)
+            window: Recent distinct URLs the failure ratio is computed over
+            min_requests: URLs in the window before the ratio can trip the breaker
+            failure_ratio: Share of failed URLs (0-1) that opens the breaker
+            max_timeouts: Timeouts in a row that open the breaker regardless of the ratio
+            open_seconds: First cool-down before a probe; doubles with every failed probe.
+                A half-open breaker waits this long for a fresh URL before letting a
+                URL that failed before probe instead.
+            max_open_seconds: Longest cool-down
+            max_probes: Failed probes in a row before the host is given up on
+            clock: Monotonic time source
+        """
+        self.host = host
+        self.outcomes = deque(maxlen=window)
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.max_timeouts = max_timeouts
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.max_probes = max_probes
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.generation = 0
+        self.failed_urls = OrderedDict()
+        self.timeouts_in_a_row = 0
+        self.failed_probes = 0
+        self.opened_until = 0.0
+        self.half_open_since = 0.0
+        self.probe_in_flight = False
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], host=host)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.info(f"Circuit for {self.host}: {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.set(STATE_VALUES[state], host=self.host)
+
+    def _open(self):
+        cool_down = min(self.open_seconds * 2 ** self.failed_probes, self.max_open_seconds)
+        self.opened_until = self.clock() + cool_down
+        self.probe_in_flight = False
+        self.generation += 1
+        self._set_state(OPEN)
+
+    def _refresh(self):
+        if self.state == OPEN and self.clock() >= self.opened_until:
+            self.half_open_since = self.clock()
+            self._set_state(HALF_OPEN)
+
+    def _retry_probe_in(self):
+        """Seconds until a URL that failed before may be the probe"""
+        return max(0.0, self.half_open_since + self.open_seconds - self.clock())
+
+    def _remember_failure(self, url):
+        self.failed_urls[url] = True
+        self.failed_urls.move_to_end(url)
+        while len(self.failed_urls) > MAX_FAILED_URLS:
+            self.failed_urls.popitem(last=False)
+
+    def allow(self, url=None):
+        """
+        Ask to send a request to the host
+
+        A closed breaker admits everything. A half-open one admits one probe,
+        preferring a URL that hasn't failed before.
+
+        Returns:
+            Admission to pass back to record(), or None if the request must not go out
+        """
+        with self.lock:
+            self._refresh()
+            if self.state == CLOSED:
+                return Admission(self.generation, url, False)
+            if (self.state == HALF_OPEN and not self.probe_in_flight and
+                    (url not in self.failed_urls or self._retry_probe_in() == 0)):
+                self.probe_in_flight = True
+                return Admission(self.generation, url, True)
+        CIRCUIT_REJECTED.inc(host=self.host)
+        return None
+
+    def retry_in(self, url=None):
+        """Seconds until the breaker may admit a request for url again (None once given up)"""
+        with self.lock:
+            self._refresh()
+            if self.state == DEAD:
+                return None
+            if self.state == OPEN:
+                return max(0.0, self.opened_until - self.clock())
+            if self.state == HALF_OPEN:
+                if self.probe_in_flight:
+                    return 1.0  # Check back once the probe has had time to finish
+                if url in self.failed_urls:
+                    return self._retry_probe_in()
+            return 0.0
+
+    @property
+    def given_up(self):
+        return self.state == DEAD
+
+    def record(self, outcome, admission):
+        """
+        Feed back the result of an admitted request
+
+        Args:
+            outcome: SUCCESS, FAILURE, TIMEOUT, or None for results that say
+                nothing about the host's health (only frees the probe slot)
+            admission: What allow() returned for the request
+        """
+        with self.lock:
+            if admission.generation != self.generation:
+                # Admitted before the breaker last opened
+                return
+            retried = admission.url in self.failed_urls
+            if outcome == SUCCESS:
+                self.failed_urls.pop(admission.url, None)
+            elif outcome is not None and admission.url is not None:
+                self._remember_failure(admission.url)
+
+            if admission.probe:
+                self.probe_in_flight = False
+                if outcome is None:
+                    return
+                if outcome == SUCCESS:
+                    self.outcomes.clear()
+                    self.timeouts_in_a_row = 0
+                    self.failed_probes = 0
+                    self._set_state(CLOSED)
+                elif retried:
+                    # A page known to fail failing again isn't news about the host
+                    logger.debug(f"Probe of {self.host} with a retried URL failed; circuit stays half-open")
+                else:
+                    self.failed_probes += 1
+                    if self.failed_probes >= self.max_probes:
+                        self._set_state(DEAD)
+                        logger.warning(f"Giving up on {self.host} after {self.failed_probes} failed probes")
+                    else:
+                        self._open()
+                return
+            if outcome is None or retried:
+                return
+
+            self.outcomes.append(outcome != SUCCESS)
+            self.timeouts_in_a_row = self.timeouts_in_a_row + 1 if outcome == TIMEOUT else 0
+            failures = sum(self.outcomes)
+            if (self.timeouts_in_a_row >= self.max_timeouts or
+                    (len(self.outcomes) >= self.min_requests and
+                     failures / len(self.outcomes) >= self.failure_ratio)):
+                logger.warning(f"Opening circuit for {self.host}: {failures} of the last "
+                               f"{len(self.outcomes)} URLs failed")
+                self._open()
+
+class CircuitBreakers:
+    def __init__(self):
+        """Breakers for every host, created on first use from settings"""
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, host):
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(
+                    host,
+                    window=settings.CIRCUIT_WINDOW,
+                    min_requests=settings.CIRCUIT_MIN_REQUESTS,
+                    failure_ratio=settings.CIRCUIT_FAILURE_RATIO,
+                    max_timeouts=settings.CIRCUIT_MAX_TIMEOUTS,
+                    open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+                    max_open_seconds=settings.CIRCUIT_MAX_OPEN_SECONDS,
+                    max_probes=settings.CIRCUIT_MAX_PROBES
+                )
+            return breaker
+
+    def reset(self):
+        with self.lock:
+            self.breakers.clear()
+
+# Shared by every RequestManager in the process
+BREAKERS = CircuitBreakers()
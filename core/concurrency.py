@@ -0,0 +1,207 @@
+"""
+Per-host request slots with AIMD-adjusted concurrency
+
+Every request takes a slot from its host's limiter first. The limiter allows
+up to `limit` requests in flight and spaces request starts by the host's
+minimum interval (robots.txt crawl-delay or DELAY_BETWEEN_REQUESTS, whichever
+is longer). With ADAPTIVE_CONCURRENCY the limit grows by about one per round
+of completed requests while latency stays near its baseline, and is cut
+multiplicatively on rising latency, timeouts, 429/503 or Retry-After, which
+also pauses new requests to the host for the time asked for.
+
+The minimum interval takes precedence: with a 2 s delay and 100 ms responses
+only one request is ever in flight, whatever the limit. The limit therefore
+only grows while the host actually has `limit` requests in flight, so it
+reports what the host is sustaining rather than drifting up to the ceiling;
+in practice AIMD matters when the delay is 0 or shorter than response times.
+
+An optional global budget (a semaphore shared by every limiter) caps the
+requests in flight across all hosts, for batch runs over many sites.
+"""
+import threading
+import time
+from ..config import settings
+from ..utilities import metrics
+from ..utilities.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Statuses that mean the server wants fewer requests
+PRESSURE_STATUSES = (429, 503)
+
+HOST_CONCURRENCY = metrics.gauge('scraper_host_concurrency', 'Current concurrency limit per host', ['host'])
+HOST_IN_FLIGHT = metrics.gauge('scraper_host_in_flight', 'Requests in flight per host', ['host'])
+HOST_BACKOFFS = metrics.counter('scraper_host_backoffs_total',
+                                'Concurrency cuts per host by reason', ['host', 'reason'])
+
+class HostLimiter:
+    def __init__(self, host, initial=2, ceiling=8, min_interval=0.0, adaptive=True,
+                 latency_tolerance=2.0, decrease=0.5, budget=None, clock=time.monotonic):
+        """
+        Args:
+            host: Host this limiter guards (for logs and metrics)
+            initial: Concurrency to start with
+            ceiling: Highest concurrency the limit may grow to
+            min_interval: Seconds between the starts of two requests to the host
+            adaptive: Adjust the limit from responses; otherwise it stays at ceiling
+            latency_tolerance: Latency above baseline * tolerance counts as pressure
+            decrease: Factor the limit is multiplied by on pressure
+            budget: Semaphore shared with other hosts' limiters, taken for every request
+            clock: Monotonic time source
+        """
+        self.host = host
+        self.ceiling = max(1, ceiling)
+        self.adaptive = adaptive
+        self.limit = float(min(max(1, initial), self.ceiling) if adaptive else self.ceiling)
+        self.min_interval = min_interval
+        self.latency_tolerance = latency_tolerance
+        self.decrease = decrease
+        self.budget = budget
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.baseline = None
+        self.last_decrease = float('-inf')
+        HOST_CONCURRENCY.set(self.limit, host=host)
+
+    def acquire(self):
+        """
+        Wait for a slot: below the limit, past the minimum interval and any pause
+
+        Returns:
+            Seconds spent waiting
+        """
+        started = self.clock()
+        with self.condition:
+            while True:
+                now = self.clock()
+                ready_at = max(self.next_start, self.paused_until)
+                if self.in_flight < int(self.limit) and now >= ready_at:
+                    self.in_flight += 1
+                    self.next_start = now + self.min_interval
+                    HOST_IN_FLIGHT.set(self.in_flight, host=self.host)
+                    break
+                # Full: wait for a release; only spacing/pause left: wait until it ends
+                self.condition.wait(None if self.in_flight >= int(self.limit) else ready_at - now)
+        # Taken last and outside the host's lock, so waiting for it never holds up other hosts
+        if self.budget is not None:
+            self.budget.acquire()
+        return self.clock() - started
+
+    def release(self, latency=None, status=None, retry_after=None, timed_out=False):
+        """
+        Return a slot and adjust the limit from how the request went
+
+        Args:
+            latency: Seconds until the response arrived (None if it failed)
+            status: HTTP status of the response
+            retry_after: Seconds asked for by a Retry-After header
+            timed_out: The request timed out
+        """
+        if self.budget is not None:
+            self.budget.release()
+        with self.condition:
+            # Whether the limit, rather than the spacing, was holding requests back
+            was_full = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            HOST_IN_FLIGHT.set(self.in_flight, host=self.host)
+            now = self.clock()
+            if retry_after:
+                self.paused_until = max(self.paused_until,
+                                        now + min(retry_after, settings.RETRY_AFTER_MAX))
+            if self.adaptive:
+                self._adjust(now, latency, status, retry_after, timed_out, was_full)
+            self.condition.notify_all()
+
+    def _adjust(self, now, latency, status, retry_after, timed_out, was_full):
+        reason = None
+        if timed_out:
+            reason = 'timeout'
+        elif status in PRESSURE_STATUSES:
+            reason = str(status)
+        elif retry_after:
+            reason = 'retry_after'
+        elif latency is not None:
+            if self.baseline is None:
+                self.baseline = latency
+            elif latency > self.baseline * self.latency_tolerance:
+                reason = 'latency'
+            else:
+                # Baseline follows healthy responses only
+                self.baseline = 0.9 * self.baseline + 0.1 * latency
+
+        if reason:
+            # Requests already in flight report the same overload; cut once per round trip
+            if now - self.last_decrease >= (self.baseline or 0.0):
+                self.limit = max(1.0, self.limit * self.decrease)
+                self.last_decrease = now
+                HOST_BACKOFFS.inc(host=self.host, reason=reason)
+                logger.debug(f"Concurrency for {self.host} down to {self.limit:.1f} ({reason})")
+        elif latency is not None and was_full:
+            # About +1 per round of `limit` completed requests
+            self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+        HOST_CONCURRENCY.set(round(self.limit, 2), host=self.host)
+
+class HostLimits:
+    def __init__(self):
+        """Limiters for every host, created on first use from settings"""
+        self.lock = threading.Lock()
+        self.limiters = {}
+        self.crawl_delays = {}
+        self.budget = None
+        self.global_limit = None
+
+    def _min_interval(self, host):
+        if settings.TRANSPORT_MODE == 'replay':
+            return 0.0  # Replayed responses come from disk, not the site
+        return max(settings.DELAY_BETWEEN_REQUESTS, self.crawl_delays.get(host, 0.0))
+
+    def get(self, host):
+        with self.lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = HostLimiter(
+                    host,
+                    initial=settings.HOST_CONCURRENCY_INITIAL,
+                    ceiling=settings.HOST_CONCURRENCY_MAX,
+                    min_interval=self._min_interval(host),
+                    adaptive=settings.ADAPTIVE_CONCURRENCY,
+                    latency_tolerance=settings.HOST_LATENCY_TOLERANCE,
+                    decrease=settings.HOST_CONCURRENCY_DECREASE,
+                    budget=self.budget
+                )
+            return limiter
+
+    def set_crawl_delay(self, host, seconds):
+        """Apply a robots.txt crawl-delay: request starts to host stay at least this far apart"""
+        with self.lock:
+            self.crawl_delays[host] = seconds
+            limiter = self.limiters.get(host)
+        if limiter is not None:
+            with limiter.condition:
+                limiter.min_interval = self._min_interval(host)
+
+    def max_in_flight(self):
+        """Most requests one host can have in flight: its ceiling, or the global budget if lower"""
+        ceiling = max(1, settings.HOST_CONCURRENCY_MAX)
+        return min(ceiling, self.global_limit) if self.global_limit else ceiling
+
+    def set_global_limit(self, limit):
+        """Cap requests in flight across all hosts (None: no cap); set it before crawling starts"""
+        with self.lock:
+            self.global_limit = limit or None
+            self.budget = threading.BoundedSemaphore(limit) if limit else None
+            for limiter in self.limiters.values():
+                limiter.budget = self.budget
+
+    def reset(self):
+        with self.lock:
+            self.limiters.clear()
+            self.crawl_delays.clear()
+            self.budget = None
+            self.global_limit = None
+
+# Shared by every RequestManager in the process
+HOST_LIMITS = HostLimits()
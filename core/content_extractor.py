@@ -0,0 +1,156 @@
+import re
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlparse
+from ..config import settings
+from ..utilities import metrics, tracing
+from ..utilities.encoding import response_text
+from ..utilities.logger import setup_logger
+from .concurrency import HOST_LIMITS
+from .render_policy import RenderDecider
+from .request_manager import POLITENESS_WAIT, RequestManager
+
+logger = setup_logger(__name__)
+
+PARSE_SECONDS = metrics.histogram('scraper_parse_seconds', 'Time spent parsing HTML', ['stage'])
+
+class ContentExtractor:
+    def __init__(self, base_url, use_js=False, js_renderer=None, js_mode=None):
+        """
+        Initialize the content extractor
+
+        Args:
+            base_url: The root URL links are resolved against
+            use_js: Whether pages may be rendered with JavaScript
+            js_renderer: Shared JSRenderer instance (created on demand if omitted)
+            js_mode: 'always' renders every page, 'hybrid' only renders pages that need it
+        """
+        self.base_url = base_url
+        self.request_manager = RequestManager()
+        self.use_js = use_js
+        self.js_mode = js_mode or settings.JS_RENDER_MODE
+        self.js_renderer = js_renderer
+        self.render_decider = RenderDecider()
+        if use_js and self.js_renderer is None:
+            from .js_renderer import JSRenderer
+            self.js_renderer = JSRenderer()
+        
+    @tracing.traced('parse.media')
+    @PARSE_SECONDS.time(stage='media')
+    def extract_media_links(self, html_content):
+        """Extract all media links from HTML content"""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        media_links = set()
+        
+        # Images
+        for img in soup.find_all('img', src=True):
+            src = img['src'].strip()
+            absolute_url = urljoin(self.base_url, src)
+            media_links.add(('image', absolute_url))
+            
+        # Videos
+        for video in soup.find_all('video', src=True):
+            src = video['src'].strip()
+            absolute_url = urljoin(self.base_url, src)
+            media_links.add(('video', absolute_url))
+            
+        # Audio
+        for audio in soup.find_all('audio', src=True):
+            src = audio['src'].strip()
+            absolute_url = urljoin(self.base_url, src)
+            media_links.add(('audio', absolute_url))
+            
+        # Embedded content (iframes)
+        for iframe in soup.find_all('iframe', src=True):
+            src = iframe['src'].strip()
+            absolute_url = urljoin(self.base_url, src)
+            media_links.add(('embedded', absolute_url))
+            
+        # CSS background images
+        for element in soup.find_all(style=True):
+            style = element['style']
+            urls = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', style)
+            for url in urls:
+                absolute_url = urljoin(self.base_url, url.strip())
+                media_links.add(('background_image', absolute_url))
+                
+        return media_links
+        
+    @tracing.traced('parse.text')
+    @PARSE_SECONDS.time(stage='text')
+    def extract_text_content(self, html_content):
+        """Extract and clean text content from HTML"""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        
+        # Remove unwanted elements
+        for element in soup(['script', 'style', 'nav', 'footer', 'head']):
+            element.decompose()
+            
+        # Get text
+        text = soup.get_text(separator='\n', strip=True)
+        
+        # Clean up multiple newlines
+        text = '\n'.join(line for line in text.split('\n') if line.strip())
+        
+        return text
+        
+    def _html_result(self, url, html_content):
+        return {
+            'url': url,
+            'type': 'html',
+            'text': self.extract_text_content(html_content),
+            'media': list(self.extract_media_links(html_content))
+        }
+
+    @tracing.traced('render')
+    def _render(self, url):
+        # The browser's page load is a request to the host like any other: it
+        # takes a slot, so crawl-delay spaces it from the static fetch too
+        limiter = HOST_LIMITS.get(urlparse(url).netloc)
+        with tracing.span('politeness_wait'):
+            waited = limiter.acquire()
+        if waited:
+            POLITENESS_WAIT.inc(waited)
+        try:
+            html_content = self.js_renderer.render_page(url)
+        finally:
+            # No latency: render time says little about the server and must not
+            # move the host's baseline
+            limiter.release()
+        if not html_content:
+            return None
+        result = self._html_result(url, html_content)
+        result['network_requests'] = self.js_renderer.network_requests
+        return result
+
+    @tracing.traced('extract')
+    def extract_from_page(self, url):
+        """Extract all content from a specific page"""
+        if self.use_js:
+            if self.js_mode == 'always':
+                return self._render(url)
+
+            # Pattern already known to need a browser: skip the static fetch
+            if self.render_decider.decision_for(url):
+                return self._render(url)
+
+        response = self.request_manager.make_request(url)
+        if not response:
+            return None
+
+        content_type = response.headers.get('content-type', '')
+        if 'text/html' in content_type:
+            if self.use_js and self.render_decider.decision_for(url) is None:
+                needs_js, reason = self.render_decider.needs_js(response_text(response))
+                self.render_decider.record(url, needs_js)
+                if needs_js:
+                    logger.debug(f"Rendering {url} with JavaScript: {reason}")
+                    rendered = self._render(url)
+                    if rendered:
+                        return rendered
+            return self._html_result(url, response_text(response))
+        else:
+            return {
+                'url': url,
+                'type': content_type.split(';')[0],
+                'content': response.content
+            }
@@ -0,0 +1,67 @@
+"""
+Process-wide cache for host name lookups
+
+Installing the cache replaces socket.getaddrinfo, which urllib3 calls for every
+new connection, with a version that remembers answers for a TTL. Batch runs
+open connections to thousands of hosts from many threads, and sites on the
+same hosting share CDN and asset hosts, so most lookups repeat. Failed lookups
+are not cached.
+"""
+import socket
+import threading
+import time
+from ..utilities import metrics
+
+DNS_LOOKUPS = metrics.counter('scraper_dns_lookups_total', 'Host name lookups by cache result', ['result'])
+
+_original_getaddrinfo = socket.getaddrinfo
+_installed = None
+
+class DNSCache:
+    def __init__(self, ttl=300, max_entries=10000, resolver=None, clock=time.monotonic):
+        """
+        Args:
+            ttl: Seconds an answer is reused
+            max_entries: Answers kept before the oldest are evicted
+            resolver: getaddrinfo-compatible function asked on a miss
+            clock: Monotonic time source
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.resolver = resolver or _original_getaddrinfo
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                DNS_LOOKUPS.inc(result='hit')
+                return list(entry[1])
+        DNS_LOOKUPS.inc(result='miss')
+        result = self.resolver(host, port, family, type, proto, flags)
+        with self.lock:
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.max_entries:
+                # Dicts keep insertion order: the first entry is the oldest
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = (now + self.ttl, result)
+        return list(result)
+
+def install(ttl=300):
+    """Route socket.getaddrinfo through a DNSCache; returns the cache"""
+    global _installed
+    if _installed is None:
+        _installed = DNSCache(ttl)
+        socket.getaddrinfo = _installed.getaddrinfo
+    return _installed
+
+def uninstall():
+    """Restore the resolver that was in place before install()"""
+    global _installed
+    if _installed is not None:
+        socket.getaddrinfo = _original_getaddrinfo
+        _installed = None
@@ -3,15 +3,21 @@ import mimetypes
 from pathlib import Path
 from urllib.parse import urlparse
 from ..config import settings
+from ..utilities import metrics, tracing
 from ..utilities.logger import setup_logger
 from .request_manager import RequestManager
 
 logger = setup_logger(__name__)
 
+DOWNLOADS = metrics.counter('scraper_downloads_total', 'Media downloads by result', ['result'])
+DOWNLOAD_BYTES = metrics.counter('scraper_download_bytes_total', 'Bytes written by media downloads')
+DOWNLOAD_SECONDS = metrics.histogram('scraper_download_seconds', 'Time to download a media file')
+
 class DownloadManager:
-    def __init__(self):
+    def __init__(self, media_dir=None):
         self.request_manager = RequestManager()
-        Path(settings.MEDIA_STORAGE).mkdir(parents=True, exist_ok=True)
+        self.media_dir = media_dir or settings.MEDIA_STORAGE
+        Path(self.media_dir).mkdir(parents=True, exist_ok=True)
         
     def get_filename_from_url(self, url):
         """Extract filename from URL"""
@@ -40,34 +46,50 @@ class DownloadManager:
         else:
             return 'other'
             
+    @tracing.traced('download')
+    @DOWNLOAD_SECONDS.time()
     def download_file(self, url, save_path=None):
         """Download a file from URL to local storage"""
         if not save_path:
             filename = self.get_filename_from_url(url)
-            save_path = os.path.join(settings.MEDIA_STORAGE, filename)
+            save_path = os.path.join(self.media_dir, filename)
             
         response = self.request_manager.make_request(url, stream=True)
         if not response:
+            DOWNLOADS.inc(result='failed')
             return None
             
         # Ensure directory exists
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         
-        # Handle potential filename conflicts
+        # Handle potential filename conflicts; 'xb' claims the name atomically,
+        # since other download threads may be picking names in the same directory
         counter = 1
         original_save_path = save_path
-        while os.path.exists(save_path):
-            base, ext = os.path.splitext(original_save_path)
-            save_path = f"{base}_{counter}{ext}"
-            counter += 1
+        while True:
+            try:
+                f = open(save_path, 'xb')
+                break
+            except FileExistsError:
+                base, ext = os.path.splitext(original_save_path)
+                save_path = f"{base}_{counter}{ext}"
+                counter += 1
+            except OSError as e:
+                logger.error(f"Failed to download {url}: {str(e)}")
+                DOWNLOADS.inc(result='failed')
+                response.close()
+                return None
             
         try:
-            with open(save_path, 'wb') as f:
+            # Closing the response gives back the host slot make_request held for the body
+            with response, f:
                 for chunk in response.iter_content(chunk_size=8192):
                     if chunk:
                         f.write(chunk)
                         
-            logger.info(f"Successfully downloaded {url} to {save_path}")
+            logger.debug(f"Successfully downloaded {url} to {save_path}")
+            DOWNLOADS.inc(result='ok')
+            DOWNLOAD_BYTES.inc(os.path.getsize(save_path))
             return {
                 'url': url,
                 'local_path': save_path,
@@ -76,5 +98,6 @@ class DownloadManager:
             }
         except Exception as e:
             logger.error(f"Failed to download {url}: {str(e)}")
+            DOWNLOADS.inc(result='failed')
             return None
         
\ No newline at end of file
@@ -4,6 +4,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import urljoin
+import json
 import time
 from ..config import settings
 from ..utilities.logger import setup_logger
@@ -25,13 +26,20 @@ class JSRenderer:
             import random
             self.options.add_argument(f"user-agent={random.choice(USER_AGENTS)}")
         
+        # Record network events so XHR/fetch calls can feed API discovery
+        if settings.CAPTURE_NETWORK_REQUESTS:
+            self.options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        self.network_requests = []
+
         self.driver = webdriver.Chrome(options=self.options)
         self.driver.set_page_load_timeout(settings.REQUEST_TIMEOUT)
         
     def render_page(self, url, wait_for=None, wait_time=5):
         """Render a page with JavaScript execution"""
         try:
-            logger.info(f"Rendering JavaScript page: {url}")
+            logger.debug(f"Rendering JavaScript page: {url}")
+            self.network_requests = []
+            self._drain_performance_log()
             self.driver.get(url)
             
             # Wait for specific element if requested
@@ -46,11 +54,15 @@ class JSRenderer:
                     if wait_for.get('type') == 'xpath':
                         WebDriverWait(self.driver, wait_time).until(
                             EC.presence_of_element_located((By.XPATH, wait_for['value']))
+                        )
             
             # Optional: Scroll to bottom to trigger lazy-loaded content
             if settings.SCROLL_TO_BOTTOM:
                 self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
                 time.sleep(1)  # Allow time for loading
+
+            if settings.CAPTURE_NETWORK_REQUESTS:
+                self.network_requests = self._capture_network_requests()
             
             return self.driver.page_source
             
@@ -58,6 +70,55 @@ class JSRenderer:
             logger.error(f"JavaScript rendering failed for {url}: {str(e)}")
             return None
             
+    def _drain_performance_log(self):
+        """Discard buffered devtools events from previous pages"""
+        if not settings.CAPTURE_NETWORK_REQUESTS:
+            return []
+        try:
+            return self.driver.get_log('performance')
+        except Exception:
+            return []
+
+    def _capture_network_requests(self):
+        """Collect the XHR/fetch requests made while the current page loaded"""
+        requests_seen = {}
+
+        # Devtools log gives method and resource type for every request
+        for entry in self._drain_performance_log():
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if message.get('method') != 'Network.requestWillBeSent':
+                continue
+            params = message.get('params', {})
+            if params.get('type') not in ('XHR', 'Fetch'):
+                continue
+            request = params.get('request', {})
+            if request.get('url', '').startswith('http'):
+                requests_seen[request['url']] = {
+                    'url': request['url'],
+                    'method': request.get('method', 'GET'),
+                    'type': params['type'].lower()
+                }
+
+        # Resource timing works in browsers without a performance log
+        if not requests_seen:
+            try:
+                entries = self.driver.execute_script(
+                    "return performance.getEntriesByType('resource')"
+                    ".filter(e => e.initiatorType === 'xmlhttprequest' || e.initiatorType === 'fetch')"
+                    ".map(e => [e.name, e.initiatorType]);")
+            except Exception as e:
+                logger.debug(f"Resource timing unavailable: {str(e)}")
+                entries = []
+            for name, initiator in entries or []:
+                if name.startswith('http'):
+                    requests_seen[name] = {'url': name, 'method': 'GET', 'type': initiator}
+
+        logger.debug(f"Captured {len(requests_seen)} XHR/fetch requests")
+        return list(requests_seen.values())
+
     def extract_dynamic_links(self, url):
         """Extract links from dynamically loaded content"""
         page_source = self.render_page(url, wait_for="a")
@@ -0,0 +1,109 @@
+import os
+import time
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from ..config import settings
+from ..storage.warc import iter_latest_records, read_record
+from ..utilities.encoding import decode_body
+from ..utilities.logger import setup_logger
+from .content_extractor import ContentExtractor
+
+logger = setup_logger(__name__)
+
+# Per-process state of the extraction workers
+_extractor = None
+_base_url = None
+_open_files = {}
+
+def _init_worker(base_url):
+    """Worker initializer: remember the base URL the crawl resolved links against"""
+    global _base_url
+    _base_url = base_url
+
+def _extract_record(job):
+    """Worker: read one archived response and run the extractors over it"""
+    global _extractor
+    path, offset, length = job
+    try:
+        if path not in _open_files:
+            _open_files[path] = open(path, 'rb')
+        record = read_record(path, offset, length, _open_files[path])
+        html_content = decode_body(record['body'], record['headers'].get('content-type', ''))
+        parsed = urlparse(record['url'])
+        site = f'{parsed.scheme}://{parsed.netloc}'
+        if _extractor is None:
+            _extractor = ContentExtractor(_base_url or site)
+        # Resolve relative media links the way the crawl did, against the site's
+        # base URL, so they match the stored media rows and keep their local files
+        _extractor.base_url = _base_url or site
+        return (
+            record['url'],
+            site,
+            _extractor.extract_text_content(html_content),
+            sorted(_extractor.extract_media_links(html_content))
+        )
+    except Exception as e:
+        logger.error(f"Failed to re-extract record at {path}:{offset}: {str(e)}")
+        return None
+
+class Reextractor:
+    def __init__(self, db, warc_dir=None, workers=None, batch_size=None, base_url=None):
+        """
+        Rebuild content and media rows from archived responses, without fetching
+
+        Args:
+            db: Storage backend whose index_db_file holds the warc_records index
+            warc_dir: Directory with the WARC files (default: settings.WARC_STORAGE)
+            workers: Extraction processes (default: one per CPU)
+            batch_size: Pages written per database transaction
+            base_url: Base URL the crawl resolved links against (default: each page's site root)
+        """
+        self.db = db
+        self.base_url = base_url
+        self.warc_dir = warc_dir or settings.WARC_STORAGE
+        self.workers = workers or settings.REEXTRACT_WORKERS or os.cpu_count()
+        self.batch_size = batch_size or settings.REEXTRACT_BATCH_SIZE
+
+    def run(self):
+        """
+        Re-extract the newest archived capture of every HTML page
+
+        Returns:
+            Dict with pages, changed, failed, seconds and pages_per_second
+        """
+        jobs = ((os.path.join(self.warc_dir, warc_file), offset, length)
+                for _, warc_file, offset, length in iter_latest_records(self.db.index_db_file))
+        chunksize = max(1, self.batch_size // (self.workers * 4))
+        pages = changed = failed = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.base_url,)) as executor:
+            # Submit the next batch before writing the previous one, so workers
+            # keep extracting while the main process is in a transaction
+            previous = None
+            while True:
+                jobs_batch = list(islice(jobs, self.batch_size))
+                current = executor.map(_extract_record, jobs_batch, chunksize=chunksize) if jobs_batch else None
+                if previous is not None:
+                    results = list(previous)
+                    batch = [result for result in results if result is not None]
+                    failed += len(results) - len(batch)
+                    changed += self.db.save_extractions(batch)
+                    pages += len(batch)
+                    elapsed = time.perf_counter() - started
+                    logger.info(f"Re-extracted {pages} pages ({pages / elapsed:.0f} pages/s)")
+                if current is None:
+                    break
+                previous = current
+
+        seconds = time.perf_counter() - started
+        stats = {
+            'pages': pages,
+            'changed': changed,
+            'failed': failed,
+            'seconds': round(seconds, 2),
+            'pages_per_second': round(pages / seconds, 1) if seconds else 0.0
+        }
+        logger.info(f"Re-extraction finished: {stats}")
+        return stats
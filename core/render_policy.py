@@ -0,0 +1,83 @@
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from bs4 import BeautifulSoup
+from ..config import settings
+from ..utilities.logger import setup_logger
+from ..utilities.url_patterns import url_pattern
+
+logger = setup_logger(__name__)
+
+# Element ids used as mount points by common single-page app frameworks
+SPA_ROOT_IDS = {'root', 'app', '__next', '__nuxt', '___gatsby', 'svelte', 'main-app'}
+SPA_ROOT_ATTRIBUTES = ('ng-app', 'ng-version', 'data-reactroot', 'data-server-rendered')
+NOSCRIPT_HINTS = ('enable javascript', 'javascript is disabled', 'requires javascript',
+                  'javascript to run', 'turn on javascript')
+
+class RenderDecider:
+    def __init__(self):
+        """
+        Decide per page whether static HTML is enough or a browser is needed
+
+        Decisions are remembered per URL pattern, so once a template has been
+        classified consistently its pages skip either the static probe or the browser.
+        """
+        self.observations: Dict[str, Dict[bool, int]] = defaultdict(lambda: {True: 0, False: 0})
+
+    def needs_js(self, html_content: str) -> Tuple[bool, str]:
+        """
+        Inspect static HTML and guess whether its content is rendered client-side
+
+        Returns:
+            Tuple of (needs_js, reason)
+        """
+        soup = BeautifulSoup(html_content, 'html.parser')
+        body = soup.body or soup
+
+        script_bytes = sum(len(script.string or '') for script in body.find_all('script'))
+        external_scripts = len(soup.find_all('script', src=True))
+
+        for noscript in soup.find_all('noscript'):
+            hint = noscript.get_text(' ', strip=True).lower()
+            if any(phrase in hint for phrase in NOSCRIPT_HINTS):
+                return True, 'noscript asks for JavaScript'
+
+        for element in body.find_all(['script', 'style', 'noscript', 'template']):
+            element.decompose()
+        text_length = len(body.get_text(' ', strip=True))
+
+        for element in body.find_all(True, id=True):
+            if element['id'] in SPA_ROOT_IDS and len(element.get_text(strip=True)) < settings.JS_MIN_TEXT_LENGTH:
+                return True, f"empty SPA root #{element['id']}"
+        for attribute in SPA_ROOT_ATTRIBUTES:
+            element = body.find(attrs={attribute: True})
+            if element is not None and len(element.get_text(strip=True)) < settings.JS_MIN_TEXT_LENGTH:
+                return True, f"empty SPA root [{attribute}]"
+
+        if text_length < settings.JS_MIN_TEXT_LENGTH:
+            if external_scripts or script_bytes:
+                return True, f"only {text_length} characters of text"
+            return False, 'page is small but has no scripts'
+
+        if script_bytes and text_length / (text_length + script_bytes) < settings.JS_MIN_TEXT_RATIO:
+            return True, f"text is {text_length} of {text_length + script_bytes} bytes"
+
+        return False, 'static HTML has content'
+
+    def decision_for(self, url: str) -> Optional[bool]:
+        """Return the remembered decision for the URL's pattern, if it is settled"""
+        counts = self.observations.get(url_pattern(url))
+        if not counts:
+            return None
+        if counts[True] >= settings.JS_DECISION_SAMPLES and not counts[False]:
+            return True
+        if counts[False] >= settings.JS_DECISION_SAMPLES and not counts[True]:
+            return False
+        return None
+
+    def record(self, url: str, needs_js: bool) -> None:
+        """Remember what a page of this pattern needed"""
+        pattern = url_pattern(url)
+        counts = self.observations[pattern]
+        counts[needs_js] += 1
+        if counts[needs_js] == settings.JS_DECISION_SAMPLES and not counts[not needs_js]:
+            logger.info(f"Pattern {pattern} settled as {'JS-rendered' if needs_js else 'static'}")
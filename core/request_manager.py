@@ -1,26 +1,83 @@
+import functools
 import random
 import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from ..config import settings, user_agents
+from ..utilities import metrics, tracing
 from ..utilities.logger import setup_logger
+from .circuit_breaker import BREAKERS, FAILURE, SUCCESS, TIMEOUT
+from .concurrency import HOST_LIMITS
+from .transport import transport_adapter
 
 logger = setup_logger(__name__)
 
+FETCH_SECONDS = metrics.histogram('scraper_fetch_seconds', 'Time to fetch a URL', ['host'])
+RESPONSES = metrics.counter('scraper_responses_total', 'Responses by host and status', ['host', 'status'])
+RESPONSE_BYTES = metrics.counter('scraper_response_bytes_total', 'Response body bytes', ['host'])
+FETCH_ERRORS = metrics.counter('scraper_fetch_errors_total', 'Requests that raised', ['host'])
+POLITENESS_WAIT = metrics.counter('scraper_politeness_wait_seconds_total',
+                                  'Time spent waiting between requests')
+
+def parse_retry_after(value, now=None):
+    """
+    Seconds to wait according to a Retry-After header
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+        now: Current Unix time (default: time.time())
+
+    Returns:
+        Non-negative seconds, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment is None:
+        return None
+    return max(0.0, moment.timestamp() - (time.time() if now is None else now))
+
+def release_on_close(response, release):
+    """Call release once, when a streamed response is closed (after its body was read)"""
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if not getattr(response, '_slot_released', False):
+                response._slot_released = True
+                release()
+
+    response.close = close_and_release
+
 class RequestManager:
+    # Optional WARCWriter shared by every manager; gets each fetched response
+    archiver = None
+    # Callables run as hook(url, response, seconds) after every completed request
+    response_hooks = []
+
     def __init__(self):
         self.session = requests.Session()
         self.setup_retry_strategy()
-        self.last_request_time = 0
+        # Why the last make_request() returned None, for callers that reschedule:
+        # {'status', 'retryable', 'retry_after'}; None after a success
+        self.last_failure = None
         
     def setup_retry_strategy(self):
-        retry_strategy = Retry(
-            total=settings.MAX_RETRIES,
-            backoff_factor=1,
-            status_forcelist=[408, 429, 500, 502, 503, 504]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # No retries (or backoff sleeps) inside the request: failed pages go back
+        # to the frontier as deferred jobs, so the worker moves on meanwhile
+        retry_strategy = Retry(total=0, read=False)
+        # Live network, or a recording/replaying adapter (settings.TRANSPORT_MODE)
+        adapter = transport_adapter(max_retries=retry_strategy)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
     
@@ -29,27 +86,97 @@ class RequestManager:
             return random.choice(user_agents.USER_AGENTS)
         return user_agents.USER_AGENTS[0]
     
-    def make_request(self, url, method='GET', **kwargs):
-        # Respect crawl delay
-        elapsed = time.time() - self.last_request_time
-        if elapsed < settings.DELAY_BETWEEN_REQUESTS:
-            time.sleep(settings.DELAY_BETWEEN_REQUESTS - elapsed)
-        
-        headers = kwargs.get('headers', {})
-        headers['User-Agent'] = self.get_random_user_agent()
-        kwargs['headers'] = headers
-        kwargs['timeout'] = settings.REQUEST_TIMEOUT
-        
-        try:
-            response = self.session.request(method, url, **kwargs)
-            self.last_request_time = time.time()
-            
-            if response.status_code == 200:
-                return response
-            else:
-                logger.warning(f"Request to {url} returned status code {response.status_code}")
+    def make_request(self, url, method='GET', accept_status=(200,), **kwargs):
+        with tracing.span('http.request', url=url, method=method) as request_span:
+            host = urlparse(url).netloc
+            self.last_failure = None
+            breaker = BREAKERS.get(host) if settings.CIRCUIT_BREAKER else None
+            admission = breaker.allow(url) if breaker else None
+            if breaker and admission is None:
+                # The URL is fine, its host is not: callers park it until the next probe
+                retry_in = breaker.retry_in(url)
+                self.last_failure = {'status': None, 'retryable': retry_in is not None,
+                                     'retry_after': None if retry_in is None else max(retry_in, 1.0),
+                                     'circuit_open': True}
+                request_span.set(circuit_open=True)
+                logger.debug(f"Circuit for {host} is {breaker.state}, not requesting {url}")
+                return None
+
+            # Per-host slot: concurrency limit plus crawl delay, shared by all threads
+            limiter = HOST_LIMITS.get(host)
+            with tracing.span('politeness_wait'):
+                waited = limiter.acquire()
+            if waited:
+                POLITENESS_WAIT.inc(waited)
+
+            headers = kwargs.get('headers', {})
+            headers['User-Agent'] = self.get_random_user_agent()
+            kwargs['headers'] = headers
+            kwargs['timeout'] = settings.REQUEST_TIMEOUT
+
+            streamed = kwargs.get('stream', False)
+            response = None
+            try:
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except Exception as e:
+                    limiter.release(timed_out=isinstance(e, requests.Timeout))
+                    raise
+                seconds = time.perf_counter() - started
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if streamed and response.status_code in accept_status:
+                    # The caller still has to read the body: the host slot and the
+                    # global budget stay taken until it closes the response
+                    release_on_close(response, functools.partial(
+                        limiter.release, seconds, response.status_code, retry_after))
+                else:
+                    limiter.release(seconds, response.status_code, retry_after)
+                if breaker:
+                    breaker.record(FAILURE if response.status_code in settings.RETRY_STATUS_CODES else SUCCESS,
+                                   admission)
+
+                FETCH_SECONDS.observe(seconds, host=host)
+                RESPONSES.inc(host=host, status=response.status_code)
+                # Streamed bodies haven't been read yet; count what the server announced
+                announced = response.headers.get('content-length', '')
+                size = (len(response.content) if getattr(response, '_content_consumed', True)
+                        else int(announced) if announced.isdigit() else 0)
+                RESPONSE_BYTES.inc(size, host=host)
+                request_span.set(status=response.status_code, bytes=size)
+
+                for hook in RequestManager.response_hooks:
+                    hook(url, response, seconds)
+
+                if RequestManager.archiver:
+                    RequestManager.archiver.archive_response(response)
+
+                if response.status_code in accept_status:
+                    return response
+                else:
+                    retryable = response.status_code in settings.RETRY_STATUS_CODES
+                    retry_after = retry_after if retryable else None
+                    self.last_failure = {'status': response.status_code, 'retryable': retryable,
+                                         'retry_after': retry_after}
+                    if retry_after is not None:
+                        request_span.set(retry_after=retry_after)
+                    logger.warning(f"Request to {url} returned status code {response.status_code}")
+                    if streamed:
+                        response.close()
+                    return None
+
+            except Exception as e:
+                if streamed and response is not None:
+                    # Never handed to the caller: free the connection and any held slot
+                    response.close()
+                if breaker:
+                    breaker.record(TIMEOUT if isinstance(e, requests.Timeout)
+                                   else FAILURE if isinstance(e, requests.ConnectionError) else None,
+                                   admission)
+                FETCH_ERRORS.inc(host=host)
+                request_span.set(error=str(e))
+                # Connection failures and timeouts are usually transient
+                self.last_failure = {'status': None, 'retry_after': None,
+                                     'retryable': isinstance(e, (requests.ConnectionError, requests.Timeout))}
+                logger.error(f"Error making request to {url}: {str(e)}")
                 return None
-                
-        except Exception as e:
-            logger.error(f"Error making request to {url}: {str(e)}")
-            return None
\ No newline at end of file
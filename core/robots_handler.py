@@ -1,14 +1,22 @@
+import threading
 import urllib.robotparser
 from urllib.parse import urlparse, urljoin
 import requests
 import time
 from typing import Dict, List, Optional, Tuple
 from ..config import settings
+from ..utilities import metrics
 from ..utilities.logger import setup_logger
 from .request_manager import RequestManager
 
 logger = setup_logger(__name__)
 
+ROBOTS_CHECKS = metrics.counter('scraper_robots_checks_total', 'robots.txt checks by result', ['result'])
+
+# Handlers by (scheme, host, respect_robots), so each robots.txt is fetched once per process
+_handlers_lock = threading.Lock()
+_handlers = {}
+
 class RobotsHandler:
     def __init__(self, base_url: str, respect_robots: bool = True):
         """
@@ -84,6 +92,7 @@ class RobotsHandler:
             Tuple of (is_allowed, reason) where reason explains any blocking
         """
         if not self.respect_robots:
+            ROBOTS_CHECKS.inc(result='disabled')
             return True, "robots.txt checking disabled"
             
         if not self.parser:
@@ -95,14 +104,8 @@ class RobotsHandler:
         
         if not allowed:
             reason = f"Blocked by robots.txt for {user_agent}"
-            
-        # Apply crawl delay if configured to respect it
-        if settings.RESPECT_CRAWL_DELAY and '*' in self.crawl_delays:
-            delay = self.crawl_delays['*']
-            if delay > settings.DELAY_BETWEEN_REQUESTS:
-                settings.DELAY_BETWEEN_REQUESTS = delay
-                logger.info(f"Adjusted crawl delay to {delay} seconds as per robots.txt")
-                
+        ROBOTS_CHECKS.inc(result='allowed' if allowed else 'blocked')
+        # Crawl-delay is applied per host by the request limiter (see get_crawl_delay)
         return allowed, reason
     
     def get_crawl_delay(self, user_agent: str = '*') -> float:
@@ -165,4 +168,17 @@ class RobotsHandler:
         except Exception as e:
             logger.error(f"Error fetching sitemaps: {str(e)}")
             
-        return sitemaps
\ No newline at end of file
+        return sitemaps
+
+def robots_for(base_url: str, respect_robots: bool = True) -> RobotsHandler:
+    """Shared RobotsHandler for the site's origin, fetching its robots.txt on first use"""
+    parsed = urlparse(base_url)
+    key = (parsed.scheme, parsed.netloc.lower(), respect_robots)
+    with _handlers_lock:
+        handler = _handlers.get(key)
+    if handler is None:
+        # Fetched outside the lock so one slow site doesn't hold up the others
+        handler = RobotsHandler(f"{parsed.scheme}://{parsed.netloc}", respect_robots=respect_robots)
+        with _handlers_lock:
+            handler = _handlers.setdefault(key, handler)
+    return handler
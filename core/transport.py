@@ -0,0 +1,199 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from http.client import responses as REASONS
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from ..config import settings
+from ..storage.schema import create_warc_index
+from ..storage.warc import WARCWriter, read_record
+from ..utilities.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TRANSPORT_MODES = ('live', 'record', 'replay')
+ARCHIVE_INDEX = 'index.db'
+
+# One connection pool/recorder/archive per process, shared by every RequestManager's adapter
+_transport_lock = threading.Lock()
+_live_adapter = None
+_recorder = None
+_replay_archive = None
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """Process-wide HTTP adapter: sessions reuse its keep-alive connections"""
+
+    def close(self):
+        pass  # Closing one session must not drop every other session's connections
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, writer, **kwargs):
+        """HTTP adapter that also stores every response it receives in a WARC archive"""
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # Read streamed bodies too so media can be replayed; iter_content still works
+        response.content
+        self.writer.archive_response(response)
+        return response
+
+class ReplayArchive:
+    def __init__(self, directory):
+        """Look up recorded responses by URL; the newest capture of a URL wins"""
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.files = {}
+        self.attempts = {}
+        connection = sqlite3.connect(os.path.join(directory, ARCHIVE_INDEX))
+        try:
+            create_warc_index(connection.cursor())
+            rows = connection.execute(
+                'SELECT url, warc_file, offset, length FROM warc_records ORDER BY id')
+            self.records = {url: (warc_file, offset, length) for url, warc_file, offset, length in rows}
+        finally:
+            connection.close()
+        logger.info(f"Replaying {len(self.records)} recorded URLs from {directory}")
+
+    def get(self, url):
+        """Return the recorded response for a URL as a record dict, or None"""
+        location = self.records.get(url)
+        if not location:
+            return None
+        warc_file, offset, length = location
+        path = os.path.join(self.directory, warc_file)
+        with self.lock:
+            if path not in self.files:
+                self.files[path] = open(path, 'rb')
+            return read_record(path, offset, length, self.files[path])
+
+    def attempt(self, url):
+        """Count a request for a URL; returns 1 for the first, 2 for its first retry and so on"""
+        with self.lock:
+            self.attempts[url] = self.attempts.get(url, 0) + 1
+            return self.attempts[url]
+
+    def close(self):
+        with self.lock:
+            for file in self.files.values():
+                file.close()
+            self.files = {}
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, archive, latency=0.0, jitter=0.0, error_rate=0.0, error_status=None, seed=None):
+        """
+        Serve requests from a recorded archive without touching the network
+
+        Args:
+            archive: ReplayArchive to answer from
+            latency: Seconds to wait before each response
+            jitter: Extra random delay of up to this many seconds
+            error_rate: Share of requests (0-1) that fail instead of being answered
+            error_status: Status code of injected failures; None raises ConnectionError
+            seed: Seed for the latency and error draws, for repeatable runs. Each
+                request's draws then depend only on the seed, its URL and how many
+                times that URL was requested before, not on thread scheduling.
+        """
+        super().__init__()
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+
+    def draws(self, url):
+        """Return (jitter, error) draws in [0, 1) for the next request to url"""
+        attempt = self.archive.attempt(url)
+        if self.seed is None:
+            return random.random(), random.random()
+        digest = hashlib.blake2b(f'{self.seed}:{url}:{attempt}'.encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64, int.from_bytes(digest[8:], 'big') / 2 ** 64
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        jitter_draw, error_draw = self.draws(request.url)
+        delay = self.latency + jitter_draw * self.jitter
+        if delay:
+            time.sleep(delay)
+
+        if self.error_rate and error_draw < self.error_rate:
+            if self.error_status is None:
+                raise requests.exceptions.ConnectionError(f"Injected failure for {request.url}",
+                                                          request=request)
+            return self._build_response(request, self.error_status, {}, b'')
+
+        record = self.archive.get(request.url)
+        if record is None:
+            logger.debug(f"No recorded response for {request.url}")
+            return self._build_response(request, 404, {'x-replay-miss': '1'}, b'')
+        body = b'' if request.method == 'HEAD' else record['body']
+        return self._build_response(request, record['status'], record['headers'], body)
+
+    def _build_response(self, request, status, headers, body):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = REASONS.get(status, '')
+        response.headers = CaseInsensitiveDict(headers)
+        response.headers['Content-Length'] = str(len(body))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+def transport_adapter(max_retries=0):
+    """Return the session adapter for settings.TRANSPORT_MODE"""
+    global _live_adapter, _recorder, _replay_archive
+    mode = settings.TRANSPORT_MODE
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"Unknown transport mode {mode!r}; expected one of {TRANSPORT_MODES}")
+    if mode == 'live':
+        with _transport_lock:
+            if _live_adapter is None:
+                _live_adapter = SharedHTTPAdapter(pool_connections=settings.HTTP_POOL_HOSTS,
+                                                  pool_maxsize=settings.HOST_CONCURRENCY_MAX,
+                                                  max_retries=max_retries)
+            return _live_adapter
+
+    directory = settings.TRANSPORT_ARCHIVE_DIR
+    with _transport_lock:
+        if mode == 'record':
+            if _recorder is None:
+                _recorder = WARCWriter(directory, index_db=os.path.join(directory, ARCHIVE_INDEX),
+                                       prefix='transport')
+            return RecordingAdapter(_recorder, max_retries=max_retries)
+        if _replay_archive is None:
+            _replay_archive = ReplayArchive(directory)
+    return ReplayAdapter(
+        _replay_archive,
+        latency=settings.REPLAY_LATENCY,
+        jitter=settings.REPLAY_JITTER,
+        error_rate=settings.REPLAY_ERROR_RATE,
+        error_status=settings.REPLAY_ERROR_STATUS,
+        seed=settings.REPLAY_SEED
+    )
+
+def close_transport():
+    """Close pooled connections, flush the recording archive and release replay files"""
+    global _live_adapter, _recorder, _replay_archive
+    with _transport_lock:
+        if _live_adapter is not None:
+            HTTPAdapter.close(_live_adapter)
+            _live_adapter = None
+        if _recorder is not None:
+            _recorder.close()
+            _recorder = None
+        if _replay_archive is not None:
+            _replay_archive.close()
+            _replay_archive = None
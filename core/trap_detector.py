@@ -0,0 +1,138 @@
+import re
+from collections import defaultdict
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qsl, urlsplit
+from ..config import settings
+from ..utilities import metrics
+from ..utilities.logger import setup_logger
+from ..utilities.simhash import NearDuplicateIndex
+from ..utilities.url_patterns import url_pattern
+
+logger = setup_logger(__name__)
+
+TRAP_URLS = metrics.counter('scraper_trap_urls_total', 'URLs not followed because they look like a crawler trap',
+                            ['reason'])
+
+# Query keys and path parameters that carry a session rather than select content
+SESSION_PARAMS = {'sid', 'sessionid', 'session_id', 'phpsessid', 'jsessionid', 'aspsessionid', 'cfid', 'cftoken'}
+PATH_SESSION = re.compile(r';(jsessionid|sessionid|sid)=|/\(S\([a-z0-9]+\)\)/', re.IGNORECASE)
+
+class PatternStats:
+    def __init__(self, max_distance):
+        """What has been seen of one URL pattern"""
+        self.urls = 0
+        self.pages = 0
+        self.duplicates = 0
+        self.index = NearDuplicateIndex(max_distance)
+
+    def duplicate_ratio(self):
+        """Share of the fetched pages after the first that repeat an earlier one"""
+        # The first page of a template has nothing to be a duplicate of
+        return self.duplicates / (self.pages - 1) if self.pages > 1 else 0.0
+
+    def is_distinct(self):
+        """Whether enough pages were fetched to show this template is not near-identical"""
+        return (self.pages >= settings.TRAP_SAMPLE_PAGES and
+                self.duplicate_ratio() < settings.TRAP_DUPLICATE_RATIO)
+
+class TrapDetector:
+    def __init__(self):
+        """
+        Spot infinite URL spaces from URL pattern statistics per host
+
+        URLs are reduced to their template with url_pattern (the host is part of
+        it). Single URLs are dropped for repeated path segments, excessive depth,
+        session IDs or too many query parameters. Templates are flagged, and
+        their further URLs dropped, when a path grows too many query-parameter
+        combinations, when fetched pages of a template turn out near-identical,
+        or when a template reaches TRAP_MAX_PATTERN_URLS before its sampled
+        pages have shown to be distinct. A catalog of distinct pages such as
+        /item/{num} is therefore followed past the cap.
+        """
+        self.patterns: Dict[str, PatternStats] = defaultdict(
+            lambda: PatternStats(settings.NEAR_DUPLICATE_DISTANCE))
+        self.query_variants: Dict[str, Set[str]] = defaultdict(set)
+        self.flagged: Dict[str, str] = {}
+
+    def _flag(self, key: str, reason: str) -> None:
+        if key not in self.flagged:
+            self.flagged[key] = reason
+            logger.info(f"Crawler trap suspected at {key} ({reason}); not following further URLs")
+
+    def url_reason(self, url: str) -> Optional[str]:
+        """Why the URL on its own looks like a trap, or None"""
+        # urlsplit keeps ;params in the path, where session IDs hide
+        parsed = urlsplit(url)
+        if PATH_SESSION.search(parsed.path):
+            return 'session_id'
+        segments = [segment for segment in parsed.path.split('/') if segment]
+        if len(segments) > settings.TRAP_MAX_PATH_DEPTH:
+            return 'path_depth'
+        counts = defaultdict(int)
+        for segment in segments:
+            counts[segment] += 1
+            if counts[segment] > settings.TRAP_MAX_SEGMENT_REPEATS:
+                return 'repeated_segment'
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        if len(params) > settings.TRAP_MAX_QUERY_PARAMS:
+            return 'query_params'
+        if any(key.lower() in SESSION_PARAMS for key, _ in params):
+            return 'session_id'
+        return None
+
+    def check(self, url: str, count: bool = True) -> Optional[str]:
+        """
+        Decide whether a discovered URL should be fetched, counting it if so
+
+        Args:
+            url: Discovered URL
+            count: Record the URL against its template's limits. Pass False for
+                URLs that are kept but not crawled further; they are only
+                checked against what is already known.
+
+        Returns:
+            None to follow the URL, otherwise the reason it looks like a trap
+        """
+        reason = self.url_reason(url)
+        if reason is None:
+            pattern = url_pattern(url)
+            path, _, query_keys = pattern.partition('?')
+            if pattern in self.flagged:
+                reason = self.flagged[pattern]
+            elif query_keys and path in self.flagged:
+                reason = self.flagged[path]
+            elif count and query_keys and query_keys not in self.query_variants[path]:
+                # Faceted search: every filter combination is a new set of parameters
+                if len(self.query_variants[path]) >= settings.TRAP_MAX_QUERY_VARIANTS:
+                    self._flag(path, 'query_explosion')
+                    reason = 'query_explosion'
+                else:
+                    self.query_variants[path].add(query_keys)
+            if reason is None and count:
+                stats = self.patterns[pattern]
+                if stats.urls >= settings.TRAP_MAX_PATTERN_URLS and not stats.is_distinct():
+                    self._flag(pattern, 'pattern_cap')
+                    reason = 'pattern_cap'
+                else:
+                    stats.urls += 1
+        if reason:
+            TRAP_URLS.inc(reason=reason)
+            logger.debug(f"Not following {url}: {reason}")
+        return reason
+
+    def record_page(self, url: str, fingerprint: int) -> None:
+        """Feed back the SimHash of a fetched page, to spot templates of near-identical pages"""
+        pattern = url_pattern(url)
+        path, _, query_keys = pattern.partition('?')
+        # Query URLs also count towards their path, where every filter combination
+        # of a faceted search comes together
+        for key in (pattern, path) if query_keys else (pattern,):
+            stats = self.patterns[key]
+            if stats.index.find(fingerprint) is not None:
+                stats.duplicates += 1
+            else:
+                stats.index.add(url, fingerprint)
+            stats.pages += 1
+            if (stats.pages >= settings.TRAP_SAMPLE_PAGES and
+                    stats.duplicate_ratio() >= settings.TRAP_DUPLICATE_RATIO):
+                self._flag(key, 'near_identical')
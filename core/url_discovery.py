@@ -1,18 +1,27 @@
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from ..config import settings
+from ..utilities import metrics, tracing
 from ..utilities.validator import is_valid_url
+from ..utilities.encoding import response_text
 from ..utilities.logger import setup_logger
+from ..utilities.simhash import NearDuplicateIndex, simhash
 from .request_manager import RequestManager
+from .trap_detector import TrapDetector
 
 logger = setup_logger(__name__)
 
+PARSE_SECONDS = metrics.histogram('scraper_parse_seconds', 'Time spent parsing HTML', ['stage'])
+
 class URLDiscoverer:
     def __init__(self, base_url):
         self.base_url = base_url
         self.request_manager = RequestManager()
         self.visited_urls = set()
         self.discovered_urls = set()
+        self.page_index = NearDuplicateIndex(settings.NEAR_DUPLICATE_DISTANCE)
+        self.traps = TrapDetector() if settings.TRAP_DETECTION else None
+        self.trap_urls = set()
         
     def get_domain(self, url):
         """Extract domain from URL"""
@@ -23,9 +32,17 @@ class URLDiscoverer:
         """Check if URL belongs to the same domain"""
         return self.get_domain(url) == self.get_domain(self.base_url)
         
+    @tracing.traced('parse.html')
+    @PARSE_SECONDS.time(stage='html')
+    def parse(self, html_content):
+        """Parse a page once, for both its fingerprint and its links"""
+        return BeautifulSoup(html_content, 'html.parser')
+
+    @tracing.traced('parse.links')
+    @PARSE_SECONDS.time(stage='links')
     def extract_links(self, html_content):
-        """Extract all links from HTML content"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        """Extract all links from HTML content or an already parsed page"""
+        soup = html_content if isinstance(html_content, BeautifulSoup) else self.parse(html_content)
         links = set()
         
         for tag in soup.find_all(['a', 'link'], href=True):
@@ -54,7 +71,7 @@ class URLDiscoverer:
             return
             
         self.visited_urls.add(current_url)
-        logger.info(f"Discovering URLs at depth {depth}: {current_url}")
+        logger.debug(f"Discovering URLs at depth {depth}: {current_url}")
         
         response = self.request_manager.make_request(current_url)
         if not response:
@@ -64,19 +81,38 @@ class URLDiscoverer:
         if 'text/html' not in content_type:
             return
             
-        links = self.extract_links(response.text)
+        soup = self.parse(response_text(response))
+
+        fingerprint = None
+        if settings.SKIP_DUPLICATE_LINKS or self.traps:
+            fingerprint = simhash(soup.get_text(' ', strip=True))
+        if self.traps:
+            self.traps.record_page(current_url, fingerprint)
+
+        # Template copies (print views, session variants) link to the same pages again
+        if settings.SKIP_DUPLICATE_LINKS:
+            original = self.page_index.find(fingerprint)
+            if original:
+                logger.info(f"Not following links from {current_url}, near-duplicate of {original}")
+                return
+            self.page_index.add(current_url, fingerprint)
+
+        links = self.extract_links(soup)
+        # Links from the deepest level are kept for extraction but not crawled
+        # here, so they don't count towards their template's URL cap
+        follow = depth < settings.MAX_DEPTH
         for link in links:
-            if link not in self.discovered_urls and self.is_same_domain(link):
+            if link not in self.discovered_urls and link not in self.trap_urls and self.is_same_domain(link):
+                if self.traps and self.traps.check(link, count=follow):
+                    self.trap_urls.add(link)
+                    continue
                 self.discovered_urls.add(link)
-                self.discover_urls(link, depth + 1)
+                if follow:
+                    self.discover_urls(link, depth + 1)
                 
     def get_all_urls(self):
         """Start discovery and return all found URLs"""
         self.discover_urls(self.base_url)
+        if self.trap_urls:
+            logger.info(f"Skipped {len(self.trap_urls)} URLs in suspected crawler traps")
         return self.discovered_urls
-    
-    # Can be used in URL discovery
-sitemaps = self.robots.get_sitemaps()
-if sitemaps:
-    logger.info(f"Found {len(sitemaps)} sitemaps for alternative discovery")
-    
\ No newline at end of file
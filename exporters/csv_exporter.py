@@ -7,19 +7,35 @@ from ..utilities.logger import setup_logger
 logger = setup_logger(__name__)
 
 class CSVExporter:
-    def __init__(self):
-        self.output_dir = os.path.join(settings.DATA_STORAGE, 'exports')
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir or os.path.join(settings.DATA_STORAGE, 'exports')
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
         
+    def _write_rows(self, rows, filepath):
+        """Stream dict rows to a CSV file, taking the columns from the first row"""
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=first.keys())
+            writer.writeheader()
+            writer.writerow(first)
+            count = 1
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+        
     def export_urls(self, urls_data, filename='urls_export.csv'):
         """Export discovered URLs to CSV"""
         filepath = os.path.join(self.output_dir, filename)
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=urls_data[0].keys())
-                writer.writeheader()
-                writer.writerows(urls_data)
-            logger.info(f"Exported {len(urls_data)} URLs to {filepath}")
+            count = self._write_rows(urls_data, filepath)
+            if not count:
+                logger.warning("No URLs to export")
+                return None
+            logger.info(f"Exported {count} URLs to {filepath}")
             return filepath
         except Exception as e:
             logger.error(f"CSV export failed: {str(e)}")
@@ -29,11 +45,11 @@ class CSVExporter:
         """Export extracted content to CSV"""
         filepath = os.path.join(self.output_dir, filename)
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=content_data[0].keys())
-                writer.writeheader()
-                writer.writerows(content_data)
-            logger.info(f"Exported {len(content_data)} content items to {filepath}")
+            count = self._write_rows(content_data, filepath)
+            if not count:
+                logger.warning("No content to export")
+                return None
+            logger.info(f"Exported {count} content items to {filepath}")
             return filepath
         except Exception as e:
             logger.error(f"Content export failed: {str(e)}")
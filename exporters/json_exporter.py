@@ -7,8 +7,8 @@ from ..utilities.logger import setup_logger
 logger = setup_logger(__name__)
 
 class JSONExporter:
-    def __init__(self):
-        self.output_dir = os.path.join(settings.DATA_STORAGE, 'exports')
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir or os.path.join(settings.DATA_STORAGE, 'exports')
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
         
     def export_data(self, data, filename='export.json', indent=2):
@@ -21,4 +21,38 @@ class JSONExporter:
             return filepath
         except Exception as e:
             logger.error(f"JSON export failed: {str(e)}")
+            return None
+            
+    def _write_array(self, rows, filepath):
+        """Stream dict rows to a JSON array without building it in memory"""
+        count = 0
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for row in rows:
+                f.write(',\n' if count else '\n')
+                json.dump(row, f, ensure_ascii=False)
+                count += 1
+            f.write('\n]\n' if count else ']\n')
+        return count
+        
+    def export_urls(self, urls_data, filename='urls_export.json'):
+        """Export discovered URLs to JSON"""
+        filepath = os.path.join(self.output_dir, filename)
+        try:
+            count = self._write_array(urls_data, filepath)
+            logger.info(f"Exported {count} URLs to {filepath}")
+            return filepath
+        except Exception as e:
+            logger.error(f"JSON export failed: {str(e)}")
+            return None
+            
+    def export_content(self, content_data, filename='content_export.json'):
+        """Export extracted content to JSON"""
+        filepath = os.path.join(self.output_dir, filename)
+        try:
+            count = self._write_array(content_data, filepath)
+            logger.info(f"Exported {count} content items to {filepath}")
+            return filepath
+        except Exception as e:
+            logger.error(f"Content export failed: {str(e)}")
             return None
\ No newline at end of file
@@ -6,9 +6,19 @@ from ..utilities.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+def sql_literal(value):
+    """Render a Python value as an SQL literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
 class SQLExporter:
-    def __init__(self):
-        self.output_dir = os.path.join(settings.DATA_STORAGE, 'exports')
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir or os.path.join(settings.DATA_STORAGE, 'exports')
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
         
     def export_to_sql(self, db_path, output_filename='export.sql'):
@@ -23,4 +33,37 @@ class SQLExporter:
             return output_path
         except Exception as e:
             logger.error(f"SQL export failed: {str(e)}")
+            return None
+            
+    def _write_inserts(self, table, columns, rows, filepath):
+        """Stream dict rows as CREATE TABLE and INSERT statements"""
+        count = 0
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)});\n")
+            for row in rows:
+                values = ', '.join(sql_literal(row.get(column)) for column in columns)
+                f.write(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values});\n")
+                count += 1
+        return count
+        
+    def export_urls(self, urls_data, filename='urls_export.sql'):
+        """Export discovered URLs as SQL statements"""
+        filepath = os.path.join(self.output_dir, filename)
+        try:
+            count = self._write_inserts('urls', ['url', 'domain', 'visited'], urls_data, filepath)
+            logger.info(f"Exported {count} URLs to {filepath}")
+            return filepath
+        except Exception as e:
+            logger.error(f"SQL export failed: {str(e)}")
+            return None
+            
+    def export_content(self, content_data, filename='content_export.sql'):
+        """Export extracted content as SQL statements"""
+        filepath = os.path.join(self.output_dir, filename)
+        try:
+            count = self._write_inserts('content', ['url', 'type', 'content'], content_data, filepath)
+            logger.info(f"Exported {count} content items to {filepath}")
+            return filepath
+        except Exception as e:
+            logger.error(f"Content export failed: {str(e)}")
             return None
\ No newline at end of file
@@ -1,28 +1,46 @@
 #!/usr/bin/env python3
 import argparse
+import contextvars
 import os
+import sys
+import threading
 import time
-from typing import Dict, List, Optional, Set, Tuple
-from core.url_discovery import URLDiscoverer
-from core.content_extractor import ContentExtractor
-from core.download_manager import DownloadManager
-from core.auth_handler import AuthHandler
-from core.api_discovery import APIDiscoverer
-from core.robots_handler import RobotsHandler
-from core.js_renderer import JSRenderer
-from storage.database import DatabaseManager
-from storage.file_manager import FileManager
-from exporters.csv_exporter import CSVExporter
-from exporters.json_exporter import JSONExporter
-from exporters.sql_exporter import SQLExporter
-from utilities.logger import setup_logger
-from utilities.validator import is_valid_url
-from config import settings
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from importlib import import_module
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+# Crawl components pull in requests, BeautifulSoup and sqlite3; they are
+# imported where they are first needed so `--help`, `trace` and other short
+# invocations don't pay for them
+from .core.circuit_breaker import BREAKERS, HALF_OPEN, OPEN
+from .core.concurrency import HOST_LIMITS
+from .utilities import metrics, tracing
+from .utilities.logger import configure_logging, setup_logger
+from .utilities.simhash import simhash
+from .utilities.validator import is_valid_url
+from .config import settings
+
+if TYPE_CHECKING:
+    from .core.content_extractor import ContentExtractor
+    from .core.download_manager import DownloadManager
 
 logger = setup_logger(__name__)
 
+# Export format -> (module, class), loaded only for the formats asked for
+EXPORTERS = {
+    'csv': ('.exporters.csv_exporter', 'CSVExporter'),
+    'json': ('.exporters.json_exporter', 'JSONExporter'),
+    'sql': ('.exporters.sql_exporter', 'SQLExporter')
+}
+
+PAGES = metrics.counter('scraper_pages_total', 'Pages processed by outcome', ['result'])
+DOWNLOAD_QUEUE = metrics.gauge('scraper_download_queue_depth', 'Media downloads queued or in progress')
+
 class EthicalScraper:
-    def __init__(self, base_url: str, use_js: bool = False, export_formats: Optional[List[str]] = None):
+    def __init__(self, base_url: str, use_js: bool = False, export_formats: Optional[List[str]] = None,
+                 js_mode: Optional[str] = None, data_dir: Optional[str] = None, standalone: bool = True):
         """
         Initialize the web scraper with configuration options
         
@@ -30,22 +48,76 @@ class EthicalScraper:
             base_url: The root URL to start scraping from
             use_js: Whether to use JavaScript rendering (default: False)
             export_formats: List of export formats (e.g., ['csv', 'json'])
+            js_mode: 'always' or 'hybrid' (default: settings.JS_RENDER_MODE)
+            data_dir: Directory for this site's database, media and exports
+                (default: settings.DATA_STORAGE and settings.MEDIA_STORAGE)
+            standalone: Whether this scraper owns the process-wide services
+                (metrics, profiling, tracing, WARC archive, connection pool);
+                False for sites of a batch run, which shares them
         """
         if not is_valid_url(base_url):
             raise ValueError(f"Invalid base URL: {base_url}")
 
+        from .core.auth_handler import SecureAuthHandler
+        from .core.robots_handler import robots_for
+        from .storage.file_manager import FileManager
+        from .storage.sharded import create_storage
+
         self.base_url = base_url.rstrip('/')
         self.use_js = use_js
+        self.js_mode = js_mode or settings.JS_RENDER_MODE
         self.export_formats = export_formats or ['json']
-        self.db = DatabaseManager()
+        self.standalone = standalone
+        self.media_dir = os.path.join(data_dir, 'media') if data_dir else None
+        self.export_dir = os.path.join(data_dir, 'exports') if data_dir else None
+        self.db = create_storage(data_dir=data_dir)
         self.file_manager = FileManager()
-        self.download_manager = DownloadManager()
-        self.auth_handler = AuthHandler()
-        self.robots = RobotsHandler(self.base_url, respect_robots=settings.RESPECT_ROBOTS_TXT)
+        self.auth_handler = SecureAuthHandler()
+        self.robots = robots_for(self.base_url, respect_robots=settings.RESPECT_ROBOTS_TXT)
+
+        # Expose run metrics while scraping
+        self.metrics_server = None
+        self.metrics_writer = None
+        if settings.METRICS_PORT and standalone:
+            self.metrics_server = metrics.start_http_server(settings.METRICS_PORT)
+            logger.info(f"Serving metrics on http://127.0.0.1:{settings.METRICS_PORT}/metrics")
+        if settings.METRICS_SNAPSHOT_FILE and standalone:
+            self.metrics_writer = metrics.SnapshotWriter(settings.METRICS_SNAPSHOT_FILE,
+                                                         settings.METRICS_SNAPSHOT_INTERVAL)
+
+        # Per-phase CPU/memory reports for --profile
+        self.profiler = None
+        if settings.PROFILE_MODE and standalone:
+            from .utilities.profiling import PhaseProfiler
+            self.profiler = PhaseProfiler(settings.PROFILE_MODE, settings.PROFILE_DIR, settings.PROFILE_TOP)
+
+        # Record per-URL spans for `main.py trace`
+        if settings.TRACE_FILE and standalone:
+            tracing.configure(settings.TRACE_FILE, settings.TRACE_SAMPLE_RATE)
+
+        # (url_id, media_url, trace context) of media whose host's circuit was
+        # open when its page was processed
+        self.parked_media = []
+        # Fetch threads each get their own extractor and download manager
+        self._worker_local = threading.local()
+
+        # Request starts to the site stay at least its robots.txt crawl-delay apart
+        if settings.RESPECT_CRAWL_DELAY:
+            HOST_LIMITS.set_crawl_delay(urlparse(self.base_url).netloc, self.robots.get_crawl_delay())
+
+        # Archive raw responses so content can be re-extracted without refetching
+        self.archiver = None
+        if settings.WARC_ARCHIVE and standalone:
+            from .core.request_manager import RequestManager
+            from .storage.warc import WARCWriter
+            self.archiver = WARCWriter(index_db=self.db.index_db_file)
+            RequestManager.archiver = self.archiver
         
         # Initialize JavaScript renderer if needed
         self.js_renderer = None
         if self.use_js:
+            # Selenium is optional; only import it when rendering is asked for
+            from .core.js_renderer import JSRenderer
             self.js_renderer = JSRenderer(headless=True)
         
         # Apply bypass strategy if configured
@@ -54,7 +126,8 @@ class EthicalScraper:
 
     def _check_scrape_permission(self, url: str) -> bool:
         """Verify if we're allowed to scrape the given URL"""
-        allowed, reason = self.robots.is_allowed(url)
+        with tracing.span('robots'):
+            allowed, reason = self.robots.is_allowed(url)
         if not allowed:
             logger.error(f"Scraping blocked by robots.txt for {url}: {reason}")
             if settings.BYPASS_STRATEGY:
@@ -68,6 +141,7 @@ class EthicalScraper:
         if not self._check_scrape_permission(self.base_url):
             return set()
 
+        from .core.url_discovery import URLDiscoverer
         logger.info(f"Starting URL discovery for {self.base_url}")
         discoverer = URLDiscoverer(self.base_url)
         urls = discoverer.get_all_urls()
@@ -87,8 +161,9 @@ class EthicalScraper:
         if not self._check_scrape_permission(self.base_url):
             return set()
 
+        from .core.api_discovery import APIDiscoverer
         logger.info("Starting API endpoint discovery")
-        discoverer = APIDiscoverer(self.base_url)
+        discoverer = APIDiscoverer(self.base_url, js_renderer=self.js_renderer, db=self.db)
         endpoints = discoverer.discover_api_endpoints()
         
         # Filter endpoints through robots.txt
@@ -105,70 +180,220 @@ class EthicalScraper:
     def extract_content(self, urls: Optional[Set[Tuple[int, str]]] = None) -> None:
         """
         Extract content from discovered URLs with rate limiting
-        
+
+        Worker threads fetch pages and media, each request waiting for a slot
+        from its host's limiter; this thread does every storage write, since the
+        database connection belongs to it. Deferred retries and parked media are
+        picked up once the frontier runs dry.
+
         Args:
             urls: Optional set of (id, url) tuples to extract
         """
         if not urls:
             # Get unvisited URLs from database
-            cursor = self.db.connection.cursor()
-            cursor.execute('SELECT id, url FROM urls WHERE visited = 0')
-            urls = cursor.fetchall()
+            urls = self.db.get_unvisited_urls()
 
-        for url_id, url in urls:
-            if not self._check_scrape_permission(url):
-                continue
+        # Enough threads for a host to reach its concurrency ceiling; the
+        # browser is driven from a single thread
+        workers = 1 if self.use_js else HOST_LIMITS.max_in_flight()
+        frontier = deque(urls)
+        pending = {}  # future -> ('page' or 'media', url_id, url)
+        # (url_id, next_attempt_at) of deferred URLs already queued; one that comes
+        # back with the same schedule was skipped (e.g. by robots.txt), not rescheduled
+        attempted = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch') as pool:
+            while True:
+                waits = []
+                if not frontier:
+                    waits = [self._queue_due_retries(frontier, attempted),
+                             self._queue_parked_media(pool, pending)]
+                    waits = [seconds for seconds in waits if seconds is not None]
+                # Keep every worker busy with a little work queued behind it
+                while frontier and len(pending) < workers * 2:
+                    url_id, url = frontier.popleft()
+                    self._submit_page(pool, pending, url_id, url)
+                DOWNLOAD_QUEUE.set(sum(1 for kind, _, _ in pending.values() if kind == 'media'))
 
-            logger.info(f"Extracting content from {url}")
-            
-            # Respect crawl delay
-            delay = self.robots.get_crawl_delay()
-            if delay > 0:
-                time.sleep(delay)
+                if pending:
+                    done, _ = wait(pending, timeout=min(waits) if waits else None,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kind, url_id, url = pending.pop(future)
+                        # Storage spans join the trace of the page the result belongs to
+                        *result, trace_context = future.result()
+                        if kind == 'page':
+                            trace_context.run(self._store_page, pool, pending, url_id, url, result)
+                        else:
+                            trace_context.run(self._store_media, url_id, url, result)
+                elif not frontier:
+                    if not waits:
+                        break
+                    with tracing.span('retry_wait'):
+                        time.sleep(min(waits))
+        DOWNLOAD_QUEUE.set(0)
+
+    def _worker_components(self) -> Tuple['ContentExtractor', 'DownloadManager']:
+        """This thread's own extractor and download manager (sessions aren't shared)"""
+        local = self._worker_local
+        if not hasattr(local, 'extractor'):
+            from .core.content_extractor import ContentExtractor
+            from .core.download_manager import DownloadManager
+            local.extractor = ContentExtractor(self.base_url, use_js=self.use_js,
+                                               js_renderer=self.js_renderer, js_mode=self.js_mode)
+            local.download_manager = DownloadManager(media_dir=self.media_dir)
+        return local.extractor, local.download_manager
 
-            extractor = ContentExtractor(self.base_url, use_js=self.use_js)
+    def _submit_page(self, pool: ThreadPoolExecutor, pending: Dict, url_id: Optional[int], url: str) -> None:
+        if not self._check_scrape_permission(url):
+            return
+        if url_id is None:
+            url_id = self.db.get_url_id(url) or self.db.save_url(url, self.base_url)
+        pending[pool.submit(self._fetch_page, url)] = ('page', url_id, url)
+
+    def _submit_download(self, pool: ThreadPoolExecutor, pending: Dict, url_id: int, media_url: str) -> None:
+        # The download continues the trace of the page the media was found on
+        pending[pool.submit(contextvars.copy_context().run, self._fetch_media, media_url)] = \
+            ('media', url_id, media_url)
+
+    def _fetch_page(self, url: str) -> Tuple[Optional[Dict], Optional[Dict], Optional[int], contextvars.Context]:
+        """Worker: fetch and parse one page; returns (content, failure, fingerprint, trace context)"""
+        extractor, _ = self._worker_components()
+        with tracing.span('page', url=url):
+            logger.debug(f"Extracting content from {url}")
             content = extractor.extract_from_page(url)
-            
-            if not content:
-                self._mark_url_visited(url_id, 404)
+            fingerprint = None
+            if content and content['type'] == 'html' and settings.NEAR_DUPLICATE_DETECTION:
+                with tracing.span('simhash'):
+                    fingerprint = simhash(content['text'])
+            # Storing happens on the main thread, under this page's span
+            trace_context = contextvars.copy_context()
+        return content, extractor.request_manager.last_failure, fingerprint, trace_context
+
+    def _fetch_media(self, media_url: str) -> Tuple[Optional[Dict], Optional[Dict], contextvars.Context]:
+        """Worker: download one media file; returns (download result, failure, trace context)"""
+        _, download_manager = self._worker_components()
+        return (download_manager.download_file(media_url), download_manager.request_manager.last_failure,
+                contextvars.copy_context())
+
+    def _queue_due_retries(self, frontier: deque, attempted: Set) -> Optional[float]:
+        """Move deferred URLs that are due into the frontier; returns seconds until the next one"""
+        now = time.time()
+        for url_id, url, next_attempt_at in self.db.get_deferred_urls():
+            if (url_id, next_attempt_at) in attempted:
                 continue
-                
-            if content['type'] == 'html':
-                # Save text content
-                content_id = self.db.save_content(url_id, 'html', content['text'])
-                    
-                # Save media references
-                for media_type, media_url in content['media']:
-                    if self._check_scrape_permission(media_url):
-                        download_result = self.download_manager.download_file(media_url)
-                        if download_result:
-                            self.db.save_media(
-                                url_id,
-                                media_url,
-                                download_result['media_type'],
-                                download_result['local_path'],
-                                download_result['size'])
-                            
-                self._mark_url_visited(url_id, 200)
+            if next_attempt_at > now:
+                return next_attempt_at - now
+            attempted.add((url_id, next_attempt_at))
+            frontier.append((url_id, url))
+        return None
+
+    def _queue_parked_media(self, pool: ThreadPoolExecutor, pending: Dict) -> Optional[float]:
+        """Resubmit parked media whose hosts accept requests again; returns seconds until the next one"""
+        parked, self.parked_media = self.parked_media, []
+        waits = []
+        for url_id, media_url, trace_context in parked:
+            retry_in = BREAKERS.get(urlparse(media_url).netloc).retry_in(media_url)
+            if retry_in is None:
+                continue  # Host given up on
+            if retry_in > 0:
+                waits.append(retry_in)
+                self.parked_media.append((url_id, media_url, trace_context))
             else:
-                # Handle non-HTML content
-                download_result = self.download_manager.download_file(url)
-                if download_result:
-                    self.db.save_media(
-                        url_id,
-                        url,
-                        download_result['media_type'],
-                        download_result['local_path'],
-                        download_result['size'])
-                self._mark_url_visited(url_id, 200)
+                trace_context.run(self._submit_download, pool, pending, url_id, media_url)
+        return min(waits) if waits else None
+
+    def _defer_retry(self, url_id: int, url: str, failure: Dict) -> bool:
+        """Send a failed URL back to the frontier; False once its retries are used up"""
+        retries = self.db.get_retry_count(url_id)
+        if retries >= settings.MAX_RETRIES and not failure.get('circuit_open'):
+            logger.warning(f"Giving up on {url} after {retries} retries")
+            return False
+        if failure.get('circuit_open'):
+            # Never requested: wait for the host's next probe without using up a retry
+            logger.debug(f"Parking {url} for {failure['retry_after']:.1f}s while its host's circuit is open")
+            return self.db.defer_url(url_id, failure['status'], time.time() + failure['retry_after'],
+                                     count_retry=False)
+        if failure['retry_after'] is not None:
+            delay = min(failure['retry_after'], settings.RETRY_AFTER_MAX)
+        else:
+            delay = min(settings.RETRY_BACKOFF_BASE * 2 ** retries, settings.RETRY_BACKOFF_MAX)
+        logger.info(f"Retrying {url} in {delay:.1f}s (retry {retries + 1} of {settings.MAX_RETRIES})")
+        return self.db.defer_url(url_id, failure['status'], time.time() + delay)
+
+    @tracing.traced('store')
+    def _store_page(self, pool: ThreadPoolExecutor, pending: Dict, url_id: int, url: str,
+                    result: Tuple[Optional[Dict], Optional[Dict], Optional[int]]) -> None:
+        """Store one fetched page and queue its media downloads"""
+        content, failure, fingerprint = result
+        if not content:
+            if failure and failure['retryable'] and self._defer_retry(url_id, url, failure):
+                PAGES.inc(result='deferred')
+                return
+            PAGES.inc(result='failed')
+            self._mark_url_visited(url_id, (failure or {}).get('status') or 404)
+            return
+            
+        if content['type'] == 'html':
+            # Save text content (unchanged pages only bump last_seen)
+            content_id, changed = self.db.save_content_if_changed(url_id, 'html', content['text'])
+            if not changed:
+                logger.debug(f"Content unchanged since last run: {url}")
+            PAGES.inc(result='changed' if changed else 'unchanged')
+
+            duplicate_of = None
+            if fingerprint is not None:
+                with tracing.span('near_duplicate'):
+                    duplicate_of = self.db.find_near_duplicate(url_id, fingerprint)
+                    self.db.save_fingerprint(url_id, fingerprint, duplicate_of)
+                if duplicate_of:
+                    logger.info(f"{url} is a near-duplicate of URL ID {duplicate_of}")
+
+            # Feed API calls observed while rendering into discovery
+            if content.get('network_requests'):
+                self._save_observed_endpoints(content['network_requests'])
+                
+            # Queue media downloads
+            media_links = content['media']
+            if duplicate_of and settings.SKIP_DUPLICATE_MEDIA:
+                media_links = []
+            for media_type, media_url in media_links:
+                if self._check_scrape_permission(media_url):
+                    self._submit_download(pool, pending, url_id, media_url)
+        else:
+            # Handle non-HTML content
+            PAGES.inc(result='file')
+            self._submit_download(pool, pending, url_id, url)
+        self._mark_url_visited(url_id, 200)
+
+    @tracing.traced('store_media')
+    def _store_media(self, url_id: int, media_url: str, result: Tuple[Optional[Dict], Optional[Dict]]) -> None:
+        """Record one downloaded media file, parking it while its host's circuit is open"""
+        download_result, failure = result
+        if download_result:
+            self.db.save_media(
+                url_id,
+                media_url,
+                download_result['media_type'],
+                download_result['local_path'],
+                download_result['size'])
+            return
+        # Refused by an open circuit, or failed while it was tripping / on a failed probe
+        if failure and failure['retryable'] and settings.CIRCUIT_BREAKER:
+            if BREAKERS.get(urlparse(media_url).netloc).state in (OPEN, HALF_OPEN):
+                self.parked_media.append((url_id, media_url, contextvars.copy_context()))
+
+    def _save_observed_endpoints(self, network_requests: List[Dict[str, str]]) -> None:
+        """Store XHR/fetch endpoints seen during rendering for later extraction"""
+        from .core.api_discovery import APIDiscoverer
+        discoverer = APIDiscoverer(self.base_url)
+        for endpoint in discoverer.endpoints_from_requests(network_requests):
+            if self._check_scrape_permission(endpoint):
+                self.db.save_url(endpoint, discoverer.get_domain(endpoint),
+                               visited=False, status=None)
 
     def _mark_url_visited(self, url_id: int, status: int) -> None:
         """Mark URL as visited in database"""
-        cursor = self.db.connection.cursor()
-        cursor.execute(
-            'UPDATE urls SET visited = 1, http_status = ? WHERE id = ?',
-            (status, url_id))
-        self.db.connection.commit()
+        self.db.mark_url_visited(url_id, status)
 
     def export_data(self, data_type: str = 'all') -> Dict[str, Optional[str]]:
         """
@@ -180,46 +405,37 @@ class EthicalScraper:
         Returns:
             Dictionary of export paths keyed by format and type
         """
-        exporters = {
-            'csv': CSVExporter(),
-            'json': JSONExporter(),
-            'sql': SQLExporter()
-        }
+        exporters = {}
+        for fmt in self.export_formats:
+            if fmt in EXPORTERS:
+                module, name = EXPORTERS[fmt]
+                exporters[fmt] = getattr(import_module(module, __package__), name)(output_dir=self.export_dir)
         
         results = {}
         
+        # Rows are streamed from the database so large crawls aren't held in memory
         if data_type in ['all', 'urls']:
-            cursor = self.db.connection.cursor()
-            cursor.execute('SELECT url, domain, visited FROM urls')
-            urls_data = [dict(zip(['url', 'domain', 'visited'], row)) 
-                        for row in cursor.fetchall()]
-            
             for fmt in self.export_formats:
                 if fmt in exporters:
                     results[f'urls_{fmt}'] = exporters[fmt].export_urls(
-                        urls_data,
+                        self.db.iter_urls(),
                         filename=f'urls_export.{fmt}'
                     )
         
         if data_type in ['all', 'content']:
-            cursor = self.db.connection.cursor()
-            cursor.execute('''
-                SELECT u.url, c.content_type, c.text_content 
-                FROM content c
-                JOIN urls u ON c.url_id = u.id
-            ''')
-            content_data = [dict(zip(['url', 'type', 'content'], row)) 
-                          for row in cursor.fetchall()]
-            
             for fmt in self.export_formats:
                 if fmt in exporters:
                     results[f'content_{fmt}'] = exporters[fmt].export_content(
-                        content_data,
+                        self.db.iter_content(),
                         filename=f'content_export.{fmt}'
                     )
         
         return results
 
+    def _phase(self, name: str):
+        """Profile a pipeline phase when --profile is on"""
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+
     def run(self) -> bool:
         """Run the complete scraping process with error handling"""
         try:
@@ -229,18 +445,22 @@ class EthicalScraper:
                 return False
 
             # Step 2: URL discovery
-            urls = self.discover_urls()
+            with self._phase('discover'):
+                urls = self.discover_urls()
             
             # Step 3: API endpoint discovery
-            api_endpoints = self.discover_api_endpoints()
+            with self._phase('api_discovery'):
+                api_endpoints = self.discover_api_endpoints()
             all_urls = urls.union(api_endpoints)
             
             # Step 4: Content extraction
             if all_urls:
-                self.extract_content([(None, url) for url in all_urls])
+                with self._phase('extract'):
+                    self.extract_content([(None, url) for url in all_urls])
             
             # Step 5: Data export
-            export_results = self.export_data()
+            with self._phase('export'):
+                export_results = self.export_data()
             logger.info(f"Export results: {export_results}")
             
             logger.info("Scraping process completed successfully")
@@ -250,9 +470,25 @@ class EthicalScraper:
             logger.error(f"Scraping process failed: {str(e)}", exc_info=True)
             return False
         finally:
-            if self.js_renderer:
-                self.js_renderer.close()
-            self.db.close()
+            self.close()
+
+    def close(self) -> None:
+        """Release this site's resources, and the process-wide ones when standalone"""
+        if self.js_renderer:
+            self.js_renderer.close()
+        if self.standalone:
+            if self.archiver:
+                from .core.request_manager import RequestManager
+                RequestManager.archiver = None
+                self.archiver.close()
+            from .core.transport import close_transport
+            close_transport()
+            tracing.close()
+            if self.metrics_writer:
+                self.metrics_writer.stop()
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+        self.db.close()
 
 def parse_args() -> argparse.Namespace:
     """Parse and validate command line arguments"""
@@ -263,6 +499,43 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('url', help='Base URL to scrape')
     parser.add_argument('--js', action='store_true', 
                        help='Enable JavaScript rendering')
+    parser.add_argument('--js-mode', choices=['hybrid', 'always'],
+                       default=settings.JS_RENDER_MODE,
+                       help='Render every page, or only pages whose static HTML looks client-rendered')
+    parser.add_argument('--probe-api-paths', action='store_true',
+                       help='Also request guessed API paths like /api and /graphql')
+    parser.add_argument('--shards', type=int, default=settings.STORAGE_SHARDS,
+                       help='Split storage by host over this many SQLite files (for parallel workers)')
+    parser.add_argument('--warc', action='store_true',
+                       help='Archive raw responses to WARC files for offline re-extraction')
+    parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                       help='Serve Prometheus-style metrics on this local port')
+    parser.add_argument('--metrics-snapshot', default=settings.METRICS_SNAPSHOT_FILE,
+                       help='Write a JSON metrics snapshot to this file periodically')
+    parser.add_argument('--log-level', default=settings.LOG_LEVEL,
+                       choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                       help='Level for both the log file and the console')
+    parser.add_argument('--log-format', choices=['text', 'json'], default=settings.LOG_FORMAT,
+                       help='Format of the log file')
+    parser.add_argument('--profile', choices=['cpu', 'mem', 'both'], default=settings.PROFILE_MODE,
+                       help='Write CPU and/or memory profiles for each pipeline phase')
+    parser.add_argument('--profile-dir', default=settings.PROFILE_DIR,
+                       help='Directory for the per-phase profile reports')
+    parser.add_argument('--trace', dest='trace_file', default=settings.TRACE_FILE,
+                       help='Write per-URL tracing spans to this JSONL file')
+    parser.add_argument('--trace-sample-rate', type=float, default=settings.TRACE_SAMPLE_RATE,
+                       help='Share of URLs (0-1) whose spans are recorded')
+    parser.add_argument('--transport', choices=['live', 'record', 'replay'],
+                       default=settings.TRANSPORT_MODE,
+                       help='Use the network, record responses while crawling, or replay a recording')
+    parser.add_argument('--transport-archive', default=settings.TRANSPORT_ARCHIVE_DIR,
+                       help='Directory of the record/replay archive')
+    parser.add_argument('--replay-latency', type=float, default=settings.REPLAY_LATENCY,
+                       help='Seconds of simulated latency per replayed response')
+    parser.add_argument('--replay-error-rate', type=float, default=settings.REPLAY_ERROR_RATE,
+                       help='Share of replayed requests that fail, to exercise error handling')
+    parser.add_argument('--replay-seed', type=int, default=settings.REPLAY_SEED,
+                       help='Seed for simulated latency and errors')
     parser.add_argument('--export', nargs='+', choices=['csv', 'json', 'sql'],
                        default=['json'], help='Export formats')
     parser.add_argument('--auth', help='Authentication type', 
@@ -290,24 +563,184 @@ def parse_args() -> argparse.Namespace:
 def configure_settings(args: argparse.Namespace) -> None:
     """Update settings based on command line arguments"""
     settings.RESPECT_ROBOTS_TXT = not args.ignore_robots
+    settings.PROBE_COMMON_API_PATHS = args.probe_api_paths
+    settings.STORAGE_SHARDS = args.shards
+    settings.WARC_ARCHIVE = settings.WARC_ARCHIVE or args.warc
+    settings.METRICS_PORT = args.metrics_port
+    settings.METRICS_SNAPSHOT_FILE = args.metrics_snapshot
+    settings.LOG_LEVEL = settings.LOG_CONSOLE_LEVEL = args.log_level
+    settings.LOG_FORMAT = args.log_format
+    configure_logging()
+    settings.PROFILE_MODE = args.profile
+    settings.PROFILE_DIR = args.profile_dir
+    settings.TRACE_FILE = args.trace_file
+    settings.TRACE_SAMPLE_RATE = args.trace_sample_rate
+    settings.TRANSPORT_MODE = args.transport
+    settings.TRANSPORT_ARCHIVE_DIR = args.transport_archive
+    settings.REPLAY_LATENCY = args.replay_latency
+    settings.REPLAY_ERROR_RATE = args.replay_error_rate
+    settings.REPLAY_SEED = args.replay_seed
     if args.bypass_strategy:
         settings.BYPASS_STRATEGY = args.bypass_strategy
 
+def search_main(argv: List[str]) -> None:
+    """Search scraped content: main.py search QUERY [--limit N] [--rebuild]"""
+    parser = argparse.ArgumentParser(
+        prog='main.py search',
+        description='Full-text search over scraped content',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('query', nargs='?', help='FTS5 query, e.g. "privacy policy" or cookies OR tracking')
+    parser.add_argument('--limit', type=int, default=20, help='Maximum number of hits')
+    parser.add_argument('--rebuild', action='store_true',
+                       help='Index content added since the last indexing run first')
+    parser.add_argument('--full', action='store_true',
+                       help='With --rebuild, reindex all content from scratch')
+    parser.add_argument('--shards', type=int, default=settings.STORAGE_SHARDS,
+                       help='Number of storage shards the crawl used')
+    args = parser.parse_args(argv)
+    if not args.query and not args.rebuild:
+        parser.error("a query or --rebuild is required")
+
+    from .storage.sharded import create_storage
+    db = create_storage(args.shards)
+    try:
+        if args.rebuild:
+            print(f"Indexed {db.rebuild_search_index(full=args.full)} content rows")
+        if args.query:
+            for rank, hit in enumerate(db.search(args.query, limit=args.limit), 1):
+                print(f"{rank:3d}. {hit['url']}  ({hit['score']:.2f})")
+                print(f"     {hit['snippet']}")
+    finally:
+        db.close()
+
+def reextract_main(argv: List[str]) -> None:
+    """Rebuild content from archived responses: main.py reextract [--workers N]"""
+    parser = argparse.ArgumentParser(
+        prog='main.py reextract',
+        description='Re-run content extraction over WARC-archived responses without fetching',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--warc-dir', default=settings.WARC_STORAGE,
+                       help='Directory holding the WARC files')
+    parser.add_argument('--workers', type=int, default=settings.REEXTRACT_WORKERS,
+                       help='Extraction processes (default: one per CPU)')
+    parser.add_argument('--batch-size', type=int, default=settings.REEXTRACT_BATCH_SIZE,
+                       help='Pages written per database transaction')
+    parser.add_argument('--shards', type=int, default=settings.STORAGE_SHARDS,
+                       help='Number of storage shards the crawl used')
+    parser.add_argument('--base-url',
+                       help='Base URL the crawl was started with (default: the site root of each page)')
+    args = parser.parse_args(argv)
+
+    from .core.reextractor import Reextractor
+    from .storage.sharded import create_storage
+    db = create_storage(args.shards)
+    try:
+        stats = Reextractor(db, warc_dir=args.warc_dir, workers=args.workers,
+                            batch_size=args.batch_size, base_url=args.base_url).run()
+        print(f"Re-extracted {stats['pages']} pages ({stats['changed']} changed, "
+              f"{stats['failed']} failed) in {stats['seconds']}s: "
+              f"{stats['pages_per_second']} pages/s")
+    finally:
+        db.close()
+
+def trace_main(argv: List[str]) -> None:
+    """Summarize a trace file: main.py trace FILE [--trace ID | --slowest N]"""
+    parser = argparse.ArgumentParser(
+        prog='main.py trace',
+        description='Show where time went in a --trace JSONL file',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('file', help='JSONL file written with --trace')
+    parser.add_argument('--trace', dest='trace_id', help='Show the timeline of one trace (id prefix)')
+    parser.add_argument('--slowest', type=int, metavar='N', help='List the N slowest traced URLs')
+    parser.add_argument('--min-percent', type=float, default=0.5,
+                       help='Hide call paths below this share of the total time')
+    args = parser.parse_args(argv)
+
+    spans = tracing.load_spans(args.file)
+    if args.trace_id:
+        tracing.print_timeline(spans, args.trace_id)
+    elif args.slowest:
+        tracing.print_slowest(spans, args.slowest)
+    else:
+        tracing.print_flame(spans, args.min_percent)
+
+def batch_main(argv: List[str]) -> None:
+    """Crawl many sites in one process: main.py batch SEEDFILE [--sites N]"""
+    parser = argparse.ArgumentParser(
+        prog='main.py batch',
+        description='Crawl every site listed in a seed file, sharing connections and caches',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('seed_file', help='File with one base URL per line (# starts a comment)')
+    parser.add_argument('--output-dir', default=settings.BATCH_OUTPUT_DIR,
+                       help='Directory for the per-site databases, media and exports')
+    parser.add_argument('--sites', type=int, default=settings.BATCH_SITES,
+                       help='Sites crawled at the same time')
+    parser.add_argument('--global-concurrency', type=int, default=settings.BATCH_GLOBAL_CONCURRENCY,
+                       help='Requests in flight across all sites')
+    parser.add_argument('--export', nargs='+', choices=['csv', 'json', 'sql'],
+                       default=['json'], help='Export formats written for every site')
+    parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                       help='Serve Prometheus-style metrics on this local port')
+    parser.add_argument('--metrics-snapshot', default=settings.METRICS_SNAPSHOT_FILE,
+                       help='Write a JSON metrics snapshot to this file periodically')
+    parser.add_argument('--log-level', default=settings.LOG_LEVEL,
+                       choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                       help='Level for both the log file and the console')
+    parser.add_argument('--log-format', choices=['text', 'json'], default=settings.LOG_FORMAT,
+                       help='Format of the log file')
+    parser.add_argument('--ignore-robots', action='store_true',
+                       help='Disable robots.txt checking (not recommended)')
+    args = parser.parse_args(argv)
+
+    settings.RESPECT_ROBOTS_TXT = not args.ignore_robots
+    settings.METRICS_PORT = args.metrics_port
+    settings.METRICS_SNAPSHOT_FILE = args.metrics_snapshot
+    settings.LOG_LEVEL = settings.LOG_CONSOLE_LEVEL = args.log_level
+    settings.LOG_FORMAT = args.log_format
+    configure_logging()
+
+    from .core.batch import BatchRunner, read_seed_file
+    seeds = read_seed_file(args.seed_file)
+    if not seeds:
+        parser.error(f"No valid URLs in {args.seed_file}")
+    stats = BatchRunner(seeds, EthicalScraper, output_dir=args.output_dir, sites=args.sites,
+                        global_concurrency=args.global_concurrency, export_formats=args.export).run()
+    print(f"Crawled {stats['sites']} sites ({stats['succeeded']} ok, {stats['failed']} failed) "
+          f"in {stats['seconds']}s: {stats['sites_per_minute']} sites/min")
+    exit(0 if not stats['failed'] else 1)
+
+SUBCOMMANDS = {
+    'batch': batch_main,
+    'search': search_main,
+    'reextract': reextract_main,
+    'trace': trace_main
+}
+
 def main() -> None:
     """Main entry point for the scraper"""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     args = parse_args()
     configure_settings(args)
     
     scraper = EthicalScraper(
         args.url,
         use_js=args.js,
-        export_formats=args.export
+        export_formats=args.export,
+        js_mode=args.js_mode
     )
     
     # Handle authentication if provided
     if args.auth == 'basic' and args.username and args.password:
-        if not scraper.auth_handler.basic_auth(args.url, args.username, args.password):
-            logger.error("Authentication failed")
+        success, message = scraper.auth_handler.attempt_login(args.url, args.username, args.password)
+        if not success:
+            logger.error(f"Authentication failed: {message}")
             exit(1)
         logger.info("Authentication successful")
     
@@ -0,0 +1,109 @@
+from abc import ABC, abstractmethod
+
+class StorageBackend(ABC):
+    """
+    Operations the scraper needs from its storage
+
+    IDs returned by a backend are opaque: pass them back to the same backend,
+    don't assume they are row ids of a particular table.
+
+    Backends also expose index_db_file, the SQLite file that holds run-wide
+    tables other writers (such as the WARC archiver) open themselves.
+    """
+
+    index_db_file = None
+
+    @abstractmethod
+    def save_url(self, url, domain, visited=False, status=None):
+        """Save URL and return its id (None if it already existed)"""
+
+    @abstractmethod
+    def get_url_id(self, url):
+        """Look up the id of a stored URL"""
+
+    @abstractmethod
+    def get_unvisited_urls(self):
+        """Return (id, url) tuples of URLs that haven't been extracted yet and aren't waiting for a retry"""
+
+    @abstractmethod
+    def mark_url_visited(self, url_id, status):
+        """Mark URL as visited with the HTTP status it returned"""
+
+    @abstractmethod
+    def get_deferred_urls(self):
+        """Return (id, url, next_attempt_at) tuples of URLs waiting for a retry, earliest first"""
+
+    @abstractmethod
+    def get_retry_count(self, url_id):
+        """Return how many retries a URL has been scheduled for"""
+
+    @abstractmethod
+    def defer_url(self, url_id, status, next_attempt_at, count_retry=True):
+        """Schedule a retry no earlier than next_attempt_at (Unix time), counting it unless count_retry is False"""
+
+    @abstractmethod
+    def save_content_if_changed(self, url_id, content_type, text_content):
+        """Save content unless unchanged; return (content_id, changed)"""
+
+    @abstractmethod
+    def save_extractions(self, extractions):
+        """Bulk-write (url, domain, text, media) re-extraction results"""
+
+    def save_content(self, url_id, content_type, text_content):
+        """
+        Save content to storage
+
+        Content that matches the latest stored version for the URL once
+        whitespace is normalized is not stored again; the id of the existing
+        row is returned instead.
+        """
+        content_id, _ = self.save_content_if_changed(url_id, content_type, text_content)
+        return content_id
+
+    @abstractmethod
+    def save_media(self, url_id, media_url, media_type, local_path, file_size):
+        """Save media information"""
+
+    @abstractmethod
+    def get_media(self, url_id):
+        """Return the media stored for a URL as dicts"""
+
+    @abstractmethod
+    def find_near_duplicate(self, url_id, fingerprint, max_distance=None):
+        """Return the id of a stored page with a near-identical fingerprint"""
+
+    @abstractmethod
+    def save_fingerprint(self, url_id, fingerprint, duplicate_of=None):
+        """Store a page fingerprint"""
+
+    @abstractmethod
+    def get_bundle_scan(self, url):
+        """Return the cached endpoint scan of a JavaScript bundle"""
+
+    @abstractmethod
+    def save_bundle_scan(self, url, content_hash, etag, last_modified, endpoints):
+        """Cache the endpoints found in a JavaScript bundle"""
+
+    @abstractmethod
+    def iter_urls(self):
+        """Yield stored URLs as dicts"""
+
+    @abstractmethod
+    def iter_content(self):
+        """Yield stored content as dicts with plain text"""
+
+    @abstractmethod
+    def get_changed_since(self, since):
+        """List pages whose content is new or changed since a point in time"""
+
+    @abstractmethod
+    def search(self, query, limit=20):
+        """Full-text search returning ranked hits"""
+
+    @abstractmethod
+    def rebuild_search_index(self, full=False):
+        """Bring the full-text index up to date"""
+
+    @abstractmethod
+    def close(self):
+        """Release connections"""
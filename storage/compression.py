@@ -0,0 +1,79 @@
+import struct
+import zlib
+from collections import Counter
+
+# zstandard is optional; zlib is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Stored blobs start with a codec marker and the id of the dictionary used (0 = none)
+HEADER = struct.Struct('>cI')
+CODEC_MARKERS = {'zlib': b'z', 'zstd': b's'}
+MARKER_CODECS = {marker: codec for codec, marker in CODEC_MARKERS.items()}
+
+ZLIB_MAX_DICTIONARY = 32768  # zlib only looks back over a 32 KB window
+
+def available_codec(codec):
+    """Return the codec to use, falling back to zlib when zstandard isn't installed"""
+    if codec == 'zstd' and zstandard is None:
+        return 'zlib'
+    return codec
+
+def compress_text(text, codec='zlib', level=6, dictionary=None, dictionary_id=0):
+    """Compress text into a self-describing blob"""
+    data = text.encode('utf-8')
+    if codec == 'zstd':
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        payload = zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(data)
+    else:
+        compressor = zlib.compressobj(level, zdict=dictionary) if dictionary else zlib.compressobj(level)
+        payload = compressor.compress(data) + compressor.flush()
+    return HEADER.pack(CODEC_MARKERS[codec], dictionary_id if dictionary else 0) + payload
+
+def blob_dictionary_id(value):
+    """Return the dictionary id a stored value was compressed with, or None"""
+    if isinstance(value, (bytes, memoryview)) and len(value) >= HEADER.size:
+        return HEADER.unpack(bytes(value[:HEADER.size]))[1]
+    return None
+
+def decompress_text(value, dictionary=None):
+    """Turn a stored value back into text; plain strings pass through unchanged"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    marker, _ = HEADER.unpack(value[:HEADER.size])
+    payload = value[HEADER.size:]
+    if MARKER_CODECS.get(marker) == 'zstd':
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        data = zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+    else:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        data = decompressor.decompress(payload) + decompressor.flush()
+    return data.decode('utf-8')
+
+def build_dictionary(samples, codec='zlib', size=ZLIB_MAX_DICTIONARY):
+    """
+    Build a compression dictionary from pages of one site
+
+    zstd trains a real dictionary. For zlib the dictionary is the site's shared
+    boilerplate: lines seen on more than one sample page, most common last, because
+    zlib encodes matches near the end of the dictionary most cheaply.
+    """
+    if codec == 'zstd':
+        encoded = [sample.encode('utf-8') for sample in samples]
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+
+    line_counts = Counter()
+    for sample in samples:
+        line_counts.update(set(line.strip() for line in sample.splitlines() if line.strip()))
+
+    shared_lines = [line for line, count in line_counts.most_common() if count > 1]
+    dictionary = b''
+    for line in shared_lines:
+        encoded = line.encode('utf-8') + b'\n'
+        if len(dictionary) + len(encoded) > min(size, ZLIB_MAX_DICTIONARY):
+            break
+        dictionary = encoded + dictionary
+    return dictionary or None
@@ -1,71 +1,106 @@
+import os
+import re
+import json
+import hashlib
 import sqlite3
 from sqlite3 import Error
 from pathlib import Path
 from ..config import settings
+from ..utilities import metrics, tracing
 from ..utilities.logger import setup_logger
+from .base import StorageBackend
+from .schema import HOT_QUERIES, apply_migrations
+from .compression import (available_codec, blob_dictionary_id, build_dictionary,
+                          compress_text, decompress_text)
+from ..utilities.simhash import (hamming_distance, simhash_bands, to_signed,
+                                 to_unsigned)
 
 logger = setup_logger(__name__)
 
-class DatabaseManager:
-    def __init__(self):
-        self.db_file = os.path.join(settings.DATA_STORAGE, 'scraper.db')
+DB_WRITE_SECONDS = metrics.histogram('scraper_db_write_seconds', 'Time to write and commit to SQLite',
+                                     ['operation'])
+
+def content_hash(text_content):
+    """Hash text with whitespace normalized, so reflowed markup doesn't count as a change"""
+    normalized = re.sub(r'\s+', ' ', text_content or '').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+FTS_OPERATORS = {'AND', 'OR', 'NOT', 'NEAR'}
+
+def make_snippet(text, query, width=160):
+    """Cut a window of text around the first query term, marking matches with [ ]"""
+    terms = [term for term in re.findall(r'\w+', query) if term.upper() not in FTS_OPERATORS]
+    if not terms or not text:
+        return (text or '')[:width]
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(0, match.start() - width // 2) if match else 0
+    window = ' '.join(text[start:start + width].split())
+    window = pattern.sub(lambda m: f'[{m.group(0)}]', window)
+    return ('...' if start else '') + window + ('...' if start + width < len(text) else '')
+
+class DatabaseManager(StorageBackend):
+    def __init__(self, db_file=None):
+        self.db_file = db_file or os.path.join(settings.DATA_STORAGE, 'scraper.db')
+        self.index_db_file = self.db_file
+        Path(self.db_file).parent.mkdir(parents=True, exist_ok=True)
         self.connection = None
+        self._dictionaries = {}
+        self._domain_dictionaries = {}
+        self._dictionary_samples = {}
+        self.fts_enabled = False
         self.connect()
         self.initialize_database()
         
     def connect(self):
         """Create a database connection"""
         try:
-            self.connection = sqlite3.connect(self.db_file)
+            self.connection = sqlite3.connect(self.db_file, timeout=settings.DB_BUSY_TIMEOUT)
+            # WAL lets readers and other processes proceed while one writer commits
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
             logger.info(f"Connected to database at {self.db_file}")
         except Error as e:
             logger.error(f"Database connection error: {str(e)}")
             
     def initialize_database(self):
-        """Initialize database tables if they don't exist"""
+        """Create or upgrade the database schema"""
         try:
-            cursor = self.connection.cursor()
-            
-            # Create URLs table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS urls (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url TEXT UNIQUE,
-                    domain TEXT,
-                    visited BOOLEAN DEFAULT 0,
-                    visit_timestamp DATETIME,
-                    http_status INTEGER
-                )
-            ''')
+            version = apply_migrations(self.connection)
+            logger.debug(f"Database schema at version {version}")
+            if settings.FULL_TEXT_SEARCH:
+                self._initialize_search_index()
+        except Error as e:
+            logger.error(f"Database initialization error: {str(e)}")
             
-            # Create content table
+    def _initialize_search_index(self):
+        """
+        Create the full-text index over the latest content of each URL. It is
+        contentless (text lives compressed in content) and keyed by content.id.
+        """
+        cursor = self.connection.cursor()
+        try:
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS content (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url_id INTEGER,
-                    content_type TEXT,
-                    text_content TEXT,
-                    FOREIGN KEY (url_id) REFERENCES urls (id)
+                CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(
+                    text_content,
+                    content='',
+                    tokenize='unicode61 remove_diacritics 2'
                 )
             ''')
-            
-            # Create media table
+            # Which content row currently represents each URL in the index
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS media (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url_id INTEGER,
-                    media_url TEXT,
-                    media_type TEXT,
-                    local_path TEXT,
-                    file_size INTEGER,
-                    FOREIGN KEY (url_id) REFERENCES urls (id)
+                CREATE TABLE IF NOT EXISTS content_fts_docs (
+                    url_id INTEGER PRIMARY KEY,
+                    content_id INTEGER
                 )
             ''')
-            
             self.connection.commit()
+            self.fts_enabled = True
         except Error as e:
-            logger.error(f"Database initialization error: {str(e)}")
+            logger.warning(f"Full-text search unavailable (SQLite without FTS5?): {str(e)}")
             
+    @tracing.traced('db.save_url')
+    @DB_WRITE_SECONDS.time(operation='save_url')
     def save_url(self, url, domain, visited=False, status=None):
         """Save URL to database"""
         try:
@@ -80,20 +115,405 @@ class DatabaseManager:
             logger.error(f"Failed to save URL {url}: {str(e)}")
             return None
             
-    def save_content(self, url_id, content_type, text_content):
-        """Save content to database"""
+    def get_url_id(self, url):
+        """Look up the ID of a stored URL"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT id FROM urls WHERE url = ?', (url,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Error as e:
+            logger.error(f"Failed to look up URL {url}: {str(e)}")
+            return None
+            
+    def get_unvisited_urls(self):
+        """Return (id, url) tuples of URLs that haven't been extracted yet"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(HOT_QUERIES['unvisited_urls'])
+            return cursor.fetchall()
+        except Error as e:
+            logger.error(f"Failed to load unvisited URLs: {str(e)}")
+            return []
+            
+    @tracing.traced('db.mark_url_visited')
+    @DB_WRITE_SECONDS.time(operation='mark_url_visited')
+    def mark_url_visited(self, url_id, status):
+        """Mark URL as visited with the HTTP status it returned"""
         try:
             cursor = self.connection.cursor()
             cursor.execute('''
-                INSERT INTO content (url_id, content_type, text_content)
-                VALUES (?, ?, ?)
-            ''', (url_id, content_type, text_content))
+                UPDATE urls SET visited = 1, http_status = ?, visit_timestamp = CURRENT_TIMESTAMP,
+                    next_attempt_at = NULL
+                WHERE id = ?
+            ''', (status, url_id))
             self.connection.commit()
-            return cursor.lastrowid
+            return True
+        except Error as e:
+            logger.error(f"Failed to mark URL ID {url_id} visited: {str(e)}")
+            return False
+
+    def get_deferred_urls(self):
+        """Return (id, url, next_attempt_at) tuples of URLs waiting for a retry, earliest first"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(HOT_QUERIES['deferred_urls'])
+            return cursor.fetchall()
+        except Error as e:
+            logger.error(f"Failed to load deferred URLs: {str(e)}")
+            return []
+
+    def get_retry_count(self, url_id):
+        """Return how many retries a URL has been scheduled for"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT retry_count FROM urls WHERE id = ?', (url_id,))
+            row = cursor.fetchone()
+            return (row[0] or 0) if row else 0
+        except Error as e:
+            logger.error(f"Failed to look up retries of URL ID {url_id}: {str(e)}")
+            return 0
+
+    @tracing.traced('db.defer_url')
+    @DB_WRITE_SECONDS.time(operation='defer_url')
+    def defer_url(self, url_id, status, next_attempt_at, count_retry=True):
+        """
+        Schedule a retry no earlier than next_attempt_at (Unix time)
+
+        URLs parked because their host's circuit is open pass count_retry=False:
+        they were never requested, so the wait doesn't use up one of their retries.
+        """
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                UPDATE urls SET retry_count = COALESCE(retry_count, 0) + ?, next_attempt_at = ?,
+                    http_status = ?, visit_timestamp = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (int(count_retry), next_attempt_at, status, url_id))
+            self.connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"Failed to defer URL ID {url_id}: {str(e)}")
+            return False
+            
+    def get_media(self, url_id):
+        """Return the media stored for a URL as dicts"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(HOT_QUERIES['media_for_url'], (url_id,))
+            return [dict(zip(['media_url', 'media_type', 'local_path'], row))
+                    for row in cursor.fetchall()]
+        except Error as e:
+            logger.error(f"Failed to load media for URL ID {url_id}: {str(e)}")
+            return []
+            
+    @tracing.traced('db.save_content_if_changed')
+    @DB_WRITE_SECONDS.time(operation='save_content_if_changed')
+    def save_content_if_changed(self, url_id, content_type, text_content):
+        """
+        Save content unless it matches the latest stored version for the URL
+
+        Unchanged content only has its last_seen timestamp bumped.
+
+        Returns:
+            Tuple of (content_id, changed)
+        """
+        try:
+            cursor = self.connection.cursor()
+            result = self._store_content(cursor, url_id, content_type, text_content)
+            self.connection.commit()
+            return result
         except Error as e:
             logger.error(f"Failed to save content for URL ID {url_id}: {str(e)}")
-            return None
+            return None, False
+
+    def _store_content(self, cursor, url_id, content_type, text_content):
+        """Insert or touch a content row without committing; return (content_id, changed)"""
+        text_hash = content_hash(text_content)
+        cursor.execute(HOT_QUERIES['latest_content'], (url_id,))
+        latest = cursor.fetchone()
+        if latest and latest[1] == text_hash:
+            cursor.execute(
+                'UPDATE content SET last_seen = CURRENT_TIMESTAMP WHERE id = ?',
+                (latest[0],))
+            return latest[0], False
+
+        cursor.execute('''
+            INSERT INTO content (url_id, content_type, text_content, content_hash,
+                                 first_seen, last_seen)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', (url_id, content_type, self.encode_text(url_id, text_content), text_hash))
+        content_id = cursor.lastrowid
+        if self.fts_enabled:
+            self._index_content(cursor, content_id, url_id, text_content)
+            self._set_metadata(cursor, 'fts_last_content_id', content_id)
+        return content_id, True
+
+    @tracing.traced('db.save_extractions')
+    @DB_WRITE_SECONDS.time(operation='save_extractions')
+    def save_extractions(self, extractions):
+        """
+        Write re-extracted pages in one transaction
+
+        Content goes through the same change detection as a crawl. Media rows
+        are replaced by the new link set; rows for links that are still present
+        keep their downloaded file, new links are recorded without one.
+
+        Args:
+            extractions: Iterable of (url, domain, text, media) with media a
+                list of (media_type, media_url) tuples
+
+        Returns:
+            Number of pages whose content changed
+        """
+        changed_count = 0
+        try:
+            cursor = self.connection.cursor()
+            for url, domain, text_content, media_links in extractions:
+                cursor.execute('SELECT id FROM urls WHERE url = ?', (url,))
+                row = cursor.fetchone()
+                if row:
+                    url_id = row[0]
+                else:
+                    cursor.execute('''
+                        INSERT INTO urls (url, domain, visited, visit_timestamp, http_status)
+                        VALUES (?, ?, 1, CURRENT_TIMESTAMP, 200)
+                    ''', (url, domain))
+                    url_id = cursor.lastrowid
+                _, changed = self._store_content(cursor, url_id, 'html', text_content)
+                changed_count += changed
+
+                cursor.execute(HOT_QUERIES['media_for_url'], (url_id,))
+                stored = {media_url for media_url, _, _ in cursor.fetchall()}
+                wanted = {media_url: media_type for media_type, media_url in media_links}
+                cursor.executemany('DELETE FROM media WHERE url_id = ? AND media_url = ?',
+                                   [(url_id, media_url) for media_url in stored - wanted.keys()])
+                cursor.executemany('''
+                    INSERT INTO media (url_id, media_url, media_type, local_path, file_size)
+                    VALUES (?, ?, ?, NULL, NULL)
+                ''', [(url_id, media_url, wanted[media_url])
+                      for media_url in wanted.keys() - stored])
+            self.connection.commit()
+            return changed_count
+        except Error as e:
+            self.connection.rollback()
+            logger.error(f"Failed to save re-extracted batch: {str(e)}")
+            return 0
             
+    def _get_metadata(self, cursor, key, default=None):
+        cursor.execute('SELECT value FROM metadata WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        return row[0] if row else default
+        
+    def _set_metadata(self, cursor, key, value):
+        cursor.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (key, value))
+        
+    def _index_content(self, cursor, content_id, url_id, text_content):
+        """Add a content row to the search index, replacing the URL's previous version"""
+        cursor.execute('''
+            SELECT d.content_id, c.text_content FROM content_fts_docs d
+            JOIN content c ON c.id = d.content_id
+            WHERE d.url_id = ?
+        ''', (url_id,))
+        previous = cursor.fetchone()
+        if previous:
+            # Contentless FTS5 tables need the original text to delete a row
+            cursor.execute('''
+                INSERT INTO content_fts (content_fts, rowid, text_content)
+                VALUES ('delete', ?, ?)
+            ''', (previous[0], self.decode_text(previous[1])))
+        cursor.execute('INSERT INTO content_fts (rowid, text_content) VALUES (?, ?)',
+                       (content_id, text_content))
+        cursor.execute('INSERT OR REPLACE INTO content_fts_docs (url_id, content_id) VALUES (?, ?)',
+                       (url_id, content_id))
+        
+    def rebuild_search_index(self, full=False):
+        """
+        Bring the full-text index up to date with the content table
+
+        Args:
+            full: Drop the index and reindex everything instead of only new rows
+
+        Returns:
+            Number of content rows indexed
+        """
+        if not self.fts_enabled:
+            logger.warning("Full-text search is not enabled")
+            return 0
+        cursor = self.connection.cursor()
+        if full:
+            cursor.execute("INSERT INTO content_fts (content_fts) VALUES ('delete-all')")
+            cursor.execute('DELETE FROM content_fts_docs')
+            self._set_metadata(cursor, 'fts_last_content_id', 0)
+        last_indexed = int(self._get_metadata(cursor, 'fts_last_content_id', 0))
+
+        # Only the newest version of each URL is searchable
+        read_cursor = self.connection.cursor()
+        read_cursor.execute('''
+            SELECT c.id, c.url_id, c.text_content FROM content c
+            WHERE c.id > ?
+              AND c.id = (SELECT MAX(id) FROM content WHERE url_id = c.url_id)
+            ORDER BY c.id
+        ''', (last_indexed,))
+        count = 0
+        for content_id, url_id, stored_text in read_cursor:
+            self._index_content(cursor, content_id, url_id, self.decode_text(stored_text))
+            self._set_metadata(cursor, 'fts_last_content_id', content_id)
+            count += 1
+        self.connection.commit()
+        logger.info(f"Indexed {count} content rows for full-text search")
+        return count
+        
+    def search(self, query, limit=20):
+        """
+        Full-text search over the latest content of each URL
+
+        Args:
+            query: FTS5 query, e.g. 'privacy policy' or '"exact phrase" OR cookies'
+            limit: Maximum number of hits
+
+        Returns:
+            List of dicts with url, score (lower is better) and snippet, best first
+        """
+        if not self.fts_enabled:
+            logger.warning("Full-text search is not enabled")
+            return []
+        cursor = self.connection.cursor()
+        sql = '''
+            SELECT u.url, f.rank, c.text_content
+            FROM (SELECT rowid, bm25(content_fts) AS rank FROM content_fts
+                  WHERE content_fts MATCH ? ORDER BY rank LIMIT ?) f
+            JOIN content c ON c.id = f.rowid
+            JOIN urls u ON u.id = c.url_id
+            ORDER BY f.rank
+        '''
+        try:
+            cursor.execute(sql, (query, limit))
+        except Error:
+            # Not valid FTS5 syntax: search for the words as plain terms instead
+            terms = ' '.join(f'"{term}"' for term in re.findall(r'\w+', query)
+                             if term.upper() not in FTS_OPERATORS)
+            try:
+                cursor.execute(sql, (terms, limit))
+            except Error as e:
+                logger.error(f"Search failed for {query!r}: {str(e)}")
+                return []
+        return [{'url': url, 'score': rank, 'snippet': make_snippet(self.decode_text(text), query)}
+                for url, rank, text in cursor.fetchall()]
+        
+    def encode_text(self, url_id, text_content):
+        """Compress text for storage according to CONTENT_COMPRESSION"""
+        if not settings.CONTENT_COMPRESSION or text_content is None:
+            return text_content
+        codec = available_codec(settings.CONTENT_COMPRESSION)
+        dictionary_id, dictionary = 0, None
+        if settings.COMPRESSION_DICTIONARY:
+            dictionary_id, dictionary = self._dictionary_for(url_id, codec, text_content)
+        return compress_text(text_content, codec, settings.COMPRESSION_LEVEL,
+                             dictionary, dictionary_id)
+        
+    def decode_text(self, value):
+        """Return stored content as text, decompressing it if needed"""
+        dictionary_id = blob_dictionary_id(value)
+        dictionary = self._load_dictionary(dictionary_id) if dictionary_id else None
+        return decompress_text(value, dictionary)
+        
+    def _load_dictionary(self, dictionary_id):
+        if dictionary_id not in self._dictionaries:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT data FROM compression_dicts WHERE id = ?', (dictionary_id,))
+            row = cursor.fetchone()
+            self._dictionaries[dictionary_id] = row[0] if row else None
+        return self._dictionaries[dictionary_id]
+        
+    def _dictionary_for(self, url_id, codec, text_content):
+        """
+        Return (id, data) of the URL's domain dictionary, training it once
+        COMPRESSION_DICT_SAMPLES pages of the domain have been seen
+        """
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT domain FROM urls WHERE id = ?', (url_id,))
+        row = cursor.fetchone()
+        domain = row[0] if row else None
+        if not domain:
+            return 0, None
+
+        key = (domain, codec)
+        if key not in self._domain_dictionaries:
+            cursor.execute('SELECT id, data FROM compression_dicts WHERE domain = ? AND codec = ?',
+                           key)
+            row = cursor.fetchone()
+            if row:
+                self._domain_dictionaries[key] = (row[0], row[1])
+                self._dictionaries[row[0]] = row[1]
+        if key in self._domain_dictionaries:
+            return self._domain_dictionaries[key]
+
+        samples = self._dictionary_samples.setdefault(key, [])
+        samples.append(text_content)
+        if len(samples) < settings.COMPRESSION_DICT_SAMPLES:
+            return 0, None
+
+        del self._dictionary_samples[key]
+        try:
+            data = build_dictionary(samples, codec, settings.COMPRESSION_DICT_SIZE)
+        except Exception as e:
+            logger.warning(f"Could not train compression dictionary for {domain}: {str(e)}")
+            data = None
+        if not data:
+            # More pages of the same site would most likely fail the same way
+            logger.info(f"No {codec} dictionary for {domain}; compressing its pages without one")
+            self._domain_dictionaries[key] = (0, None)
+            return 0, None
+        # Another process or shard may have trained this domain meanwhile; its dictionary wins
+        cursor.execute('INSERT OR IGNORE INTO compression_dicts (domain, codec, data) VALUES (?, ?, ?)',
+                       (domain, codec, data))
+        trained = cursor.rowcount == 1
+        cursor.execute('SELECT id, data FROM compression_dicts WHERE domain = ? AND codec = ?', key)
+        dictionary_id, data = cursor.fetchone()
+        self._domain_dictionaries[key] = (dictionary_id, data)
+        self._dictionaries[dictionary_id] = data
+        if trained:
+            logger.info(f"Trained {len(data)}-byte {codec} dictionary for {domain}")
+        return dictionary_id, data
+        
+    def iter_urls(self):
+        """Yield stored URLs as dicts, one row at a time"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT url, domain, visited FROM urls')
+        for row in cursor:
+            yield dict(zip(['url', 'domain', 'visited'], row))
+            
+    def iter_content(self):
+        """Yield stored content as dicts with decompressed text, one row at a time"""
+        cursor = self.connection.cursor()
+        cursor.execute(HOT_QUERIES['content_export'])
+        for url, content_type, text_content in cursor:
+            yield {'url': url, 'type': content_type, 'content': self.decode_text(text_content)}
+            
+    def get_changed_since(self, since):
+        """
+        List pages whose content is new or changed since a point in time
+
+        Args:
+            since: datetime (UTC) or 'YYYY-MM-DD HH:MM:SS' string
+
+        Returns:
+            List of dicts with url, content_id, content_hash and first_seen
+        """
+        if hasattr(since, 'strftime'):
+            since = since.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(HOT_QUERIES['changed_since'], (since,))
+            return [dict(zip(['url', 'content_id', 'content_hash', 'first_seen'], row))
+                    for row in cursor.fetchall()]
+        except Error as e:
+            logger.error(f"Failed to query changed content: {str(e)}")
+            return []
+            
+    @tracing.traced('db.save_media')
+    @DB_WRITE_SECONDS.time(operation='save_media')
     def save_media(self, url_id, media_url, media_type, local_path, file_size):
         """Save media information to database"""
         try:
@@ -108,6 +528,104 @@ class DatabaseManager:
             logger.error(f"Failed to save media {media_url}: {str(e)}")
             return None
             
+    def find_near_duplicate(self, url_id, fingerprint, max_distance=None):
+        """
+        Return the url_id of a stored original page whose fingerprint is within
+        max_distance bits
+
+        Only originals are candidates, so duplicates never point at each other,
+        and a recrawled page that others already duplicate stays the original.
+        """
+        if max_distance is None:
+            max_distance = settings.NEAR_DUPLICATE_DISTANCE
+        bands = simhash_bands(fingerprint)
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT 1 FROM fingerprints WHERE duplicate_of = ? LIMIT 1', (url_id,))
+            if cursor.fetchone():
+                return None
+            cursor.execute('''
+                SELECT url_id, simhash FROM fingerprints
+                WHERE url_id != ? AND duplicate_of IS NULL
+                  AND (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)
+            ''', (url_id, *bands))
+            for candidate_id, candidate in cursor.fetchall():
+                if hamming_distance(fingerprint, to_unsigned(candidate)) <= max_distance:
+                    return candidate_id
+        except Error as e:
+            logger.error(f"Near-duplicate lookup failed for URL ID {url_id}: {str(e)}")
+        return None
+        
+    @tracing.traced('db.save_fingerprint')
+    @DB_WRITE_SECONDS.time(operation='save_fingerprint')
+    def save_fingerprint(self, url_id, fingerprint, duplicate_of=None):
+        """Store a page fingerprint, marking it as a near-duplicate if one was found"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO fingerprints
+                    (url_id, simhash, band0, band1, band2, band3, duplicate_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (url_id, to_signed(fingerprint), *simhash_bands(fingerprint), duplicate_of))
+            self.connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"Failed to save fingerprint for URL ID {url_id}: {str(e)}")
+            return False
+            
+    def get_near_duplicates(self):
+        """List pages marked as near-duplicates with the page they duplicate"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                SELECT u.url, o.url
+                FROM fingerprints f
+                JOIN urls u ON f.url_id = u.id
+                JOIN urls o ON f.duplicate_of = o.id
+            ''')
+            return [dict(zip(['url', 'duplicate_of'], row)) for row in cursor.fetchall()]
+        except Error as e:
+            logger.error(f"Failed to list near-duplicates: {str(e)}")
+            return []
+            
+    def get_bundle_scan(self, url):
+        """Return the cached endpoint scan of a JavaScript bundle, if any"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                SELECT content_hash, etag, last_modified, endpoints
+                FROM js_bundles WHERE url = ?
+            ''', (url,))
+            row = cursor.fetchone()
+        except Error as e:
+            logger.error(f"Failed to read bundle cache for {url}: {str(e)}")
+            return None
+        if not row:
+            return None
+        return {
+            'content_hash': row[0],
+            'etag': row[1],
+            'last_modified': row[2],
+            'endpoints': json.loads(row[3] or '[]')
+        }
+        
+    @tracing.traced('db.save_bundle_scan')
+    @DB_WRITE_SECONDS.time(operation='save_bundle_scan')
+    def save_bundle_scan(self, url, content_hash, etag, last_modified, endpoints):
+        """Cache the endpoints found in a JavaScript bundle"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO js_bundles
+                    (url, content_hash, etag, last_modified, endpoints, scanned_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (url, content_hash, etag, last_modified, json.dumps(list(endpoints))))
+            self.connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"Failed to cache bundle scan for {url}: {str(e)}")
+            return False
+            
     def close(self):
         """Close database connection"""
         if self.connection:
@@ -18,7 +18,7 @@ class FileManager:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write(content)
-            logger.info(f"Text content saved to {filepath}")
+            logger.debug(f"Text content saved to {filepath}")
             return True
         except Exception as e:
             logger.error(f"Failed to save text content: {str(e)}")
@@ -30,7 +30,7 @@ class FileManager:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.info(f"JSON data saved to {filepath}")
+            logger.debug(f"JSON data saved to {filepath}")
             return True
         except Exception as e:
             logger.error(f"Failed to save JSON data: {str(e)}")
@@ -42,7 +42,7 @@ class FileManager:
         try:
             with open(filepath, 'wb') as f:
                 f.write(data)
-            logger.info(f"Binary data saved to {filepath}")
+            logger.debug(f"Binary data saved to {filepath}")
             return True
         except Exception as e:
             logger.error(f"Failed to save binary data: {str(e)}")
@@ -0,0 +1,216 @@
+"""
+Versioned schema for the scraper database
+
+Each migration brings the schema from version N-1 to N and is applied once,
+inside a transaction; the current version lives in SQLite's user_version pragma.
+Add new changes as a new migration at the end, never by editing an old one.
+"""
+import sqlite3
+
+def add_missing_columns(cursor, table, columns):
+    """Add columns that a database file created by an older release lacks"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+def _v1_initial_schema(cursor):
+    """Tables as created before schema versioning; existing files are upgraded in place"""
+    # Create URLs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS urls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE,
+            domain TEXT,
+            visited BOOLEAN DEFAULT 0,
+            visit_timestamp DATETIME,
+            http_status INTEGER
+        )
+    ''')
+
+    # Create content table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url_id INTEGER,
+            content_type TEXT,
+            text_content TEXT,
+            content_hash TEXT,
+            first_seen DATETIME,
+            last_seen DATETIME,
+            FOREIGN KEY (url_id) REFERENCES urls (id)
+        )
+    ''')
+    add_missing_columns(cursor, 'content', {
+        'content_hash': 'TEXT',
+        'first_seen': 'DATETIME',
+        'last_seen': 'DATETIME'
+    })
+
+    # Create media table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url_id INTEGER,
+            media_url TEXT,
+            media_type TEXT,
+            local_path TEXT,
+            file_size INTEGER,
+            FOREIGN KEY (url_id) REFERENCES urls (id)
+        )
+    ''')
+
+    # Create near-duplicate fingerprint index (LSH bands of a 64-bit SimHash)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            url_id INTEGER PRIMARY KEY,
+            simhash INTEGER,
+            band0 INTEGER,
+            band1 INTEGER,
+            band2 INTEGER,
+            band3 INTEGER,
+            duplicate_of INTEGER,
+            FOREIGN KEY (url_id) REFERENCES urls (id)
+        )
+    ''')
+    for band in range(4):
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_band{band}
+            ON fingerprints (band{band})
+        ''')
+
+    # Create per-domain compression dictionaries for content text
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dicts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT,
+            codec TEXT,
+            data BLOB,
+            UNIQUE (domain, codec)
+        )
+    ''')
+
+    # Create key/value store for bookkeeping such as search index progress
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    # Create JavaScript bundle scan cache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS js_bundles (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            endpoints TEXT,
+            scanned_at DATETIME
+        )
+    ''')
+
+def _v2_indexes(cursor):
+    """Secondary indexes for the crawl frontier, content joins and media lookups"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_urls_visited_status ON urls (visited, http_status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_urls_domain ON urls (domain)')
+    # (url_id, id) also serves "latest version of this URL" lookups
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_url_id ON content (url_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_first_seen ON content (first_seen)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_url_id ON media (url_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fingerprints_duplicate_of ON fingerprints (duplicate_of)')
+
+def _v3_warc_index(cursor):
+    """CDX-style index of archived responses: where each WARC record starts and ends"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS warc_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT,
+            timestamp TEXT,
+            status INTEGER,
+            mime TEXT,
+            digest TEXT,
+            warc_file TEXT,
+            offset INTEGER,
+            length INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_warc_records_url ON warc_records (url, timestamp)')
+
+def _v4_retry_state(cursor):
+    """Deferred retries: how often a URL failed and when it may be fetched again"""
+    add_missing_columns(cursor, 'urls', {
+        'retry_count': 'INTEGER DEFAULT 0',
+        # Unix time; NULL unless the URL is waiting for a retry
+        'next_attempt_at': 'REAL'
+    })
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_urls_visited_next_attempt ON urls (visited, next_attempt_at)')
+
+MIGRATIONS = [
+    (1, _v1_initial_schema),
+    (2, _v2_indexes),
+    (3, _v3_warc_index),
+    (4, _v4_retry_state),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Queries on the crawl's hot path; each must be answered from an index
+HOT_QUERIES = {
+    'unvisited_urls': 'SELECT id, url FROM urls WHERE visited = 0 AND next_attempt_at IS NULL',
+    'deferred_urls': '''
+        SELECT id, url, next_attempt_at FROM urls
+        WHERE visited = 0 AND next_attempt_at IS NOT NULL
+        ORDER BY next_attempt_at
+    ''',
+    'urls_by_domain': 'SELECT id, url FROM urls WHERE domain = ?',
+    'latest_content': 'SELECT id, content_hash FROM content WHERE url_id = ? ORDER BY id DESC LIMIT 1',
+    'content_export': '''
+        SELECT u.url, c.content_type, c.text_content
+        FROM content c
+        JOIN urls u ON c.url_id = u.id
+    ''',
+    'changed_since': '''
+        SELECT u.url, c.id, c.content_hash, c.first_seen
+        FROM content c
+        JOIN urls u ON c.url_id = u.id
+        WHERE c.first_seen > ?
+        ORDER BY c.first_seen
+    ''',
+    'media_for_url': 'SELECT media_url, media_type, local_path FROM media WHERE url_id = ?',
+}
+
+def get_schema_version(connection):
+    """Return the schema version recorded in the database file"""
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(connection):
+    """
+    Apply any migrations the database hasn't seen yet
+
+    Returns:
+        The schema version after migrating
+    """
+    current = get_schema_version(connection)
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = connection.cursor()
+        try:
+            cursor.execute('BEGIN')
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        current = version
+    return current
+
+def create_warc_index(cursor):
+    """
+    Create the WARC offset index in a file that may not hold the rest of the
+    schema, such as a standalone WARC or transport archive index
+    """
+    _v3_warc_index(cursor)
@@ -0,0 +1,190 @@
+import hashlib
+import heapq
+import os
+import sqlite3
+from pathlib import Path
+from urllib.parse import urlparse
+from ..config import settings
+from ..utilities.logger import setup_logger
+from .base import StorageBackend
+from .database import DatabaseManager
+
+logger = setup_logger(__name__)
+
+MAX_SHARDS = 10  # SQLite's default limit on attached databases for the union view
+
+class ShardedDatabaseManager(StorageBackend):
+    def __init__(self, shard_count, data_dir=None):
+        """
+        Spread scraper data over several SQLite files, one host per shard
+
+        Every host hashes to a fixed shard, so parallel crawler processes working on
+        different hosts write to different files and don't contend for one lock.
+        Ids handed out are global: local_id * shard_count + shard_index.
+
+        Args:
+            shard_count: Number of database files (1 to MAX_SHARDS)
+            data_dir: Directory holding the shard files (default: settings.DATA_STORAGE)
+        """
+        if not 1 <= shard_count <= MAX_SHARDS:
+            raise ValueError(f"shard_count must be between 1 and {MAX_SHARDS}")
+        self.shard_count = shard_count
+        self.data_dir = data_dir or settings.DATA_STORAGE
+        Path(self.data_dir).mkdir(parents=True, exist_ok=True)
+        self.shards = [
+            DatabaseManager(os.path.join(self.data_dir, f'scraper_{index:02d}.db'))
+            for index in range(shard_count)
+        ]
+        # Run-wide tables such as the WARC index live in the first shard
+        self.index_db_file = self.shards[0].db_file
+
+    def shard_index(self, url):
+        """Pick the shard for a URL by hashing its host"""
+        host = urlparse(url).netloc.lower().encode('utf-8')
+        digest = hashlib.blake2b(host, digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.shard_count
+
+    def _to_global(self, index, local_id):
+        return None if local_id is None else local_id * self.shard_count + index
+
+    def _to_local(self, global_id):
+        index = global_id % self.shard_count
+        return self.shards[index], global_id // self.shard_count
+
+    def save_url(self, url, domain, visited=False, status=None):
+        index = self.shard_index(url)
+        return self._to_global(index, self.shards[index].save_url(url, domain, visited, status))
+
+    def get_url_id(self, url):
+        index = self.shard_index(url)
+        return self._to_global(index, self.shards[index].get_url_id(url))
+
+    def get_unvisited_urls(self):
+        return [(self._to_global(index, url_id), url)
+                for index, shard in enumerate(self.shards)
+                for url_id, url in shard.get_unvisited_urls()]
+
+    def mark_url_visited(self, url_id, status):
+        shard, local_id = self._to_local(url_id)
+        return shard.mark_url_visited(local_id, status)
+
+    def get_deferred_urls(self):
+        deferred = [(self._to_global(index, url_id), url, next_attempt_at)
+                    for index, shard in enumerate(self.shards)
+                    for url_id, url, next_attempt_at in shard.get_deferred_urls()]
+        return sorted(deferred, key=lambda row: row[2])
+
+    def get_retry_count(self, url_id):
+        shard, local_id = self._to_local(url_id)
+        return shard.get_retry_count(local_id)
+
+    def defer_url(self, url_id, status, next_attempt_at, count_retry=True):
+        shard, local_id = self._to_local(url_id)
+        return shard.defer_url(local_id, status, next_attempt_at, count_retry)
+
+    def save_content_if_changed(self, url_id, content_type, text_content):
+        shard, local_id = self._to_local(url_id)
+        content_id, changed = shard.save_content_if_changed(local_id, content_type, text_content)
+        return self._to_global(url_id % self.shard_count, content_id), changed
+
+    def save_extractions(self, extractions):
+        by_shard = {}
+        for extraction in extractions:
+            by_shard.setdefault(self.shard_index(extraction[0]), []).append(extraction)
+        return sum(self.shards[index].save_extractions(batch)
+                   for index, batch in by_shard.items())
+
+    def save_media(self, url_id, media_url, media_type, local_path, file_size):
+        shard, local_id = self._to_local(url_id)
+        return shard.save_media(local_id, media_url, media_type, local_path, file_size)
+
+    def get_media(self, url_id):
+        shard, local_id = self._to_local(url_id)
+        return shard.get_media(local_id)
+
+    def find_near_duplicate(self, url_id, fingerprint, max_distance=None):
+        # Template copies live on the same host, hence in the same shard
+        shard, local_id = self._to_local(url_id)
+        duplicate_id = shard.find_near_duplicate(local_id, fingerprint, max_distance)
+        return self._to_global(url_id % self.shard_count, duplicate_id)
+
+    def save_fingerprint(self, url_id, fingerprint, duplicate_of=None):
+        shard, local_id = self._to_local(url_id)
+        if duplicate_of is not None:
+            _, duplicate_of = self._to_local(duplicate_of)
+        return shard.save_fingerprint(local_id, fingerprint, duplicate_of)
+
+    def get_bundle_scan(self, url):
+        return self.shards[self.shard_index(url)].get_bundle_scan(url)
+
+    def save_bundle_scan(self, url, content_hash, etag, last_modified, endpoints):
+        return self.shards[self.shard_index(url)].save_bundle_scan(
+            url, content_hash, etag, last_modified, endpoints)
+
+    def open_union_view(self):
+        """
+        Open a read-only connection with every shard attached and TEMP views
+        all_urls and all_content spanning them (all_content.shard says which
+        shard's dictionaries decode text_content)
+        """
+        connection = sqlite3.connect(':memory:', uri=True)
+        url_selects, content_selects = [], []
+        for index, shard in enumerate(self.shards):
+            uri = Path(shard.db_file).resolve().as_uri() + '?mode=ro'
+            connection.execute(f'ATTACH DATABASE ? AS s{index}', (uri,))
+            url_selects.append(f'SELECT url, domain, visited FROM s{index}.urls')
+            content_selects.append(f'''
+                SELECT {index} AS shard, u.url, c.content_type, c.text_content
+                FROM s{index}.content c JOIN s{index}.urls u ON c.url_id = u.id
+            ''')
+        connection.execute(f"CREATE TEMP VIEW all_urls AS {' UNION ALL '.join(url_selects)}")
+        connection.execute(f"CREATE TEMP VIEW all_content AS {' UNION ALL '.join(content_selects)}")
+        return connection
+
+    def iter_urls(self):
+        connection = self.open_union_view()
+        try:
+            for row in connection.execute('SELECT url, domain, visited FROM all_urls'):
+                yield dict(zip(['url', 'domain', 'visited'], row))
+        finally:
+            connection.close()
+
+    def iter_content(self):
+        connection = self.open_union_view()
+        try:
+            rows = connection.execute('SELECT shard, url, content_type, text_content FROM all_content')
+            for index, url, content_type, text_content in rows:
+                yield {'url': url, 'type': content_type,
+                       'content': self.shards[index].decode_text(text_content)}
+        finally:
+            connection.close()
+
+    def get_changed_since(self, since):
+        results = []
+        for index, shard in enumerate(self.shards):
+            for row in shard.get_changed_since(since):
+                row['content_id'] = self._to_global(index, row['content_id'])
+                results.append(row)
+        return sorted(results, key=lambda row: row['first_seen'] or '')
+
+    def search(self, query, limit=20):
+        # bm25 scores are per-shard estimates, close enough to merge on
+        hits = [shard.search(query, limit) for shard in self.shards]
+        return list(heapq.merge(*hits, key=lambda hit: hit['score']))[:limit]
+
+    def rebuild_search_index(self, full=False):
+        return sum(shard.rebuild_search_index(full) for shard in self.shards)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+def create_storage(shard_count=None, data_dir=None):
+    """Return the configured storage backend: one database file or several shards"""
+    shard_count = shard_count or settings.STORAGE_SHARDS
+    if shard_count > 1:
+        logger.info(f"Using {shard_count} storage shards")
+        return ShardedDatabaseManager(shard_count, data_dir)
+    if data_dir:
+        return DatabaseManager(os.path.join(data_dir, 'scraper.db'))
+    return DatabaseManager()
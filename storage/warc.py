@@ -0,0 +1,277 @@
+import base64
+import gzip
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from ..config import settings
+from ..utilities.logger import setup_logger
+from .schema import create_warc_index
+
+logger = setup_logger(__name__)
+
+# requests hands us decoded bodies, so framing headers no longer describe them
+DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+HTTP_VERSIONS = {10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2'}
+INDEX_BATCH_SIZE = 100
+INDEX_RETRY_SECONDS = 5  # Wait after a failed index write (e.g. database locked) before the next try
+_STOP = object()
+
+def warc_date(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def payload_digest(body):
+    return 'sha1:' + base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+
+def build_record(record_type, headers, block, target_uri=None, timestamp=None):
+    """Serialize one WARC/1.1 record"""
+    lines = [
+        'WARC/1.1',
+        f'WARC-Type: {record_type}',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f'WARC-Date: {warc_date(timestamp)}',
+    ]
+    if target_uri:
+        lines.append(f'WARC-Target-URI: {target_uri}')
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    lines.append(f'Content-Length: {len(block)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+
+class WARCWriter:
+    def __init__(self, directory=None, index_db=None, prefix='scrape', max_size=None):
+        """
+        Archive raw HTTP responses into rotating gzip-compressed WARC files
+
+        archive_response only copies the response onto a queue; a background
+        thread serializes, compresses and writes the records and adds them to
+        the warc_records offset index in index_db. Every record is its own gzip
+        member, so a single record can be read back by seeking to its offset.
+
+        Args:
+            directory: Where WARC files go (default: settings.WARC_STORAGE)
+            index_db: SQLite file holding the warc_records table
+            prefix: File name prefix for the WARC files
+            max_size: Start a new file once the current one passes this many bytes
+        """
+        self.directory = directory or settings.WARC_STORAGE
+        self.index_db = index_db or os.path.join(self.directory, 'warc_index.db')
+        self.prefix = prefix
+        self.max_size = max_size or settings.WARC_MAX_SIZE
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+
+        self.queue = queue.Queue(maxsize=settings.WARC_QUEUE_SIZE)
+        self.serial = 0
+        self.file = None
+        self.file_name = None
+        self.records_written = 0
+        self.records_dropped = 0
+        # Cleared when the writer thread exits; nothing is queued for it after that
+        self.alive = True
+        self.thread = threading.Thread(target=self._run, name='warc-writer', daemon=True)
+        self.thread.start()
+
+    def archive_response(self, response):
+        """Queue a fetched response for archiving; called on the request hot path"""
+        # Streamed downloads (media) haven't been read and are stored as files anyway
+        if not getattr(response, '_content_consumed', True):
+            return
+        raw = getattr(response, 'raw', None)
+        raw_headers = getattr(raw, 'headers', None) or response.headers
+        queued = self._put((
+            response.url,
+            response.status_code,
+            response.reason or '',
+            getattr(raw, 'version', 11),
+            list(raw_headers.items()),
+            response.content,
+            datetime.now(timezone.utc).timestamp()
+        ))
+        if not queued:
+            self.records_dropped += 1
+            if self.records_dropped == 1:
+                logger.error("WARC writer has stopped; responses are no longer archived")
+
+    def _put(self, item):
+        """Queue an item for the writer thread, waiting for room only while it is running"""
+        while self.alive:
+            try:
+                self.queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _open_next_file(self):
+        if self.file:
+            self.file.close()
+        self.serial += 1
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self.file_name = f'{self.prefix}-{stamp}-{self.serial:05d}.warc.gz'
+        self.file = open(os.path.join(self.directory, self.file_name), 'ab')
+        info = (f'software: ethical_scraper\r\nformat: WARC File Format 1.1\r\n'
+                f'robots: {"obey" if settings.RESPECT_ROBOTS_TXT else "ignore"}\r\n').encode('utf-8')
+        self._write(build_record('warcinfo', [('Content-Type', 'application/warc-fields'),
+                                              ('WARC-Filename', self.file_name)],
+                                 info, timestamp=datetime.now(timezone.utc).timestamp()))
+        logger.info(f"Writing WARC records to {self.file_name}")
+
+    def _write(self, record):
+        """Append one record as its own gzip member; return (offset, length)"""
+        offset = self.file.tell()
+        data = gzip.compress(record, compresslevel=settings.WARC_COMPRESSION_LEVEL)
+        self.file.write(data)
+        return offset, len(data)
+
+    def _serialize(self, url, status, reason, version, headers, body, timestamp):
+        status_line = f'{HTTP_VERSIONS.get(version, "HTTP/1.1")} {status} {reason}'
+        header_lines = [f'{name}: {value}' for name, value in headers
+                        if name.lower() not in DROPPED_HEADERS]
+        header_lines.append(f'Content-Length: {len(body)}')
+        http_block = ('\r\n'.join([status_line] + header_lines) + '\r\n\r\n').encode('latin-1', 'replace') + body
+        digest = payload_digest(body)
+        record = build_record('response', [
+            ('Content-Type', 'application/http;msgtype=response'),
+            ('WARC-Payload-Digest', digest),
+        ], http_block, target_uri=url, timestamp=timestamp)
+        mime = next((value.split(';')[0].strip() for name, value in headers
+                     if name.lower() == 'content-type'), None)
+        return record, digest, mime
+
+    def _run(self):
+        connection = None
+        try:
+            connection = sqlite3.connect(self.index_db, timeout=settings.DB_BUSY_TIMEOUT)
+            create_warc_index(connection.cursor())
+            connection.commit()
+            self._write_queued(connection)
+        except Exception as e:
+            logger.error(f"WARC writer stopped: {str(e)}")
+        finally:
+            self.alive = False
+            if self.file:
+                self.file.close()
+            if connection is not None:
+                connection.close()
+
+    def _write_queued(self, connection):
+        """Write queued responses until _STOP, indexing them in batches"""
+        pending = []
+        retry_at = 0.0
+        while True:
+            try:
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not _STOP:
+                try:
+                    if self.file is None or self.file.tell() >= self.max_size:
+                        self._open_next_file()
+                    url, status, _, _, _, _, timestamp = item
+                    record, digest, mime = self._serialize(*item)
+                    offset, length = self._write(record)
+                    pending.append((url, warc_date(timestamp), status, mime, digest,
+                                    self.file_name, offset, length))
+                    self.records_written += 1
+                except Exception as e:
+                    logger.error(f"Failed to archive {item[0]}: {str(e)}")
+            # Flush the index in batches, or as soon as the queue goes idle
+            flush = pending and (len(pending) >= INDEX_BATCH_SIZE or item is None or item is _STOP)
+            if flush and (item is _STOP or time.monotonic() >= retry_at):
+                if self._flush_index(connection, pending):
+                    pending = []
+                else:
+                    retry_at = time.monotonic() + INDEX_RETRY_SECONDS
+            if item is _STOP:
+                if pending:
+                    logger.error(f"{len(pending)} WARC records were written but not indexed")
+                break
+
+    def _flush_index(self, connection, pending):
+        """Add written records to the offset index; False (records kept) if that failed"""
+        try:
+            self.file.flush()
+            connection.executemany('''
+                INSERT INTO warc_records
+                    (url, timestamp, status, mime, digest, warc_file, offset, length)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', pending)
+            connection.commit()
+            return True
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Failed to index {len(pending)} WARC records: {str(e)}")
+            try:
+                connection.rollback()
+            except sqlite3.Error:
+                pass
+            return False
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        self._put(_STOP)
+        self.thread.join()
+        logger.info(f"Archived {self.records_written} responses to WARC")
+        if self.records_dropped:
+            logger.error(f"Dropped {self.records_dropped} responses after the WARC writer stopped")
+
+def parse_http_response(block):
+    """Split an archived HTTP response block into (status, headers, body)"""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ', 2)
+    status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return status, headers, body
+
+def read_record(path, offset, length, file=None):
+    """
+    Read the response record stored at offset in a WARC file
+
+    Args:
+        path: WARC file to read (ignored when an open file is passed)
+        offset, length: Position of the record's gzip member, from warc_records
+        file: Already open file object, to avoid reopening per record
+
+    Returns:
+        Dict with url, status, headers and body
+    """
+    if file is None:
+        with open(path, 'rb') as handle:
+            return read_record(path, offset, length, handle)
+    file.seek(offset)
+    record = gzip.decompress(file.read(length))
+    warc_head, _, block = record.partition(b'\r\n\r\n')
+    warc_headers = {}
+    for line in warc_head.decode('utf-8').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        warc_headers[name.strip().lower()] = value.strip()
+    block = block[:int(warc_headers.get('content-length', len(block)))]
+    status, headers, body = parse_http_response(block)
+    return {
+        'url': warc_headers.get('warc-target-uri'),
+        'status': status,
+        'headers': headers,
+        'body': body
+    }
+
+def iter_latest_records(index_db, mime='text/html'):
+    """Yield (url, warc_file, offset, length) of each URL's newest successful capture"""
+    connection = sqlite3.connect(index_db, timeout=settings.DB_BUSY_TIMEOUT)
+    try:
+        create_warc_index(connection.cursor())
+        rows = connection.execute('''
+            SELECT url, warc_file, offset, length FROM warc_records
+            WHERE id IN (SELECT MAX(id) FROM warc_records
+                         WHERE status = 200 AND mime = ? GROUP BY url)
+            ORDER BY warc_file, offset
+        ''', (mime,))
+        yield from rows
+    finally:
+        connection.close()
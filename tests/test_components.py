@@ -0,0 +1,560 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from importlib import import_module
+from unittest import mock
+from pathlib import Path
+
+# storage modules use package-relative imports, so import them through the package
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+
+def package_module(name):
+    """Import a module that uses package-relative imports"""
+    return import_module(f'{PACKAGE_DIR.name}.{name}')
+
+compression = package_module('storage.compression')
+schema = package_module('storage.schema')
+
+def site_pages(count):
+    """Pages of one site: shared navigation and footer around a unique article"""
+    header = '\n'.join(f'Navigation link {i} to a section of the example site' for i in range(40))
+    footer = '\n'.join(f'Footer line {i}: copyright, privacy and contact details' for i in range(20))
+    return [f'{header}\nArticle {n}: {" ".join(f"unique{n}x{w}" for w in range(30))}\n{footer}'
+            for n in range(count)]
+
+def query_plan(connection, sql):
+    """Return the detail lines of EXPLAIN QUERY PLAN for a query"""
+    placeholders = sql.count('?')
+    rows = connection.execute(f'EXPLAIN QUERY PLAN {sql}', (1,) * placeholders).fetchall()
+    return [row[-1] for row in rows]
+
+class SchemaMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_fresh_database_reaches_latest_version(self):
+        self.assertEqual(schema.apply_migrations(self.connection), schema.SCHEMA_VERSION)
+        self.assertEqual(schema.get_schema_version(self.connection), schema.SCHEMA_VERSION)
+
+    def test_migrations_are_idempotent(self):
+        schema.apply_migrations(self.connection)
+        self.assertEqual(schema.apply_migrations(self.connection), schema.SCHEMA_VERSION)
+
+    def test_upgrades_unversioned_database(self):
+        # Layout written before schema versioning existed
+        self.connection.executescript('''
+            CREATE TABLE urls (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE,
+                               domain TEXT, visited BOOLEAN DEFAULT 0,
+                               visit_timestamp DATETIME, http_status INTEGER);
+            CREATE TABLE content (id INTEGER PRIMARY KEY AUTOINCREMENT, url_id INTEGER,
+                                  content_type TEXT, text_content TEXT);
+            INSERT INTO urls (url, domain) VALUES ('https://example.com/', 'https://example.com');
+        ''')
+        schema.apply_migrations(self.connection)
+
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(content)')}
+        self.assertTrue({'content_hash', 'first_seen', 'last_seen'} <= columns)
+        self.assertEqual(self.connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0], 1)
+
+    def test_hot_queries_use_indexes(self):
+        schema.apply_migrations(self.connection)
+        for name, sql in schema.HOT_QUERIES.items():
+            with self.subTest(query=name):
+                plan = query_plan(self.connection, sql)
+                full_scans = [line for line in plan
+                              if line.startswith('SCAN') and 'INDEX' not in line]
+                if name == 'content_export':
+                    # Exporting reads every row once; the joined side must be a lookup
+                    self.assertLessEqual(len(full_scans), 1, plan)
+                    self.assertTrue(any(line.startswith('SEARCH') for line in plan), plan)
+                else:
+                    self.assertEqual(full_scans, [], plan)
+
+class CompressionTest(unittest.TestCase):
+    def test_round_trip_without_dictionary(self):
+        text = 'caf\u00e9 ' * 200
+        blob = compression.compress_text(text, 'zlib')
+        self.assertEqual(compression.HEADER.unpack(blob[:compression.HEADER.size]), (b'z', 0))
+        self.assertEqual(compression.blob_dictionary_id(blob), 0)
+        self.assertEqual(compression.decompress_text(blob), text)
+
+    def test_round_trip_with_trained_dictionary(self):
+        pages = site_pages(21)
+        dictionary = compression.build_dictionary(pages[:20], 'zlib')
+        self.assertIsNotNone(dictionary)
+        self.assertLessEqual(len(dictionary), compression.ZLIB_MAX_DICTIONARY)
+
+        blob = compression.compress_text(pages[20], 'zlib', dictionary=dictionary, dictionary_id=7)
+        self.assertEqual(compression.HEADER.unpack(blob[:compression.HEADER.size]), (b'z', 7))
+        self.assertEqual(compression.blob_dictionary_id(memoryview(blob)), 7)
+        self.assertEqual(compression.decompress_text(blob, dictionary), pages[20])
+        self.assertLess(len(blob), len(compression.compress_text(pages[20], 'zlib')))
+        with self.assertRaises(Exception):
+            compression.decompress_text(blob)
+
+    def test_dictionary_id_only_recorded_with_a_dictionary(self):
+        blob = compression.compress_text('text', 'zlib', dictionary=None, dictionary_id=7)
+        self.assertEqual(compression.blob_dictionary_id(blob), 0)
+
+    def test_no_shared_lines_means_no_dictionary(self):
+        self.assertIsNone(compression.build_dictionary(['one page', 'another page'], 'zlib'))
+
+    def test_plain_values_pass_through(self):
+        self.assertEqual(compression.decompress_text('stored before compression'), 'stored before compression')
+        self.assertIsNone(compression.decompress_text(None))
+        self.assertIsNone(compression.blob_dictionary_id('text'))
+
+    @unittest.skipUnless(compression.zstandard, 'zstandard not installed')
+    def test_zstd_round_trip_with_trained_dictionary(self):
+        pages = site_pages(200)
+        dictionary = compression.build_dictionary(pages[:199], 'zstd', 4096)
+        blob = compression.compress_text(pages[199], 'zstd', dictionary=dictionary, dictionary_id=3)
+        self.assertEqual(compression.HEADER.unpack(blob[:compression.HEADER.size]), (b's', 3))
+        self.assertEqual(compression.decompress_text(blob, dictionary), pages[199])
+
+    def test_zstd_falls_back_to_zlib(self):
+        self.assertEqual(compression.available_codec('zlib'), 'zlib')
+        expected = 'zstd' if compression.zstandard else 'zlib'
+        self.assertEqual(compression.available_codec('zstd'), expected)
+
+class CompressedStorageTest(unittest.TestCase):
+    def test_pages_round_trip_through_a_domain_dictionary(self):
+        database = package_module('storage.database')
+        settings = package_module('config.settings')
+        pages = site_pages(settings.COMPRESSION_DICT_SAMPLES + 5)
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, 'scraper.db')
+            db = database.DatabaseManager(db_file)
+            for n, page in enumerate(pages):
+                url_id = db.save_url(f'https://example.com/{n}', 'https://example.com')
+                db.save_content(url_id, 'text', page)
+            blobs = [row[0] for row in db.connection.execute('SELECT text_content FROM content ORDER BY id')]
+            db.close()
+
+            # Pages after the training sample are compressed with the dictionary
+            dictionary_ids = [compression.blob_dictionary_id(blob) for blob in blobs]
+            self.assertEqual(dictionary_ids[:settings.COMPRESSION_DICT_SAMPLES - 1],
+                             [0] * (settings.COMPRESSION_DICT_SAMPLES - 1))
+            self.assertTrue(all(dictionary_ids[settings.COMPRESSION_DICT_SAMPLES:]))
+
+            # A fresh connection loads the dictionary from the database
+            db = database.DatabaseManager(db_file)
+            try:
+                self.assertEqual([row['content'] for row in db.iter_content()], pages)
+            finally:
+                db.close()
+
+    def test_a_dictionary_trained_elsewhere_wins_the_race(self):
+        database = package_module('storage.database')
+        settings = package_module('config.settings')
+        pages = site_pages(settings.COMPRESSION_DICT_SAMPLES + 5)
+        build_dictionary = database.build_dictionary
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, 'scraper.db')
+            db = database.DatabaseManager(db_file)
+            other = database.DatabaseManager(db_file)
+            winners = []
+
+            def train_while_another_shard_does(samples, codec, size):
+                # Another shard stores its dictionary for the domain first
+                data = build_dictionary(samples, codec, size)
+                cursor = other.connection.execute(
+                    'INSERT INTO compression_dicts (domain, codec, data) VALUES (?, ?, ?)',
+                    ('https://example.com', codec, data))
+                other.connection.commit()
+                winners.append(cursor.lastrowid)
+                return data
+
+            try:
+                with mock.patch.object(database, 'build_dictionary', train_while_another_shard_does):
+                    for n, page in enumerate(pages):
+                        url_id = db.save_url(f'https://example.com/{n}', 'https://example.com')
+                        self.assertTrue(db.save_content(url_id, 'text', page))
+                blobs = [row[0] for row in db.connection.execute('SELECT text_content FROM content ORDER BY id')]
+                self.assertEqual(len(winners), 1)
+                self.assertEqual({compression.blob_dictionary_id(blob) for blob in blobs[settings.COMPRESSION_DICT_SAMPLES:]},
+                                 {winners[0]})
+                self.assertEqual([row['content'] for row in db.iter_content()], pages)
+            finally:
+                other.close()
+                db.close()
+
+    def test_a_failed_training_is_not_retried(self):
+        database = package_module('storage.database')
+        settings = package_module('config.settings')
+        saved = settings.COMPRESSION_DICT_SAMPLES
+        settings.COMPRESSION_DICT_SAMPLES = 3
+        self.addCleanup(setattr, settings, 'COMPRESSION_DICT_SAMPLES', saved)
+        pages = site_pages(settings.COMPRESSION_DICT_SAMPLES * 4)
+        with tempfile.TemporaryDirectory() as directory:
+            db = database.DatabaseManager(os.path.join(directory, 'scraper.db'))
+            try:
+                with mock.patch.object(database, 'build_dictionary', return_value=None) as build_dictionary:
+                    for n, page in enumerate(pages):
+                        url_id = db.save_url(f'https://example.com/{n}', 'https://example.com')
+                        self.assertTrue(db.save_content(url_id, 'text', page))
+                self.assertEqual(build_dictionary.call_count, 1)
+                self.assertEqual([row['content'] for row in db.iter_content()], pages)
+            finally:
+                db.close()
+
+def archived_response(url, body, status=200, headers=None):
+    """A fully read requests.Response, as the request manager hands to the archiver"""
+    requests = import_module('requests')
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.reason = 'OK' if status == 200 else 'Not Found'
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {'Content-Type': 'text/html; charset=utf-8'})
+    response._content = body
+    response._content_consumed = True
+    return response
+
+def index_rows(writer):
+    with sqlite3.connect(writer.index_db) as connection:
+        return connection.execute(
+            'SELECT url, status, mime, digest, warc_file, offset, length FROM warc_records ORDER BY id').fetchall()
+
+class WARCRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.warc = package_module('storage.warc')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_read_back_from_their_offsets(self):
+        responses = [
+            archived_response('https://example.com/', '<p>caf\u00e9</p>'.encode('utf-8'),
+                              headers={'Content-Type': 'text/html; charset=utf-8',
+                                       'Content-Encoding': 'gzip', 'ETag': '"abc"'}),
+            archived_response('https://example.com/logo.png', b'\x89PNG\r\n\r\n\x00binary',
+                              headers={'Content-Type': 'image/png'}),
+            archived_response('https://example.com/missing', b'gone', status=404),
+        ]
+        writer = self.warc.WARCWriter(self.directory.name, prefix='test')
+        for response in responses:
+            writer.archive_response(response)
+        writer.close()
+
+        rows = index_rows(writer)
+        self.assertEqual([(row[0], row[1], row[2]) for row in rows], [
+            ('https://example.com/', 200, 'text/html'),
+            ('https://example.com/logo.png', 200, 'image/png'),
+            ('https://example.com/missing', 404, 'text/html'),
+        ])
+        with open(os.path.join(self.directory.name, rows[0][4]), 'rb') as file:
+            # Read out of order to check every record stands on its own
+            for row, response in reversed(list(zip(rows, responses))):
+                with self.subTest(url=row[0]):
+                    record = self.warc.read_record(None, row[5], row[6], file)
+                    self.assertEqual(record['url'], response.url)
+                    self.assertEqual(record['status'], response.status_code)
+                    self.assertEqual(record['body'], response.content)
+                    self.assertEqual(record['headers']['content-length'], str(len(response.content)))
+                    self.assertNotIn('content-encoding', record['headers'])
+                    self.assertEqual(row[3], self.warc.payload_digest(response.content))
+        self.assertEqual(self.warc.read_record(os.path.join(self.directory.name, rows[0][4]),
+                                               rows[0][5], rows[0][6])['headers']['etag'], '"abc"')
+
+    def test_rotation_and_latest_captures(self):
+        writer = self.warc.WARCWriter(self.directory.name, prefix='test', max_size=1)
+        writer.archive_response(archived_response('https://example.com/a', b'<p>first</p>'))
+        writer.archive_response(archived_response('https://example.com/a', b'<p>second</p>'))
+        writer.archive_response(archived_response('https://example.com/b', b'missing', status=404))
+        writer.close()
+
+        rows = index_rows(writer)
+        self.assertEqual(len({row[4] for row in rows}), 3)
+        latest = list(self.warc.iter_latest_records(writer.index_db))
+        self.assertEqual(len(latest), 1)
+        url, warc_file, offset, length = latest[0]
+        record = self.warc.read_record(os.path.join(self.directory.name, warc_file), offset, length)
+        self.assertEqual((url, record['body']), ('https://example.com/a', b'<p>second</p>'))
+
+    def test_unread_streams_are_not_archived(self):
+        writer = self.warc.WARCWriter(self.directory.name, prefix='test')
+        response = archived_response('https://example.com/video.mp4', b'')
+        response._content_consumed = False
+        writer.archive_response(response)
+        writer.close()
+        self.assertEqual(index_rows(writer), [])
+
+class WARCWriterFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.warc = package_module('storage.warc')
+        self.settings = package_module('config.settings')
+        self.directory = tempfile.TemporaryDirectory()
+        saved = (self.settings.DB_BUSY_TIMEOUT, self.settings.WARC_QUEUE_SIZE, self.warc.INDEX_RETRY_SECONDS)
+        self.addCleanup(self.restore, saved)
+        self.settings.DB_BUSY_TIMEOUT = 0.1
+        self.warc.INDEX_RETRY_SECONDS = 0
+
+    def restore(self, saved):
+        self.settings.DB_BUSY_TIMEOUT, self.settings.WARC_QUEUE_SIZE, self.warc.INDEX_RETRY_SECONDS = saved
+        self.directory.cleanup()
+
+    def test_locked_index_is_retried(self):
+        writer = self.warc.WARCWriter(self.directory.name, prefix='test')
+        locker = sqlite3.connect(writer.index_db, isolation_level=None)
+        try:
+            for _ in range(50):
+                if locker.execute("SELECT 1 FROM sqlite_master WHERE name = 'warc_records'").fetchone():
+                    break
+                time.sleep(0.05)
+            locker.execute('BEGIN EXCLUSIVE')
+            writer.archive_response(archived_response('https://example.com/a', b'<p>a</p>'))
+            # The writer goes idle, tries to index and finds the database locked
+            time.sleep(1.5)
+            self.assertTrue(writer.alive)
+            self.assertEqual(locker.execute('SELECT COUNT(*) FROM warc_records').fetchone()[0], 0)
+            locker.execute('ROLLBACK')
+        finally:
+            locker.close()
+        writer.close()
+        self.assertEqual([row[0] for row in index_rows(writer)], ['https://example.com/a'])
+
+    def test_dead_writer_drops_records_instead_of_blocking(self):
+        self.settings.WARC_QUEUE_SIZE = 1
+        # A directory can't be opened as the index database: the writer thread dies
+        writer = self.warc.WARCWriter(self.directory.name, index_db=self.directory.name, prefix='test')
+        writer.thread.join(5)
+        self.assertFalse(writer.alive)
+        started = time.monotonic()
+        for n in range(3):
+            writer.archive_response(archived_response(f'https://example.com/{n}', b'<p>lost</p>'))
+        writer.close()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(writer.records_dropped, 3)
+
+class ContentChangeTest(unittest.TestCase):
+    def setUp(self):
+        database = package_module('storage.database')
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = database.DatabaseManager(os.path.join(self.directory.name, 'scraper.db'))
+        self.url_id = self.db.save_url('https://example.com/a', 'https://example.com')
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def content_rows(self):
+        return self.db.connection.execute('SELECT COUNT(*) FROM content').fetchone()[0]
+
+    def test_whitespace_changes_are_not_stored(self):
+        first = self.db.save_content(self.url_id, 'text', 'Hello   world\n')
+        self.assertIsNotNone(first)
+        self.assertEqual(self.db.save_content(self.url_id, 'text', '  Hello world'), first)
+        self.assertEqual(self.db.save_content_if_changed(self.url_id, 'text', 'Hello\tworld'), (first, False))
+        self.assertEqual(self.content_rows(), 1)
+
+        second, changed = self.db.save_content_if_changed(self.url_id, 'text', 'Hello there')
+        self.assertTrue(changed)
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.content_rows(), 2)
+
+    def test_changed_since(self):
+        first = self.db.save_content(self.url_id, 'text', 'Old text')
+        self.db.connection.execute("UPDATE content SET first_seen = '2020-01-01 00:00:00'")
+        self.db.connection.commit()
+        self.assertEqual([row['content_id'] for row in self.db.get_changed_since('2019-12-31 00:00:00')], [first])
+        self.assertEqual(self.db.get_changed_since('2021-01-01 00:00:00'), [])
+
+        # Seeing the same text again doesn't make it new
+        self.db.save_content(self.url_id, 'text', 'Old  text')
+        self.assertEqual(self.db.get_changed_since('2021-01-01 00:00:00'), [])
+
+        second = self.db.save_content(self.url_id, 'text', 'New text')
+        changed = self.db.get_changed_since('2021-01-01 00:00:00')
+        self.assertEqual([(row['url'], row['content_id']) for row in changed],
+                         [('https://example.com/a', second)])
+
+class FullTextSearchTest(unittest.TestCase):
+    def setUp(self):
+        database = package_module('storage.database')
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = database.DatabaseManager(os.path.join(self.directory.name, 'scraper.db'))
+        if not self.db.fts_enabled:
+            self.db.close()
+            self.directory.cleanup()
+            self.skipTest('SQLite built without FTS5')
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def save_page(self, path, text):
+        url_id = self.db.get_url_id(f'https://example.com/{path}') or \
+            self.db.save_url(f'https://example.com/{path}', 'https://example.com')
+        return self.db.save_content(url_id, 'text', text)
+
+    def urls(self, hits):
+        return [hit['url'] for hit in hits]
+
+    def test_bm25_ranks_denser_matches_first(self):
+        self.save_page('about', 'About us. We care about privacy.')
+        self.save_page('privacy', 'Privacy policy: privacy matters, read our privacy terms.')
+        self.save_page('shop', 'Buy shoes and hats.')
+        hits = self.db.search('privacy')
+        self.assertEqual(self.urls(hits), ['https://example.com/privacy', 'https://example.com/about'])
+        self.assertLessEqual(hits[0]['score'], hits[1]['score'])
+        self.assertIn('[Privacy]', hits[0]['snippet'])
+
+    def test_operators_and_diacritics(self):
+        self.save_page('menu', 'Caf\u00e9 menu with cr\u00e8me br\u00fbl\u00e9e')
+        self.save_page('hours', 'Opening hours of the cafe')
+        self.assertEqual(self.urls(self.db.search('cafe NOT hours')), ['https://example.com/menu'])
+        self.assertEqual(sorted(self.urls(self.db.search('cafe'))),
+                         ['https://example.com/hours', 'https://example.com/menu'])
+
+    def test_only_latest_version_is_indexed(self):
+        self.save_page('news', 'Old headline about elections')
+        self.save_page('news', 'New headline about weather')
+        self.assertEqual(self.db.search('elections'), [])
+        self.assertEqual(self.urls(self.db.search('weather')), ['https://example.com/news'])
+
+    def test_invalid_syntax_falls_back_to_quoted_terms(self):
+        self.save_page('cookies', 'Our cookie policy explains tracking cookies.')
+        # Unbalanced quote and a bare operator are not valid FTS5
+        self.assertEqual(self.urls(self.db.search('"cookies policy')), ['https://example.com/cookies'])
+        self.assertEqual(self.urls(self.db.search('tracking AND')), ['https://example.com/cookies'])
+        self.assertEqual(self.db.search('"unrelated'), [])
+
+    def test_rebuild_reindexes_latest_content(self):
+        self.save_page('a', 'first page about gardens')
+        self.save_page('b', 'second page about gardens')
+        self.save_page('b', 'second page about kitchens')
+        self.assertEqual(self.db.rebuild_search_index(full=True), 2)
+        self.assertEqual(self.urls(self.db.search('gardens')), ['https://example.com/a'])
+        self.assertEqual(self.db.rebuild_search_index(), 0)
+
+class ShardedStorageTest(unittest.TestCase):
+    SHARDS = 3
+
+    def setUp(self):
+        sharded = package_module('storage.sharded')
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = sharded.ShardedDatabaseManager(self.SHARDS, self.directory.name)
+        # One site per shard, plus a second page on each
+        sites = {}
+        for n in range(100):
+            url = f'https://site{n}.example'
+            sites.setdefault(self.db.shard_index(url), url)
+        self.assertEqual(len(sites), self.SHARDS)
+        self.pages = [f'{site}{path}' for site in sites.values() for path in ('/', '/about')]
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def save_pages(self):
+        return {url: self.db.save_url(url, url.split('/')[2]) for url in self.pages}
+
+    def test_global_ids_map_to_their_shard(self):
+        ids = self.save_pages()
+        self.assertEqual(len(set(ids.values())), len(self.pages))
+        for url, url_id in ids.items():
+            with self.subTest(url=url):
+                index = self.db.shard_index(url)
+                shard, local_id = self.db._to_local(url_id)
+                self.assertIs(shard, self.db.shards[index])
+                self.assertEqual(url_id, local_id * self.SHARDS + index)
+                self.assertEqual(shard.get_url_id(url), local_id)
+                self.assertEqual(self.db.get_url_id(url), url_id)
+
+                content_id, changed = self.db.save_content_if_changed(url_id, 'html', f'Text of {url}')
+                self.assertTrue(changed)
+                self.assertEqual(content_id % self.SHARDS, index)
+                self.db.save_media(url_id, f'{url}logo.png', 'image', '/media/logo.png', 10)
+                self.assertEqual([media['media_url'] for media in self.db.get_media(url_id)],
+                                 [f'{url}logo.png'])
+        self.assertEqual(sorted(self.db.get_unvisited_urls()), sorted((i, u) for u, i in ids.items()))
+        changed = self.db.get_changed_since('2000-01-01 00:00:00')
+        self.assertEqual({row['url']: row['content_id'] % self.SHARDS for row in changed},
+                         {url: self.db.shard_index(url) for url in self.pages})
+
+    def test_near_duplicates_resolve_to_global_ids(self):
+        ids = self.save_pages()
+        first, second = ids[self.pages[-2]], ids[self.pages[-1]]
+        self.db.save_fingerprint(first, 0x0123456789ABCDEF)
+        self.assertEqual(self.db.find_near_duplicate(second, 0x0123456789ABCDEF ^ 1), first)
+        self.db.save_fingerprint(second, 0x0123456789ABCDEF ^ 1, first)
+        shard, _ = self.db._to_local(second)
+        self.assertEqual(shard.get_near_duplicates(),
+                         [{'url': self.pages[-1], 'duplicate_of': self.pages[-2]}])
+
+    def test_union_view_spans_every_shard(self):
+        ids = self.save_pages()
+        for url, url_id in ids.items():
+            self.db.save_content(url_id, 'html', f'Text of {url}')
+        self.assertEqual(sorted(row['url'] for row in self.db.iter_urls()), sorted(self.pages))
+        self.assertEqual({row['url']: row['content'] for row in self.db.iter_content()},
+                         {url: f'Text of {url}' for url in self.pages})
+        connection = self.db.open_union_view()
+        try:
+            shards = connection.execute('SELECT DISTINCT shard FROM all_content').fetchall()
+        finally:
+            connection.close()
+        self.assertEqual(sorted(shard for shard, in shards), list(range(self.SHARDS)))
+
+class FingerprintLookupTest(unittest.TestCase):
+    def setUp(self):
+        database = package_module('storage.database')
+        self.simhash = package_module('utilities.simhash')
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = database.DatabaseManager(os.path.join(self.directory.name, 'scraper.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_banded_lookup_within_three_bits(self):
+        band = self.simhash.BAND_BITS
+        # High bit set, so the stored value is negative in SQLite
+        fingerprint = 0x8F0E1D2C3B4A5968
+        self.db.save_fingerprint(1, fingerprint)
+        near = fingerprint ^ (1 << 2) ^ (1 << (band + 3)) ^ (1 << (3 * band + 4))
+        self.assertEqual(self.db.find_near_duplicate(2, near, max_distance=3), 1)
+        far = near ^ (1 << (2 * band + 1))
+        self.assertIsNone(self.db.find_near_duplicate(2, far, max_distance=3))
+        # A page is never its own duplicate
+        self.assertIsNone(self.db.find_near_duplicate(1, fingerprint, max_distance=3))
+
+    def crawl(self, url_id, fingerprint):
+        duplicate_of = self.db.find_near_duplicate(url_id, fingerprint)
+        self.db.save_fingerprint(url_id, fingerprint, duplicate_of)
+        return duplicate_of
+
+    def fingerprint_rows(self):
+        return self.db.connection.execute(
+            'SELECT url_id, duplicate_of FROM fingerprints ORDER BY url_id').fetchall()
+
+    def test_recrawled_original_stays_the_original(self):
+        fingerprint = 0x0123456789ABCDEF
+        self.assertIsNone(self.crawl(1, fingerprint))
+        self.assertEqual(self.crawl(2, fingerprint ^ 1), 1)
+        # Recrawling the original must not make it a duplicate of its own duplicate
+        self.assertIsNone(self.crawl(1, fingerprint))
+        self.assertEqual(self.fingerprint_rows(), [(1, None), (2, 1)])
+
+        # Nor of another original it has come to resemble
+        self.assertIsNone(self.crawl(3, 0xFEDCBA9876543210))
+        self.assertIsNone(self.crawl(1, 0xFEDCBA9876543210 ^ 2))
+        self.assertEqual(self.fingerprint_rows(), [(1, None), (2, 1), (3, None)])
+
+    def test_duplicates_are_not_candidates(self):
+        fingerprint = 0x0123456789ABCDEF
+        self.crawl(1, fingerprint)
+        self.crawl(2, fingerprint ^ 1)
+        # Close to the duplicate but too far from the original: no match
+        self.assertIsNone(self.db.find_near_duplicate(3, fingerprint ^ 0b1111, max_distance=3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,718 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from pathlib import Path
+from types import SimpleNamespace
+
+# core modules use package-relative imports, so import them through the package
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+
+def core_module(name):
+    return import_module(f'{PACKAGE_DIR.name}.core.{name}')
+
+def package_module(name):
+    return import_module(f'{PACKAGE_DIR.name}.{name}')
+
+api_discovery = core_module('api_discovery')
+circuit_breaker = core_module('circuit_breaker')
+concurrency = core_module('concurrency')
+
+class EndpointScanTest(unittest.TestCase):
+    def test_overlapping_calls_are_all_found(self):
+        # The ajax() span runs past the .get() call inside it
+        script = '''
+            $.ajax({success: function() { $.get("/api/inner"); }, url: "/api/outer"});
+            fetch("/api/items");
+            axios.get("/api/users");
+        '''
+        self.assertEqual(api_discovery.scan_endpoints(api_discovery.SCRIPT_ENDPOINT_SCANNER, script),
+                         {'/api/inner', '/api/outer', '/api/items', '/api/users'})
+
+    def test_bundle_patterns(self):
+        bundle = 'const c = {baseURL: "https://api.example.com", apiEndpoint: "/graphql"};' \
+                 'load("https://example.com/api/v2/items");'
+        self.assertEqual(api_discovery.scan_endpoints(api_discovery.BUNDLE_ENDPOINT_SCANNER, bundle),
+                         {'https://api.example.com', '/graphql', 'https://example.com/api/v2/items'})
+
+class RenderDeciderTest(unittest.TestCase):
+    SETTINGS = {'JS_MIN_TEXT_LENGTH': 200, 'JS_MIN_TEXT_RATIO': 0.1, 'JS_DECISION_SAMPLES': 3}
+    ARTICLE = '<p>' + 'Plain server-rendered article text. ' * 20 + '</p>'
+
+    def setUp(self):
+        settings = package_module('config.settings')
+        saved = {name: getattr(settings, name) for name in self.SETTINGS}
+        self.addCleanup(lambda: [setattr(settings, name, value) for name, value in saved.items()])
+        for name, value in self.SETTINGS.items():
+            setattr(settings, name, value)
+        self.decider = core_module('render_policy').RenderDecider()
+
+    def test_needs_js_heuristics(self):
+        cases = [
+            (f'<html><body>{self.ARTICLE}</body></html>', False, 'static HTML has content'),
+            (f'<html><body>{self.ARTICLE}<script src="/analytics.js"></script></body></html>', False,
+             'static HTML has content'),
+            ('<html><body><p>Short page</p></body></html>', False, 'page is small but has no scripts'),
+            ('<html><body><p>Loading</p><script src="/app.js"></script></body></html>', True,
+             'only 7 characters of text'),
+            (f'<html><body><noscript>Please enable JavaScript</noscript>{self.ARTICLE}</body></html>', True,
+             'noscript asks for JavaScript'),
+            (f'<html><body><nav>{self.ARTICLE}</nav><div id="root"></div></body></html>', True,
+             'empty SPA root #root'),
+            (f'<html><body>{self.ARTICLE}<div ng-app="shop"></div></body></html>', True,
+             'empty SPA root [ng-app]'),
+            (f'<html><body>{self.ARTICLE}<script>{"var state = 1;" * 1000}</script></body></html>', True,
+             'text is 719 of 14719 bytes'),
+        ]
+        for html, needs_js, reason in cases:
+            with self.subTest(reason=reason):
+                self.assertEqual(self.decider.needs_js(html), (needs_js, reason))
+
+    def test_decision_settles_per_pattern(self):
+        for n in range(2):
+            self.decider.record(f'https://example.com/app/{n}', True)
+        self.assertIsNone(self.decider.decision_for('https://example.com/app/99'))
+        self.decider.record('https://example.com/app/2', True)
+        # Any page of the template now skips the static probe
+        self.assertTrue(self.decider.decision_for('https://example.com/app/99'))
+        self.assertIsNone(self.decider.decision_for('https://example.com/blog/99'))
+        self.assertIsNone(self.decider.decision_for('https://other.example/app/1'))
+
+        for n in range(3):
+            self.decider.record(f'https://example.com/blog/{n}', False)
+        self.assertIs(self.decider.decision_for('https://example.com/blog/99'), False)
+
+    def test_mixed_observations_stay_undecided(self):
+        for n in range(5):
+            self.decider.record(f'https://example.com/app/{n}', True)
+        self.decider.record('https://example.com/app/5', False)
+        self.assertIsNone(self.decider.decision_for('https://example.com/app/6'))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = circuit_breaker.CircuitBreaker(
+            'example.com', window=10, min_requests=4, failure_ratio=0.5, max_timeouts=3,
+            open_seconds=30, max_open_seconds=100, max_probes=3, clock=self.clock)
+
+    def request(self, url, outcome):
+        admission = self.breaker.allow(url)
+        self.assertIsNotNone(admission, f'{url} refused in state {self.breaker.state}')
+        self.breaker.record(outcome, admission)
+        return admission
+
+    def trip(self):
+        for n in range(4):
+            self.request(f'/broken/{n}', circuit_breaker.FAILURE)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+    def test_opens_on_failures_across_distinct_urls(self):
+        self.request('/a', circuit_breaker.SUCCESS)
+        self.request('/b', circuit_breaker.FAILURE)
+        self.request('/c', circuit_breaker.SUCCESS)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.request('/d', circuit_breaker.FAILURE)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+        self.assertIsNone(self.breaker.allow('/e'))
+        self.assertEqual(self.breaker.retry_in('/e'), 30)
+
+    def test_retries_of_one_url_stay_out_of_the_window(self):
+        for n in range(6):
+            self.request(f'/ok/{n}', circuit_breaker.SUCCESS)
+        # A page that always returns 500, retried over and over
+        for _ in range(20):
+            self.request('/always-500', circuit_breaker.FAILURE)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(sum(self.breaker.outcomes), 1)
+        # A retry that finally works is forgotten as a failure
+        self.request('/always-500', circuit_breaker.SUCCESS)
+        self.assertNotIn('/always-500', self.breaker.failed_urls)
+
+    def test_timeouts_in_a_row_open(self):
+        for n in range(3):
+            self.request(f'/slow/{n}', circuit_breaker.TIMEOUT)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+    def test_fresh_url_probes_and_closes(self):
+        self.trip()
+        self.clock.now += 30
+        # URLs that already failed wait for a fresh one to probe
+        self.assertIsNone(self.breaker.allow('/broken/0'))
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertEqual(self.breaker.retry_in('/broken/0'), 30)
+        probe = self.breaker.allow('/fresh')
+        self.assertTrue(probe.probe)
+        # One probe at a time
+        self.assertIsNone(self.breaker.allow('/other'))
+        self.assertEqual(self.breaker.retry_in('/other'), 1.0)
+        self.breaker.record(circuit_breaker.SUCCESS, probe)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(len(self.breaker.outcomes), 0)
+        self.assertIsNotNone(self.breaker.allow('/broken/0'))
+
+    def test_failed_fresh_probes_back_off_then_give_up(self):
+        self.trip()
+        for number, cool_down in enumerate([30, 60, 100]):
+            self.clock.now += cool_down
+            probe = self.breaker.allow(f'/probe/{number}')
+            self.assertTrue(probe.probe)
+            self.breaker.record(circuit_breaker.FAILURE, probe)
+            if number < 2:
+                self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+                self.assertEqual(self.breaker.retry_in(), min(30 * 2 ** (number + 1), 100))
+        self.assertTrue(self.breaker.given_up)
+        self.assertIsNone(self.breaker.retry_in())
+        self.assertIsNone(self.breaker.allow('/anything'))
+
+    def test_retried_url_probes_only_without_fresh_work(self):
+        self.trip()
+        self.clock.now += 30
+        self.assertIsNone(self.breaker.allow('/broken/1'))
+        self.clock.now += 30
+        probe = self.breaker.allow('/broken/1')
+        self.assertTrue(probe.probe)
+        # Failing again says nothing new: no re-open, no doubled cool-down
+        self.breaker.record(circuit_breaker.FAILURE, probe)
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertEqual(self.breaker.failed_probes, 0)
+        # ...and a fresh URL still gets to probe straight away
+        self.assertTrue(self.breaker.allow('/fresh').probe)
+
+    def test_stale_outcomes_are_ignored(self):
+        slow = self.breaker.allow('/slow')
+        self.trip()
+        self.clock.now += 30
+        probe = self.breaker.allow('/fresh')
+        # The request admitted before the circuit opened finishes now
+        self.breaker.record(circuit_breaker.SUCCESS, slow)
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.probe_in_flight)
+        self.breaker.record(circuit_breaker.FAILURE, probe)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+        # Nor does it count once the breaker has closed again
+        self.clock.now += 60
+        self.breaker.record(circuit_breaker.SUCCESS, self.breaker.allow('/fresh-2'))
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.breaker.record(circuit_breaker.FAILURE, slow)
+        self.assertEqual(len(self.breaker.outcomes), 0)
+
+    def test_neutral_outcome_frees_the_probe(self):
+        self.trip()
+        self.clock.now += 30
+        self.breaker.record(None, self.breaker.allow('/fresh'))
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow('/fresh').probe)
+
+class HostLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def limiter(self, **options):
+        return concurrency.HostLimiter('example.com', initial=2, ceiling=4, clock=self.clock, **options)
+
+    def test_limit_grows_only_while_full(self):
+        limiter = self.limiter()
+        # One request at a time, as a crawl delay enforces: nothing to grow for
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.1, 200)
+        self.assertEqual(limiter.limit, 2)
+
+        for _ in range(10):
+            limiter.acquire()
+            limiter.acquire()
+            limiter.release(0.1, 200)
+            limiter.release(0.1, 200)
+        self.assertGreater(limiter.limit, 3)
+        self.assertLessEqual(limiter.limit, 4)
+
+    def test_pressure_halves_the_limit_once_per_round_trip(self):
+        limiter = self.limiter()
+        limiter.limit = 4.0
+        # A healthy response sets the latency baseline, i.e. the round trip
+        limiter.acquire()
+        limiter.release(0.5, 200)
+        for _ in range(3):
+            limiter.acquire()
+        limiter.release(0.1, 503)
+        limiter.release(0.1, 503)
+        self.assertEqual(limiter.limit, 2)
+        self.clock.now += 1
+        limiter.release(None, timed_out=True)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_retry_after_pauses_new_requests(self):
+        limiter = self.limiter()
+        limiter.acquire()
+        limiter.release(0.1, 429, retry_after=5)
+        self.assertEqual(limiter.paused_until, self.clock.now + 5)
+
+    def test_pool_size_follows_ceiling_and_global_budget(self):
+        settings = package_module('config.settings')
+        limits = concurrency.HostLimits()
+        self.assertEqual(limits.max_in_flight(), settings.HOST_CONCURRENCY_MAX)
+        limits.set_global_limit(2)
+        self.assertEqual(limits.max_in_flight(), min(2, settings.HOST_CONCURRENCY_MAX))
+        limits.set_global_limit(None)
+        self.assertEqual(limits.max_in_flight(), settings.HOST_CONCURRENCY_MAX)
+
+class MediaHandler(BaseHTTPRequestHandler):
+    BODY = b'\x89PNG' + bytes(range(256)) * 512
+
+    def do_GET(self):
+        status = 200 if self.path.endswith('.png') else 404
+        body = self.BODY if status == 200 else b'not found'
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/png' if status == 200 else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StreamedSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.settings = package_module('config.settings')
+        self.request_manager = core_module('request_manager')
+        self.delay = self.settings.DELAY_BETWEEN_REQUESTS
+        self.settings.DELAY_BETWEEN_REQUESTS = 0
+        concurrency.HOST_LIMITS.reset()
+        concurrency.HOST_LIMITS.set_global_limit(1)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f'127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        concurrency.HOST_LIMITS.reset()
+        self.settings.DELAY_BETWEEN_REQUESTS = self.delay
+
+    def assert_slot_free(self):
+        limiter = concurrency.HOST_LIMITS.get(self.host)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertTrue(limiter.budget.acquire(blocking=False))
+        limiter.budget.release()
+
+    def test_slot_held_until_the_body_is_read(self):
+        response = self.request_manager.RequestManager().make_request(
+            f'http://{self.host}/photo.png', stream=True)
+        limiter = concurrency.HOST_LIMITS.get(self.host)
+        self.assertEqual(limiter.in_flight, 1)
+        self.assertFalse(limiter.budget.acquire(blocking=False))
+        with response:
+            self.assertEqual(b''.join(response.iter_content(8192)), MediaHandler.BODY)
+        self.assert_slot_free()
+        # Closing twice gives nothing back twice
+        response.close()
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_rejected_stream_frees_the_slot(self):
+        manager = self.request_manager.RequestManager()
+        self.assertIsNone(manager.make_request(f'http://{self.host}/missing', stream=True))
+        self.assert_slot_free()
+
+    def test_download_manager_frees_the_slot(self):
+        download_manager = core_module('download_manager')
+        with tempfile.TemporaryDirectory() as directory:
+            result = download_manager.DownloadManager(media_dir=directory).download_file(
+                f'http://{self.host}/photo.png')
+            self.assertEqual(result['size'], len(MediaHandler.BODY))
+        self.assert_slot_free()
+
+class AppShellHandler(BaseHTTPRequestHandler):
+    """Serves a client-rendered page shell, noting when each request arrived"""
+    BODY = b'<html><body><div id="root"></div><script src="/app.js"></script></body></html>'
+    arrivals = []
+
+    def do_GET(self):
+        AppShellHandler.arrivals.append(time.monotonic())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(self.BODY)))
+        self.end_headers()
+        self.wfile.write(self.BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeRenderer:
+    network_requests = []
+
+    def __init__(self, arrivals):
+        self.arrivals = arrivals
+
+    def render_page(self, url):
+        self.arrivals.append(time.monotonic())
+        return '<html><body><p>Rendered</p></body></html>'
+
+class RenderPolitenessTest(unittest.TestCase):
+    DELAY = 0.2
+
+    def setUp(self):
+        self.settings = package_module('config.settings')
+        self.delay = self.settings.DELAY_BETWEEN_REQUESTS
+        self.settings.DELAY_BETWEEN_REQUESTS = 0
+        concurrency.HOST_LIMITS.reset()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), AppShellHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f'127.0.0.1:{self.server.server_address[1]}'
+        concurrency.HOST_LIMITS.set_crawl_delay(self.host, self.DELAY)
+        AppShellHandler.arrivals = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        concurrency.HOST_LIMITS.reset()
+        self.settings.DELAY_BETWEEN_REQUESTS = self.delay
+
+    def extract(self, js_mode, pages):
+        content_extractor = core_module('content_extractor')
+        extractor = content_extractor.ContentExtractor(
+            f'http://{self.host}', use_js=True, js_renderer=FakeRenderer(AppShellHandler.arrivals),
+            js_mode=js_mode)
+        for n in range(pages):
+            self.assertEqual(extractor.extract_from_page(f'http://{self.host}/app/{n}')['text'], 'Rendered')
+        self.assertEqual(concurrency.HOST_LIMITS.get(self.host).in_flight, 0)
+
+    def assert_spaced(self, count):
+        arrivals = AppShellHandler.arrivals
+        self.assertEqual(len(arrivals), count)
+        for earlier, later in zip(arrivals, arrivals[1:]):
+            self.assertGreaterEqual(later - earlier, self.DELAY * 0.9)
+
+    def test_rendering_every_page_keeps_the_crawl_delay(self):
+        self.extract('always', 3)
+        self.assert_spaced(3)
+
+    def test_hybrid_render_is_spaced_from_its_static_fetch(self):
+        # Each shell is fetched, found to need JavaScript, then rendered
+        self.extract('hybrid', 2)
+        self.assert_spaced(4)
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    """Serves a small HTML article per path"""
+
+    def do_GET(self):
+        body = f'<html><body><p>Article at {self.path}</p></body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', f'"{len(self.path)}"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RecordReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.settings = package_module('config.settings')
+        self.transport = core_module('transport')
+        self.requests = import_module('requests')
+        self.directory = tempfile.TemporaryDirectory()
+        saved = (self.settings.TRANSPORT_MODE, self.settings.TRANSPORT_ARCHIVE_DIR)
+        self.addCleanup(self.restore, saved)
+        self.settings.TRANSPORT_ARCHIVE_DIR = self.directory.name
+
+    def restore(self, saved):
+        self.transport.close_transport()
+        self.settings.TRANSPORT_MODE, self.settings.TRANSPORT_ARCHIVE_DIR = saved
+        self.directory.cleanup()
+
+    def session(self, mode):
+        self.transport.close_transport()
+        self.settings.TRANSPORT_MODE = mode
+        session = self.requests.Session()
+        adapter = self.transport.transport_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def record(self, urls):
+        """Fetch urls from a local site in record mode, then take the site down"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ArticleHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            session = self.session('record')
+            live = {path: session.get(base + path) for path in urls}
+            self.transport.close_transport()
+        finally:
+            server.shutdown()
+            server.server_close()
+        return base, live
+
+    def test_recorded_responses_replay_offline(self):
+        base, live = self.record(['/a', '/b/c'])
+        session = self.session('replay')
+        for path, recorded in live.items():
+            with self.subTest(path=path):
+                replayed = session.get(base + path)
+                self.assertEqual(replayed.status_code, 200)
+                self.assertEqual(replayed.content, recorded.content)
+                self.assertEqual(replayed.headers['etag'], recorded.headers['etag'])
+                self.assertEqual(replayed.text, recorded.text)
+        missing = session.get(base + '/never-recorded')
+        self.assertEqual((missing.status_code, missing.headers['x-replay-miss']), (404, '1'))
+
+    def failures(self, base, paths, seed, threads=1):
+        """Replay every path twice (a try and a retry); returns the (path, attempt) pairs that failed"""
+        archive = self.transport.ReplayArchive(self.directory.name)
+        adapter = self.transport.ReplayAdapter(archive, error_rate=0.3, error_status=503, seed=seed)
+        session = self.requests.Session()
+        session.mount('http://', adapter)
+
+        def fetch(path):
+            return [attempt for attempt in (1, 2) if session.get(base + path).status_code == 503]
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                return {(path, attempt) for path, attempts in zip(paths, pool.map(fetch, paths))
+                        for attempt in attempts}
+        finally:
+            archive.close()
+
+    def test_same_seed_same_failures(self):
+        paths = [f'/page/{n}' for n in range(60)]
+        base, _ = self.record(paths)
+        first = self.failures(base, paths, seed=7)
+        self.assertTrue(0 < len(first) < 2 * len(paths))
+        # Another order, from several threads: the same requests fail
+        shuffled = paths[1::2] + paths[::2]
+        self.assertEqual(self.failures(base, shuffled, seed=7, threads=8), first)
+        self.assertNotEqual(self.failures(base, paths, seed=8), first)
+
+class RecordingScraper:
+    """Stands in for EthicalScraper: fails for hosts named 'broken', raises for 'crash'"""
+    crawled = []
+
+    def __init__(self, url, export_formats=None, data_dir=None, standalone=True):
+        if 'crash' in url:
+            raise RuntimeError('cannot set up')
+        self.url = url
+        self.data_dir = data_dir
+        RecordingScraper.crawled.append((url, data_dir, standalone))
+
+    def run(self):
+        return 'broken' not in self.url
+
+class BatchRunnerTest(unittest.TestCase):
+    def test_runs_each_seed_with_the_injected_scraper(self):
+        batch = core_module('batch')
+        RecordingScraper.crawled = []
+        seeds = ['https://example.com', 'http://example.com', 'https://broken.example', 'https://crash.example']
+        with tempfile.TemporaryDirectory() as directory:
+            stats = batch.BatchRunner(seeds, RecordingScraper, output_dir=directory, sites=2,
+                                      global_concurrency=4).run()
+            self.assertEqual((stats['sites'], stats['succeeded'], stats['failed']), (4, 2, 2))
+            self.assertTrue(os.path.exists(os.path.join(directory, batch.SUMMARY_FILE)))
+        directories = sorted(os.path.basename(data_dir) for _, data_dir, _ in RecordingScraper.crawled)
+        self.assertEqual(directories, ['broken.example', 'example.com', 'example.com_1'])
+        self.assertTrue(all(not standalone for _, _, standalone in RecordingScraper.crawled))
+        # The global budget only applies while the batch runs
+        self.assertIsNone(concurrency.HOST_LIMITS.budget)
+
+class RetrySchedulingTest(unittest.TestCase):
+    def setUp(self):
+        database = package_module('storage.database')
+        self.main = package_module('main')
+        self.settings = package_module('config.settings')
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = database.DatabaseManager(os.path.join(self.directory.name, 'scraper.db'))
+        # The retry paths only touch the scraper's storage
+        self.scraper = SimpleNamespace(db=self.db)
+        self.url = 'https://example.com/flaky'
+        self.url_id = self.db.save_url(self.url, 'https://example.com')
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def defer(self, status=503, retry_after=None, **extra):
+        failure = {'status': status, 'retryable': True, 'retry_after': retry_after, **extra}
+        return self.main.EthicalScraper._defer_retry(self.scraper, self.url_id, self.url, failure)
+
+    def scheduled_in(self):
+        deferred = self.db.get_deferred_urls()
+        self.assertEqual([(url_id, url) for url_id, url, _ in deferred], [(self.url_id, self.url)])
+        return deferred[0][2] - time.time()
+
+    def test_exponential_backoff_until_retries_run_out(self):
+        for retry in range(self.settings.MAX_RETRIES):
+            with self.subTest(retry=retry):
+                self.assertTrue(self.defer())
+                expected = min(self.settings.RETRY_BACKOFF_BASE * 2 ** retry, self.settings.RETRY_BACKOFF_MAX)
+                self.assertAlmostEqual(self.scheduled_in(), expected, delta=1)
+                self.assertEqual(self.db.get_retry_count(self.url_id), retry + 1)
+        self.assertFalse(self.defer())
+        self.assertEqual(self.db.get_retry_count(self.url_id), self.settings.MAX_RETRIES)
+
+    def test_retry_after_is_honoured_and_capped(self):
+        self.assertTrue(self.defer(status=429, retry_after=42))
+        self.assertAlmostEqual(self.scheduled_in(), 42, delta=1)
+        self.assertTrue(self.defer(status=429, retry_after=self.settings.RETRY_AFTER_MAX * 10))
+        self.assertAlmostEqual(self.scheduled_in(), self.settings.RETRY_AFTER_MAX, delta=1)
+
+    def test_parking_for_an_open_circuit_uses_no_retry(self):
+        for _ in range(self.settings.MAX_RETRIES):
+            self.defer()
+        self.assertTrue(self.defer(status=None, retry_after=30, circuit_open=True))
+        self.assertAlmostEqual(self.scheduled_in(), 30, delta=1)
+        self.assertEqual(self.db.get_retry_count(self.url_id), self.settings.MAX_RETRIES)
+
+    def test_deferred_urls_leave_the_frontier_until_due(self):
+        later_id = self.db.save_url('https://example.com/later', 'https://example.com')
+        fresh_id = self.db.save_url('https://example.com/fresh', 'https://example.com')
+        now = time.time()
+        self.db.defer_url(self.url_id, 503, now - 1)
+        self.db.defer_url(later_id, 503, now + 30)
+        self.assertEqual(self.db.get_unvisited_urls(), [(fresh_id, 'https://example.com/fresh')])
+
+        frontier, attempted = deque(), set()
+        wait = self.main.EthicalScraper._queue_due_retries(self.scraper, frontier, attempted)
+        self.assertEqual(list(frontier), [(self.url_id, self.url)])
+        self.assertAlmostEqual(wait, 30, delta=1)
+
+        # Not rescheduled since (e.g. skipped by robots.txt): not queued again
+        frontier.clear()
+        self.main.EthicalScraper._queue_due_retries(self.scraper, frontier, attempted)
+        self.assertEqual(list(frontier), [])
+
+        self.db.mark_url_visited(self.url_id, 200)
+        self.assertEqual([url_id for url_id, _, _ in self.db.get_deferred_urls()], [later_id])
+
+class TrapDetectorTest(unittest.TestCase):
+    SETTINGS = {'TRAP_MAX_PATH_DEPTH': 12, 'TRAP_MAX_SEGMENT_REPEATS': 2, 'TRAP_MAX_QUERY_PARAMS': 6,
+                'TRAP_MAX_QUERY_VARIANTS': 20, 'TRAP_MAX_PATTERN_URLS': 500, 'TRAP_SAMPLE_PAGES': 5,
+                'TRAP_DUPLICATE_RATIO': 0.8, 'NEAR_DUPLICATE_DISTANCE': 3}
+
+    def setUp(self):
+        settings = package_module('config.settings')
+        saved = {name: getattr(settings, name) for name in self.SETTINGS}
+        self.addCleanup(lambda: [setattr(settings, name, value) for name, value in saved.items()])
+        for name, value in self.SETTINGS.items():
+            setattr(settings, name, value)
+        self.detector = core_module('trap_detector').TrapDetector()
+
+    def crawl(self, urls, fingerprint):
+        """Check each URL and feed back the page of those followed; returns the URLs followed"""
+        followed = []
+        for url in urls:
+            if self.detector.check(url) is None:
+                followed.append(url)
+                self.detector.record_page(url, fingerprint(url))
+        return followed
+
+    def test_single_url_heuristics(self):
+        cases = {
+            'https://example.com/item/5?color=red': None,
+            'https://example.com/a/b/a/b/a': 'repeated_segment',
+            'https://example.com/' + '/'.join(f's{n}' for n in range(13)): 'path_depth',
+            'https://example.com/shop;jsessionid=ABC123': 'session_id',
+            'https://example.com/cart?PHPSESSID=abc': 'session_id',
+            'https://example.com/list?' + '&'.join(f'f{n}=1' for n in range(7)): 'query_params',
+        }
+        for url, reason in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.detector.check(url), reason)
+
+    def test_query_explosion(self):
+        for n in range(20):
+            self.assertIsNone(self.detector.check(f'https://example.com/search?q=x&f{n}=1'))
+        self.assertEqual(self.detector.check('https://example.com/search?q=x&g=1'), 'query_explosion')
+        # The whole path is flagged, including parameter sets seen before
+        self.assertEqual(self.detector.check('https://example.com/search?q=y&f0=2'), 'query_explosion')
+        self.assertIsNone(self.detector.check('https://example.com/about'))
+
+    def test_unsampled_template_is_capped(self):
+        for n in range(500):
+            self.assertIsNone(self.detector.check(f'https://example.com/item/{n}'))
+        self.assertEqual(self.detector.check('https://example.com/item/500'), 'pattern_cap')
+        self.assertEqual(self.detector.check('https://example.com/item/501'), 'pattern_cap')
+
+    def test_uncounted_urls_leave_the_cap_alone(self):
+        for n in range(600):
+            self.assertIsNone(self.detector.check(f'https://example.com/item/{n}', count=False))
+        self.assertEqual(self.detector.patterns['example.com/item/{num}'].urls, 0)
+
+    def test_near_identical_ratio(self):
+        # Four distinct pages out of five: below the ratio
+        distinct = [0, 0xFFFF, 0xFFFF << 16, 0xFFFF << 32, 0xFFFF << 48]
+        for n, fingerprint in enumerate(distinct):
+            self.detector.record_page(f'https://example.com/post/{n}', fingerprint)
+        self.assertNotIn('example.com/post/{num}', self.detector.flagged)
+        # Near-duplicates (a bit or two apart) count like identical pages
+        for n in range(5):
+            self.detector.record_page(f'https://example.com/tag/{n}', 0xF0 ^ (1 << n))
+        self.assertEqual(self.detector.flagged['example.com/tag/{num}'], 'near_identical')
+        self.assertEqual(self.detector.check('https://example.com/tag/99'), 'near_identical')
+
+    def test_calendar_trap_is_abandoned_after_sampling(self):
+        # Every day renders the same empty calendar page
+        days = [f'https://example.com/cal/{year}/{day}' for year in range(2000, 2100) for day in range(1, 366)]
+        followed = self.crawl(days, lambda url: 0x5EED)
+        self.assertEqual(len(followed), 5)
+        self.assertEqual(self.detector.flagged['example.com/cal/{num}/{num}'], 'near_identical')
+
+    def test_large_catalog_is_followed_past_the_cap(self):
+        random = import_module('random').Random(0)
+        fingerprints = {}
+        items = [f'https://example.com/item/{n}' for n in range(600)]
+        followed = self.crawl(items, lambda url: fingerprints.setdefault(url, random.getrandbits(64)))
+        self.assertEqual(followed, items)
+        self.assertEqual(self.detector.flagged, {})
+
+class ReextractionTest(unittest.TestCase):
+    def test_relative_media_keeps_downloaded_files(self):
+        requests = import_module('requests')
+        database = package_module('storage.database')
+        warc = package_module('storage.warc')
+        reextractor = core_module('reextractor')
+        page_url = 'https://example.com/blog/post.html'
+        image_url = 'https://example.com/img/photo.png'
+        with tempfile.TemporaryDirectory() as directory:
+            db = database.DatabaseManager(os.path.join(directory, 'scraper.db'))
+            try:
+                # What the crawl stored: media resolved against the site's base URL
+                url_id = db.save_url(page_url, 'https://example.com', visited=True, status=200)
+                db.save_content(url_id, 'html', 'Post')
+                db.save_media(url_id, image_url, 'image', '/media/photo.png', 1234)
+
+                response = requests.Response()
+                response.url = page_url
+                response.status_code = 200
+                response.reason = 'OK'
+                response.headers = requests.structures.CaseInsensitiveDict({'Content-Type': 'text/html'})
+                response._content = b'<html><body><p>Post</p><img src="img/photo.png"></body></html>'
+                response._content_consumed = True
+                writer = warc.WARCWriter(directory, index_db=db.index_db_file)
+                writer.archive_response(response)
+                writer.close()
+
+                stats = reextractor.Reextractor(db, warc_dir=directory, workers=1,
+                                                base_url='https://example.com').run()
+                self.assertEqual((stats['pages'], stats['failed']), (1, 0))
+                self.assertEqual(db.get_media(url_id), [
+                    {'media_url': image_url, 'media_type': 'image', 'local_path': '/media/photo.png'}])
+            finally:
+                db.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import codecs
+import logging
+import logging.handlers
+import queue
+import sys
+import tempfile
+import threading
+import unittest
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
+
+# utilities use package-relative imports, so import them through the package
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+
+def utility_module(name):
+    return import_module(f'{PACKAGE_DIR.name}.utilities.{name}')
+
+encoding = utility_module('encoding')
+simhash = utility_module('simhash')
+logger = utility_module('logger')
+profiling = utility_module('profiling')
+url_patterns = utility_module('url_patterns')
+
+def flip_bits(fingerprint, *bits):
+    for bit in bits:
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+class DetectEncodingTest(unittest.TestCase):
+    def test_header_charset_wins(self):
+        body = '<meta charset="utf-8"><p>caf\xe9</p>'.encode('latin-1')
+        self.assertEqual(encoding.detect_encoding(body, 'text/html; charset=ISO-8859-1'), 'iso8859-1')
+
+    def test_header_utf8_with_bom_strips_bom(self):
+        body = codecs.BOM_UTF8 + b'<p>hi</p>'
+        self.assertEqual(encoding.detect_encoding(body, 'text/html; charset=utf-8'), 'utf-8-sig')
+        self.assertEqual(encoding.decode_body(body, 'text/html; charset=utf-8'), '<p>hi</p>')
+
+    def test_unknown_header_charset_is_ignored(self):
+        self.assertEqual(encoding.detect_encoding(b'<p>hi</p>', 'text/html; charset=bogus'), 'utf-8')
+
+    def test_bom_before_meta(self):
+        body = codecs.BOM_UTF16_LE + '<meta charset="iso-8859-1"><p>hi</p>'.encode('utf-16-le')
+        self.assertEqual(encoding.detect_encoding(body), 'utf-16')
+        self.assertEqual(encoding.decode_body(body), '<meta charset="iso-8859-1"><p>hi</p>')
+
+    def test_utf32_bom_not_taken_for_utf16(self):
+        self.assertEqual(encoding.detect_encoding(codecs.BOM_UTF32_LE + 'hi'.encode('utf-32-le')), 'utf-32')
+
+    def test_meta_before_utf8_check(self):
+        # Plain ASCII is valid UTF-8, so the meta declaration has to come first
+        body = b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=koi8-r">'
+        self.assertEqual(encoding.detect_encoding(body), 'koi8-r')
+
+    def test_meta_outside_sniff_window_is_ignored(self):
+        body = b' ' * encoding.META_SNIFF_BYTES + b'<meta charset="koi8-r">'
+        self.assertEqual(encoding.detect_encoding(body), 'utf-8')
+
+    def test_valid_utf8_before_detector(self):
+        with mock.patch.object(encoding, '_detect_from_sample') as detector:
+            self.assertEqual(encoding.detect_encoding('<p>caf\xe9</p>'.encode('utf-8')), 'utf-8')
+        detector.assert_not_called()
+
+    def test_utf8_cut_at_sample_end(self):
+        body = ('\xe9' * encoding.DETECT_SAMPLE_BYTES).encode('utf-8')
+        self.assertEqual(encoding.detect_encoding(body), 'utf-8')
+
+    def test_detector_then_fallback(self):
+        body = '<p>caf\xe9 cr\xe8me br\xfbl\xe9e</p>'.encode('windows-1252')
+        with mock.patch.object(encoding, '_detect_from_sample', return_value='iso8859-15'):
+            self.assertEqual(encoding.detect_encoding(body), 'iso8859-15')
+        with mock.patch.object(encoding, '_detect_from_sample', return_value=None):
+            self.assertEqual(encoding.detect_encoding(body), encoding.FALLBACK_ENCODING)
+
+    def test_empty_body(self):
+        self.assertEqual(encoding.decode_body(b'', 'text/html'), '')
+
+class SimHashTest(unittest.TestCase):
+    FINGERPRINT = 0xF0E1D2C3B4A59687
+
+    def test_near_identical_text_is_close(self):
+        text = ' '.join(f'word{i}' for i in range(300))
+        edited = text.replace('word150', 'changed')
+        self.assertLessEqual(simhash.hamming_distance(simhash.simhash(text), simhash.simhash(edited)), 10)
+        other = ' '.join(f'other{i}' for i in range(300))
+        self.assertGreater(simhash.hamming_distance(simhash.simhash(text), simhash.simhash(other)), 10)
+
+    def test_signed_round_trip(self):
+        for fingerprint in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            with self.subTest(fingerprint=fingerprint):
+                signed = simhash.to_signed(fingerprint)
+                self.assertTrue(-(1 << 63) <= signed < 1 << 63)
+                self.assertEqual(simhash.to_unsigned(signed), fingerprint)
+
+    def test_three_bits_in_three_bands_still_share_a_band(self):
+        index = simhash.NearDuplicateIndex(max_distance=3)
+        index.add('page', self.FINGERPRINT)
+        band = simhash.BAND_BITS
+        self.assertEqual(index.find(self.FINGERPRINT), 'page')
+        self.assertEqual(index.find(flip_bits(self.FINGERPRINT, 0, band, 2 * band)), 'page')
+        self.assertEqual(index.find(flip_bits(self.FINGERPRINT, 1, band + 5, 3 * band + 9)), 'page')
+
+    def test_every_three_bit_neighbourhood_is_found(self):
+        index = simhash.NearDuplicateIndex(max_distance=3)
+        index.add('page', self.FINGERPRINT)
+        # Walk bit positions so each combination of bands is covered
+        for first in range(0, 64, 7):
+            for second in range(first + 1, 64, 11):
+                for third in range(second + 1, 64, 13):
+                    with self.subTest(bits=(first, second, third)):
+                        self.assertEqual(index.find(flip_bits(self.FINGERPRINT, first, second, third)), 'page')
+
+    def test_four_bits_apart_is_not_a_duplicate(self):
+        index = simhash.NearDuplicateIndex(max_distance=3)
+        index.add('page', self.FINGERPRINT)
+        # Same bands for three of four, but too far apart
+        self.assertIsNone(index.find(flip_bits(self.FINGERPRINT, 0, 1, 2, 3)))
+        # One bit in every band: no band left in common
+        band = simhash.BAND_BITS
+        self.assertIsNone(index.find(flip_bits(self.FINGERPRINT, 0, band, 2 * band, 3 * band)))
+
+class URLPatternTest(unittest.TestCase):
+    def test_templates(self):
+        cases = {
+            'https://shop.example/item/1234?color=red': 'shop.example/item/{num}?color',
+            # Host is lowercased; query keys are sorted and deduplicated, values dropped
+            'https://Shop.Example/item/5?size=m&color=red&color=blue': 'shop.example/item/{num}?color&size',
+            'https://example.com/cafe?q=': 'example.com/cafe?q',
+            'https://example.com': 'example.com/',
+            'https://example.com/users/550e8400-e29b-41d4-a716-446655440000/profile':
+                'example.com/users/{id}/profile',
+            'https://example.com/blob/deadbeefcafe1234': 'example.com/blob/{id}',
+            'https://example.com/archive/2024-05-17/': 'example.com/archive/{date}/',
+            'https://example.com/archive/2024-05': 'example.com/archive/{date}',
+            'https://example.com/blog/how-to-bake-bread-fast': 'example.com/blog/{slug}',
+            # Short hyphenated names are section names, not slugs
+            'https://example.com/blog/about-us': 'example.com/blog/about-us',
+            'https://example.com/list/page2.html': 'example.com/list/page{num}.html',
+        }
+        for url, pattern in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(url_patterns.url_pattern(url), pattern)
+
+    def test_records_of_one_template_share_a_pattern(self):
+        self.assertEqual(url_patterns.url_pattern('https://example.com/item/1'),
+                         url_patterns.url_pattern('https://example.com/item/98765'))
+        self.assertNotEqual(url_patterns.url_pattern('https://example.com/item/1'),
+                            url_patterns.url_pattern('https://other.example/item/1'))
+        self.assertNotEqual(url_patterns.url_pattern('https://example.com/item/1'),
+                            url_patterns.url_pattern('https://example.com/item/1?page=2'))
+
+def busy_worker_function():
+    return sum(i * i for i in range(200000))
+
+class PhaseProfilerTest(unittest.TestCase):
+    def test_worker_threads_are_in_the_cpu_report(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = profiling.PhaseProfiler('cpu', directory)
+            with profiler.phase('extract'):
+                with ThreadPoolExecutor(max_workers=2, thread_name_prefix='fetch') as pool:
+                    list(pool.map(lambda _: busy_worker_function(), range(4)))
+            report = Path(profiler.reports[0]).read_text(encoding='utf-8')
+            self.assertIn('busy_worker_function', report)
+            self.assertTrue(Path(directory, '01-extract.prof').exists())
+        self.assertIsNone(threading.getprofile() if hasattr(threading, 'getprofile') else None)
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def log_record(level, message):
+    return logging.LogRecord('test', level, __file__, 1, message, None, None)
+
+class DroppingQueueHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.collector = CollectingHandler()
+        self.handler = logger.DroppingQueueHandler(queue.Queue(1), block_seconds=0.01)
+        # Not started: the queue stays full, as under a burst the writer can't keep up with
+        self.handler.listener = logging.handlers.QueueListener(self.handler.queue, self.collector)
+        self.handler.handle(log_record(logging.INFO, 'fills the queue'))
+
+    def test_info_is_dropped_when_full(self):
+        self.handler.handle(log_record(logging.INFO, 'dropped'))
+        self.handler.handle(log_record(logging.DEBUG, 'dropped'))
+        self.assertEqual(self.handler.dropped, 2)
+        self.assertEqual(self.collector.records, [])
+
+    def test_warnings_and_errors_are_written_directly(self):
+        for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+            self.handler.handle(log_record(level, f'kept at {logging.getLevelName(level)}'))
+        self.assertEqual(self.handler.dropped, 0)
+        self.assertEqual([record.getMessage() for record in self.collector.records],
+                         ['kept at WARNING', 'kept at ERROR', 'kept at CRITICAL'])
+        self.assertEqual(self.handler.queue.qsize(), 1)
+
+    def test_errors_wait_for_room(self):
+        self.handler.queue.get_nowait()
+        self.handler.handle(log_record(logging.ERROR, 'queued'))
+        self.assertEqual(self.handler.queue.get_nowait().getMessage(), 'queued')
+        self.assertEqual(self.collector.records, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
-from .logger import setup_logger
+from .logger import configure_logging, setup_logger
 from .validator import is_valid_url, sanitize_filename
+from .url_patterns import url_pattern
+from .encoding import decode_body, response_text
 
 __all__ = [
+    'configure_logging',
     'setup_logger',
     'is_valid_url',
-    'sanitize_filename'
+    'sanitize_filename',
+    'url_pattern',
+    'decode_body',
+    'response_text'
 ]
\ No newline at end of file
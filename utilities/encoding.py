@@ -0,0 +1,106 @@
+import codecs
+import re
+
+# Optional statistical detectors, only consulted when nothing declares a charset
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+# Longest BOMs first so UTF-32 LE is not mistaken for UTF-16 LE.
+# The BOM-aware codecs strip the mark while decoding.
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+CHARSET_PARAM = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_CHARSET = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+META_SNIFF_BYTES = 4096  # HTML requires <meta charset> within the first 1024 bytes
+DETECT_SAMPLE_BYTES = 65536
+FALLBACK_ENCODING = 'windows-1252'
+
+def _known_encoding(name):
+    """Return the canonical codec name, or None if Python can't decode it"""
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+
+def charset_from_content_type(content_type):
+    """Extract the charset parameter from a Content-Type header"""
+    match = CHARSET_PARAM.search(content_type or '')
+    return _known_encoding(match.group(1)) if match else None
+
+def _is_utf8(sample):
+    """Check that a sample is valid UTF-8, allowing a character cut off at the end"""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def _detect_from_sample(sample):
+    """Run a statistical detector over a bounded sample"""
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(sample).best()
+        if best is not None:
+            return _known_encoding(best.encoding)
+    elif chardet is not None:
+        return _known_encoding(chardet.detect(sample).get('encoding'))
+    return None
+
+def detect_encoding(content, content_type=''):
+    """
+    Work out how a response body is encoded
+
+    Checks, in order: the Content-Type charset, a byte order mark, a <meta charset>
+    in the first few KB, whether a sample is valid UTF-8, and finally a statistical
+    detector over at most DETECT_SAMPLE_BYTES bytes.
+    """
+    encoding = charset_from_content_type(content_type)
+    if encoding:
+        if encoding == 'utf-8' and content.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        return encoding
+
+    for bom, bom_encoding in BOMS:
+        if content.startswith(bom):
+            return bom_encoding
+
+    match = META_CHARSET.search(content[:META_SNIFF_BYTES])
+    if match:
+        encoding = _known_encoding(match.group(1).decode('ascii', errors='ignore'))
+        if encoding:
+            return encoding
+
+    sample = content[:DETECT_SAMPLE_BYTES]
+    if _is_utf8(sample):
+        return 'utf-8'
+
+    return _detect_from_sample(sample) or FALLBACK_ENCODING
+
+def decode_body(content, content_type=''):
+    """Decode a response body to text without requests' full-body detection"""
+    if not content:
+        return ''
+    return content.decode(detect_encoding(content, content_type), errors='replace')
+
+def response_text(response):
+    """Return the decoded body of a response, decoding it only once"""
+    text = getattr(response, '_decoded_text', None)
+    if text is None:
+        text = decode_body(response.content, response.headers.get('content-type', ''))
+        response._decoded_text = text
+    return text
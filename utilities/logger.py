@@ -1,29 +1,241 @@
+"""
+Process-wide logging, configured once
+
+Module loggers carry no handlers of their own; they propagate to the package
+logger, whose single QueueHandler hands records to a QueueListener thread that
+does the formatting and file/console I/O. Nothing is set up at import time:
+configure_logging runs when the program calls it, or when the first record
+is logged. The crawl threads only pay for
+building the record and a put_nowait on a bounded queue. When the queue is
+full, DEBUG and INFO records are dropped rather than blocking the crawl;
+warnings and errors wait briefly for room and are otherwise written directly
+from the calling thread, so they are never lost.
+"""
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from ..config import settings
 
-def setup_logger(name):
-    """Configure and return a logger instance"""
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    
-    # Ensure log directory exists
+# Loggers are named after their modules, so every one of them sits below this
+PACKAGE_LOGGER = __name__.split('.')[0]
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_forked = False
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any extra={...} fields included"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limit, window, min_level=logging.WARNING):
+        """
+        Pass at most limit records per call site every window seconds
+
+        Call sites are used rather than message text because most messages are
+        f-strings that differ per URL. Records below min_level are never
+        limited. The first record let through after a suppression notes how
+        many were dropped.
+        """
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.min_level = min_level
+        self.lock = threading.Lock()
+        self.sites = {}
+
+    def filter(self, record):
+        if not self.limit or record.levelno < self.min_level:
+            return True
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self.lock:
+            started, count, suppressed = self.sites.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.limit:
+                self.sites[key] = (started, count, suppressed + 1)
+                return False
+            self.sites[key] = (started, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f'{record.msg} [{suppressed} similar messages suppressed]'
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops DEBUG/INFO records rather than block when the queue is full"""
+
+    def __init__(self, log_queue, block_seconds=0.1):
+        super().__init__(log_queue)
+        self.block_seconds = block_seconds
+        self.listener = None
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge args and render the traceback here, while they are still valid,
+        # but leave the formatting itself to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+        try:
+            self.queue.put(record, timeout=self.block_seconds)
+        except queue.Full:
+            # Still full: write it ourselves; handlers lock around emit
+            if self.listener is not None:
+                self.listener.handle(record)
+
+def _level(name):
+    return logging.getLevelName(name.upper()) if isinstance(name, str) else name
+
+def _build_handlers():
+    """File and console handlers as configured in settings"""
     Path(settings.LOG_STORAGE).mkdir(parents=True, exist_ok=True)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        
-    # File handler
-    log_file = os.path.join(settings.LOG_STORAGE, 'scraper.log')
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
-    # Console handler
+    file_handler = logging.FileHandler(os.path.join(settings.LOG_STORAGE, settings.LOG_FILE),
+                                       encoding='utf-8')
+    file_handler.setLevel(_level(settings.LOG_LEVEL))
+    file_handler.setFormatter(JSONFormatter() if settings.LOG_FORMAT == 'json'
+                              else logging.Formatter(TEXT_FORMAT))
+
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+    console_handler.setLevel(_level(settings.LOG_CONSOLE_LEVEL))
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return [file_handler, console_handler]
+
+def _close_handlers(package_logger):
+    for handler in list(package_logger.handlers):
+        package_logger.removeHandler(handler)
+        handler.close()
+
+def configure_logging():
+    """(Re)configure the package logger from settings; safe to call again after settings change"""
+    global _listener, _queue_handler
+    with _lock:
+        package_logger = logging.getLogger(PACKAGE_LOGGER)
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+        _close_handlers(package_logger)
+
+        handlers = _build_handlers()
+        _queue_handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE),
+                                              settings.LOG_QUEUE_BLOCK_SECONDS)
+        _queue_handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT, settings.LOG_RATE_LIMIT_WINDOW))
+        _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _queue_handler.listener = _listener
+        _listener.start()
+
+        package_logger.addHandler(_queue_handler)
+        package_logger.setLevel(min(handler.level for handler in handlers))
+        package_logger.propagate = False
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _queue_handler is not None and _queue_handler.dropped:
+        logging.getLogger(PACKAGE_LOGGER).warning(
+            f"{_queue_handler.dropped} DEBUG/INFO log records dropped because the log queue was full")
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+def _log_synchronously(package_logger, rate_limit):
+    for handler in _build_handlers():
+        for log_filter in rate_limit:
+            handler.addFilter(log_filter)
+        package_logger.addHandler(handler)
+
+def _after_fork_in_child():
+    # The listener thread does not survive fork, and worker processes exit
+    # without running atexit hooks, so children log synchronously instead
+    global _listener, _queue_handler, _forked
+    _forked = True
+    if _queue_handler is None:
+        return
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    rate_limit = _queue_handler.filters
+    package_logger.removeHandler(_queue_handler)
+    _listener = _queue_handler = None
+    _log_synchronously(package_logger, rate_limit)
+
+class _ConfigureOnFirstRecord(logging.Handler):
+    """Stands in until the first record arrives, so importing a module starts no thread or file"""
+
+    def handle(self, record):
+        package_logger = logging.getLogger(PACKAGE_LOGGER)
+        if _forked:
+            with _lock:
+                if self in package_logger.handlers:
+                    package_logger.removeHandler(self)
+                    _log_synchronously(package_logger, [RateLimitFilter(settings.LOG_RATE_LIMIT,
+                                                                        settings.LOG_RATE_LIMIT_WINDOW)])
+        elif _queue_handler is None:
+            configure_logging()
+        # configure_logging replaced this handler; hand the record to the real one
+        package_logger.handle(record)
+        return True
+
+    def emit(self, record):
+        pass
+
+def setup_logger(name):
+    """Return the logger for a module; process logging is configured by the first record logged"""
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    with _lock:
+        if not package_logger.handlers:
+            package_logger.addHandler(_ConfigureOnFirstRecord())
+            package_logger.setLevel(min(_level(settings.LOG_LEVEL), _level(settings.LOG_CONSOLE_LEVEL)))
+            package_logger.propagate = False
+    return logging.getLogger(name)
+
+atexit.register(shutdown_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,243 @@
+"""
+In-process metrics: counters, gauges and histograms
+
+Modules create their metrics once at import time, like their logger:
+
+    FETCH_SECONDS = metrics.histogram('scraper_fetch_seconds', 'Fetch latency', ['host'])
+    FETCH_SECONDS.observe(0.21, host='example.com')
+
+The registry can be served as Prometheus text on a local port and written as
+a JSON snapshot file at a fixed interval.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def samples(self):
+        """Yield (suffix, label key, extra labels, value) for the text format"""
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield '', key, None, value
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(zip(self.labelnames, key), value=value) for key, value in self.values.items()]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'counts': [0] * (len(self.buckets) + 1),
+                                            'sum': 0.0, 'count': 0}
+            state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed seconds"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, dict(state, counts=list(state['counts'])))
+                     for key, state in self.values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield '_bucket', key, [('le', le)], cumulative
+            yield '_sum', key, None, state['sum']
+            yield '_count', key, None, state['count']
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(zip(self.labelnames, key), count=state['count'], sum=round(state['sum'], 6),
+                         buckets=dict(zip([str(b) for b in self.buckets] + ['+Inf'], state['counts'])))
+                    for key, state in self.values.items()]
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+    def __call__(self, function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return function(*args, **kwargs)
+        return wrapper
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(metric.labelnames, key, extra)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """All metric values as a JSON-serializable dict"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {
+            'timestamp': time.time(),
+            'metrics': {metric.name: {'type': metric.kind, 'values': metric.snapshot()}
+                        for metric in metrics}
+        }
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve /metrics in the Prometheus text format from a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+class SnapshotWriter:
+    def __init__(self, path, interval=15, registry=REGISTRY):
+        """Write registry snapshots to a JSON file every interval seconds"""
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+        self.thread.start()
+
+    def write(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a half-written file
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, indent=2)
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Stop the thread and write a final snapshot"""
+        self.stopped.set()
+        self.thread.join()
+        self.write()
@@ -0,0 +1,141 @@
+"""
+Per-phase CPU and memory profiling for scraper runs
+
+    profiler = PhaseProfiler('both', 'storage/profiles')
+    with profiler.phase('discover'):
+        ...
+
+Each phase writes its own reports: NN-phase.cpu.txt (top functions by
+cumulative time) with the raw NN-phase.prof for tools like snakeviz, and
+NN-phase.mem.txt (top allocation sites, net of what was allocated before the
+phase, plus peak traced memory). The CPU report covers the thread that runs
+the phase and every thread started during it, such as the fetch workers: each
+gets its own cProfile.Profile, merged into the phase's stats. tracemalloc sees
+all threads anyway. Running both at once inflates CPU times.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROFILE_MODES = ('cpu', 'mem', 'both')
+
+class PhaseProfiler:
+    def __init__(self, mode, output_dir, top=30):
+        """
+        Args:
+            mode: 'cpu', 'mem' or 'both'
+            output_dir: Directory for the per-phase reports
+            top: Functions / allocation sites listed per report
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; expected one of {PROFILE_MODES}")
+        self.cpu = mode in ('cpu', 'both')
+        self.mem = mode in ('mem', 'both')
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.top = top
+        self.count = 0
+        self.reports = []
+
+    @contextmanager
+    def phase(self, name):
+        """Profile the enclosed block as one pipeline phase"""
+        self.count += 1
+        prefix = self.output_dir / f'{self.count:02d}-{name}'
+        profile = cProfile.Profile() if self.cpu else None
+        started_tracing = False
+        before = None
+        if self.mem:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                started_tracing = True
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        thread_profiles = []
+        started = time.perf_counter()
+        if profile:
+            threading.setprofile(self._thread_profiler(thread_profiles))
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                threading.setprofile(None)
+            seconds = time.perf_counter() - started
+            if profile:
+                self._write_cpu_report(prefix, name, [profile] + thread_profiles, seconds)
+            if self.mem:
+                self._write_memory_report(prefix, name, before, seconds)
+                if started_tracing:
+                    tracemalloc.stop()
+
+    @staticmethod
+    def _thread_profiler(thread_profiles):
+        """Profile hook for new threads: switches each one to its own cProfile.Profile"""
+        lock = threading.Lock()
+
+        def start(frame, event, arg):
+            thread_profile = cProfile.Profile()
+            try:
+                thread_profile.enable()
+            except ValueError:
+                # Python 3.12+ profiles through sys.monitoring, which already
+                # covers every thread and allows one active profiler
+                sys.setprofile(None)
+                return
+            with lock:
+                thread_profiles.append(thread_profile)
+
+        return start
+
+    def _write_cpu_report(self, prefix, name, profiles, seconds):
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=buffer)
+        for thread_profile in profiles[1:]:
+            try:
+                stats.add(thread_profile)
+            except TypeError:
+                pass  # Thread ended before it recorded anything
+        stats.dump_stats(f'{prefix}.prof')
+        stats.strip_dirs().sort_stats('cumulative').print_stats(self.top)
+        buffer.write('\n')
+        stats.sort_stats('tottime').print_stats(self.top)
+        path = f'{prefix}.cpu.txt'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'Phase {name}: {seconds:.3f}s wall time\n\n')
+            f.write(buffer.getvalue())
+        self.reports.append(path)
+        logger.info(f"CPU profile of phase {name} written to {path}")
+
+    def _write_memory_report(self, prefix, name, before, seconds):
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+        after = after.filter_traces(filters)
+        before = before.filter_traces(filters)
+        lines = [f'Phase {name}: {seconds:.3f}s wall time',
+                 f'Traced memory: {current / 1024 / 1024:.1f} MB now, {peak / 1024 / 1024:.1f} MB peak',
+                 '', f'Top {self.top} allocation sites by growth during the phase:']
+        for stat in after.compare_to(before, 'lineno')[:self.top]:
+            lines.append(f'  {stat}')
+        lines += ['', f'Largest live allocation sites at the end of the phase, with call stacks:']
+        for stat in after.statistics('traceback')[:self.top]:
+            lines.append(f'  {stat.size / 1024:.1f} KiB in {stat.count} blocks')
+            lines.extend(f'    {line}' for line in stat.traceback.format(limit=5))
+        path = f'{prefix}.mem.txt'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        self.reports.append(path)
+        logger.info(f"Memory profile of phase {name} written to {path}")
@@ -0,0 +1,70 @@
+import hashlib
+import re
+from collections import defaultdict
+
+FINGERPRINT_BITS = 64
+BAND_COUNT = 4  # Any two fingerprints within 3 bits share at least one 16-bit band
+BAND_BITS = FINGERPRINT_BITS // BAND_COUNT
+SHINGLE_SIZE = 3
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def _hash_token(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(text):
+    """Compute a 64-bit SimHash over word shingles of the text"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [' '.join(words)] if words else []
+    else:
+        shingles = [' '.join(words[i:i + SHINGLE_SIZE])
+                    for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in shingles:
+        value = _hash_token(shingle)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a, b):
+    """Count differing bits between two fingerprints"""
+    return bin((a ^ b) & ((1 << FINGERPRINT_BITS) - 1)).count('1')
+
+def simhash_bands(fingerprint):
+    """Split a fingerprint into the band values used for LSH lookups"""
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (band * BAND_BITS) & mask for band in range(BAND_COUNT)]
+
+def to_signed(fingerprint):
+    """Map an unsigned 64-bit fingerprint onto SQLite's signed INTEGER range"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+def to_unsigned(value):
+    """Inverse of to_signed"""
+    return value + (1 << 64) if value < 0 else value
+
+class NearDuplicateIndex:
+    def __init__(self, max_distance=3):
+        """In-memory LSH index for near-duplicate lookups within one run"""
+        self.max_distance = max_distance
+        self.bands = [defaultdict(list) for _ in range(BAND_COUNT)]
+
+    def find(self, fingerprint):
+        """Return the key of an indexed near-duplicate, or None"""
+        for band, value in enumerate(simhash_bands(fingerprint)):
+            for key, candidate in self.bands[band].get(value, ()):
+                if hamming_distance(fingerprint, candidate) <= self.max_distance:
+                    return key
+        return None
+
+    def add(self, key, fingerprint):
+        """Index a fingerprint under the given key"""
+        for band, value in enumerate(simhash_bands(fingerprint)):
+            self.bands[band][value].append((key, fingerprint))
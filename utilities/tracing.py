@@ -0,0 +1,229 @@
+"""
+Lightweight span tracing exported to JSONL
+
+    with tracing.span('page', url=url) as page:
+        ...
+        page.set(status=200)
+
+Spans nest through a context variable; whether a trace is recorded is decided
+once at its root span (settings.TRACE_SAMPLE_RATE) and inherited by all its
+children. While tracing is not configured, span() returns a shared no-op.
+"""
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from pathlib import Path
+
+_current = contextvars.ContextVar('trace_span', default=None)
+_exporter = None
+_sample_rate = 1.0
+_UNSAMPLED = object()
+
+class _NullSpan:
+    def set(self, **attributes):
+        pass
+
+_NULL_SPAN = _NullSpan()
+_NULL_CONTEXT = nullcontext(_NULL_SPAN)
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start')
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.trace_id = parent.trace_id if parent else f'{random.getrandbits(64):016x}'
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start = time.time()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class JSONLExporter:
+    def __init__(self, path):
+        """Append finished spans to a JSONL file, one object per line"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def export(self, span, duration, error=None):
+        record = {
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'start': round(span.start, 6),
+            'duration_ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            'attributes': span.attributes
+        }
+        if error is not None:
+            record['error'] = error
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def configure(path, sample_rate=1.0):
+    """Start writing sampled traces to a JSONL file"""
+    global _exporter, _sample_rate
+    close()
+    _sample_rate = sample_rate
+    _exporter = JSONLExporter(path)
+
+def close():
+    """Stop tracing and flush the file"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+@contextmanager
+def _record(span):
+    token = _current.set(span)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current.reset(token)
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(span, time.perf_counter() - started, error)
+
+@contextmanager
+def _skip():
+    token = _current.set(_UNSAMPLED)
+    try:
+        yield _NULL_SPAN
+    finally:
+        _current.reset(token)
+
+def span(name, **attributes):
+    """Context manager timing a block as a span of the current trace"""
+    if _exporter is None:
+        return _NULL_CONTEXT
+    parent = _current.get()
+    if parent is _UNSAMPLED:
+        return _NULL_CONTEXT
+    if parent is None and random.random() >= _sample_rate:
+        return _skip()
+    return _record(Span(name, parent, attributes))
+
+def traced(name):
+    """Decorator running the function inside a span"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def load_spans(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _children_by_parent(spans):
+    children = defaultdict(list)
+    for item in spans:
+        children[item['parent_id']].append(item)
+    return children
+
+def flame_summary(spans):
+    """
+    Aggregate spans by their call path (root;child;grandchild)
+
+    Returns:
+        Dict of path -> {'count', 'total_ms', 'self_ms'}
+    """
+    children = _children_by_parent(spans)
+    known = {item['span_id'] for item in spans}
+    summary = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'self_ms': 0.0})
+
+    def visit(item, prefix):
+        path = f"{prefix};{item['name']}" if prefix else item['name']
+        entry = summary[path]
+        entry['count'] += 1
+        entry['total_ms'] += item['duration_ms']
+        child_ms = sum(child['duration_ms'] for child in children[item['span_id']])
+        entry['self_ms'] += max(0.0, item['duration_ms'] - child_ms)
+        for child in children[item['span_id']]:
+            visit(child, path)
+
+    # Spans whose parent was never written (e.g. run interrupted) count as roots
+    for item in spans:
+        if item['parent_id'] is None or item['parent_id'] not in known:
+            visit(item, '')
+    return dict(summary)
+
+def print_flame(spans, min_percent=0.5):
+    """Print the call-path summary as an indented tree, heaviest paths first"""
+    summary = flame_summary(spans)
+    by_prefix = defaultdict(list)
+    for path in summary:
+        by_prefix[path.rsplit(';', 1)[0] if ';' in path else ''].append(path)
+    roots_total = sum(summary[path]['total_ms'] for path in by_prefix['']) or 1
+
+    def visit(path, depth):
+        entry = summary[path]
+        percent = entry['total_ms'] / roots_total * 100
+        if percent < min_percent:
+            return
+        print(f"{entry['total_ms']:>12.1f} {entry['self_ms']:>12.1f} {percent:>5.1f}% {entry['count']:>7}  "
+              f"{'  ' * depth}{path.rsplit(';', 1)[-1]}")
+        for child in sorted(by_prefix[path], key=lambda p: summary[p]['total_ms'], reverse=True):
+            visit(child, depth + 1)
+
+    print(f"{'total ms':>12} {'self ms':>12} {'%':>6} {'count':>7}  span")
+    for root in sorted(by_prefix[''], key=lambda p: summary[p]['total_ms'], reverse=True):
+        visit(root, 0)
+
+def print_timeline(spans, trace_id, width=50):
+    trace = sorted((item for item in spans if item['trace_id'].startswith(trace_id)),
+                   key=lambda item: item['start'])
+    if not trace:
+        print(f"No spans for trace {trace_id}")
+        return
+    children = _children_by_parent(trace)
+    origin = trace[0]['start']
+    end = max(item['start'] + item['duration_ms'] / 1000 for item in trace)
+    scale = width / max(end - origin, 1e-6)
+
+    def visit(item, depth):
+        offset = item['start'] - origin
+        bar_start = int(offset * scale)
+        bar = ' ' * bar_start + '#' * max(1, int(item['duration_ms'] / 1000 * scale))
+        label = ' '.join(f'{key}={value}' for key, value in item['attributes'].items())
+        print(f"{offset * 1000:>9.1f} {item['duration_ms']:>9.1f}  |{bar:<{width}}|  "
+              f"{'  ' * depth}{item['name']} {label}".rstrip())
+        for child in sorted(children[item['span_id']], key=lambda c: c['start']):
+            visit(child, depth + 1)
+
+    known = {item['span_id'] for item in trace}
+    print(f"{'start ms':>9} {'ms':>9}")
+    for item in trace:
+        if item['parent_id'] is None or item['parent_id'] not in known:
+            visit(item, 0)
+
+def print_slowest(spans, count=10):
+    # Traces of URLs; crawl-level roots such as retry_wait have no url
+    roots = sorted((item for item in spans if item['parent_id'] is None and 'url' in item['attributes']),
+                   key=lambda item: item['duration_ms'], reverse=True)
+    for item in roots[:count]:
+        label = ' '.join(f'{key}={value}' for key, value in item['attributes'].items())
+        print(f"{item['duration_ms']:>10.1f} ms  {item['trace_id']}  {item['name']} {label}".rstrip())
@@ -0,0 +1,39 @@
+import re
+from urllib.parse import urlparse, parse_qsl
+
+# Path segments that identify a record rather than a page template
+NUMERIC_SEGMENT = re.compile(r'^\d+$')
+HEX_SEGMENT = re.compile(r'^[0-9a-f]{8,}$', re.IGNORECASE)
+UUID_SEGMENT = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+DATE_SEGMENT = re.compile(r'^\d{4}-\d{2}(-\d{2})?$')
+SLUG_SEGMENT = re.compile(r'^[a-z0-9]+(-[a-z0-9]+){3,}$', re.IGNORECASE)
+
+def normalize_segment(segment):
+    """Replace variable parts of a path segment with a placeholder"""
+    if not segment:
+        return segment
+    if NUMERIC_SEGMENT.match(segment):
+        return '{num}'
+    if UUID_SEGMENT.match(segment) or HEX_SEGMENT.match(segment):
+        return '{id}'
+    if DATE_SEGMENT.match(segment):
+        return '{date}'
+    if SLUG_SEGMENT.match(segment):
+        return '{slug}'
+    return re.sub(r'\d+', '{num}', segment)
+
+def url_pattern(url):
+    """
+    Reduce a URL to the template it was most likely generated from
+
+    Example: https://shop.example/item/1234?color=red -> shop.example/item/{num}?color
+    """
+    parsed = urlparse(url)
+    segments = [normalize_segment(s) for s in parsed.path.split('/')]
+    pattern = f"{parsed.netloc.lower()}{'/'.join(segments) or '/'}"
+
+    query_keys = sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    if query_keys:
+        pattern += '?' + '&'.join(query_keys)
+    return pattern